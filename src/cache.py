@@ -0,0 +1,171 @@
+"""Persistent findings cache for incremental rescans.
+
+Results are stored in SQLite per file content hash and per matcher: one
+entry for the built-in detectors and one per rule. Each entry records the
+fingerprint of the matcher that produced it (`detector_fingerprint()` or
+`Rule.fingerprint`), so editing one rule only invalidates that rule's
+entries; unchanged files are answered from the cache for everything else.
+
+Entries are evicted least-recently-used once more than `max_entries` files
+are stored.
+"""
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from . import detectors
+from .lines import LineIndex
+from .mmapscan import DETECTOR_NAMES, detect_buffer, match_buffer, open_mmap
+
+DETECTORS_KEY = '<detectors>'
+DEFAULT_MAX_ENTRIES = 1_000_000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    content_hash TEXT PRIMARY KEY,
+    last_used INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_last_used ON files (last_used);
+CREATE TABLE IF NOT EXISTS results (
+    content_hash TEXT,
+    matcher TEXT,
+    fingerprint TEXT,
+    findings TEXT,
+    PRIMARY KEY (content_hash, matcher)
+);
+'''
+
+
+def detector_fingerprint(keywords=None) -> str:
+    """Fingerprint of the detectors; `keywords` is the keyword detector's `KeywordMatcher` if not the default."""
+    keywords = (keywords or detectors.DEFAULT_KEYWORDS).keywords
+    parts = [detectors.DETECTOR_VERSION, keywords, detectors.AWS_ACCESS_KEY_RE.pattern,
+             detectors.PRIVATE_KEY_BEGIN.pattern, detectors.GENERIC_SECRET_RE.pattern]
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def catalog_fingerprints(ruleset=None) -> Dict[str, str]:
+    """Map matcher key -> fingerprint for the detectors and every rule in `ruleset`."""
+    fps = {DETECTORS_KEY: detector_fingerprint(ruleset.keyword_matcher if ruleset is not None else None)}
+    if ruleset is not None:
+        for r in ruleset.rules:
+            fps[r.token_id] = r.fingerprint
+    return fps
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stale_matchers = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self):
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate,
+                'stale_matchers': self.stale_matchers}
+
+
+class FindingsCache:
+    def __init__(self, path: Path, max_entries: int = DEFAULT_MAX_ENTRIES, readonly: bool = False):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        if readonly:
+            self.conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+        else:
+            self.conn = sqlite3.connect(str(self.path))
+            # WAL lets pool workers read while the parent process writes
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.executescript(SCHEMA)
+            self.conn.commit()
+
+    def lookup(self, content_hash: str, fingerprints: Dict[str, str]) -> Dict[str, list]:
+        """Return cached findings per matcher whose stored fingerprint is still current."""
+        rows = self.conn.execute('SELECT matcher, fingerprint, findings FROM results WHERE content_hash = ?',
+                                 (content_hash,)).fetchall()
+        return {m: json.loads(f) for m, fp, f in rows if fingerprints.get(m) == fp}
+
+    def store(self, rows: Iterable[Tuple[str, str, str, list]], used: Iterable[str] = ()):
+        """Insert `(content_hash, matcher, fingerprint, findings)` rows and mark hashes as used."""
+        rows = list(rows)
+        hashes = {r[0] for r in rows} | set(used)
+        # a monotonically increasing use counter; wall-clock time is too coarse for LRU order
+        (now,) = self.conn.execute('SELECT COALESCE(MAX(last_used), 0) + 1 FROM files').fetchone()
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO results VALUES (?,?,?,?)',
+                                  [(h, m, fp, json.dumps(f)) for h, m, fp, f in rows])
+            self.conn.executemany('INSERT OR REPLACE INTO files VALUES (?,?)', [(h, now) for h in hashes])
+
+    def evict(self) -> int:
+        """Drop least-recently-used files beyond `max_entries`; returns how many were removed."""
+        (count,) = self.conn.execute('SELECT COUNT(*) FROM files').fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return 0
+        with self.conn:
+            self.conn.execute('DELETE FROM files WHERE content_hash IN '
+                              '(SELECT content_hash FROM files ORDER BY last_used LIMIT ?)', (excess,))
+            self.conn.execute('DELETE FROM results WHERE content_hash NOT IN (SELECT content_hash FROM files)')
+        return excess
+
+    def close(self):
+        self.conn.close()
+
+
+def scan_buffer_cached(buf, content_hash: str, cache: FindingsCache, fingerprints: Dict[str, str], ruleset=None,
+                       profiler=None):
+    """Scan `buf`, reusing cached results for matchers whose fingerprint is unchanged.
+
+    Returns `(findings, new_rows)`; `new_rows` are the entries to pass to
+    `FindingsCache.store` and are empty on a full hit. Findings have the
+    same shape and order as `mmapscan.scan_buffer`. With a `profiler`, only
+    matchers that actually run are profiled, and results of a matcher that
+    was interrupted by the time cap are not cached.
+    """
+    cached = cache.lookup(content_hash, fingerprints)
+    lines = LineIndex(buf)
+    new_rows: List[Tuple[str, str, str, list]] = []
+    timeouts_before = len(profiler.timeouts) if profiler is not None else 0
+
+    if DETECTORS_KEY in cached:
+        findings = cached[DETECTORS_KEY]
+    else:
+        findings = detect_buffer(buf, profiler, lines=lines,
+                                 keywords=ruleset.keyword_matcher if ruleset is not None else None)
+        new_rows.append((content_hash, DETECTORS_KEY, fingerprints[DETECTORS_KEY], findings))
+
+    if ruleset is not None:
+        stale = [r for r in ruleset.rules if r.token_id not in cached]
+        if stale:
+            # a cold file goes through the prefiltered RuleSet; a few edited rules run on their own
+            fresh = match_buffer(buf, ruleset, None if len(stale) == len(ruleset.rules) else stale, profiler, lines)
+            by_rule: Dict[str, list] = {r.token_id: [] for r in stale}
+            for f in fresh:
+                by_rule[f['token_id']].append(f)
+            for tid, found in by_rule.items():
+                cached[tid] = found
+                new_rows.append((content_hash, tid, fingerprints[tid], found))
+        for tid in dict.fromkeys(r.token_id for r in ruleset.rules):
+            findings = findings + cached[tid]
+    if profiler is not None and len(profiler.timeouts) > timeouts_before:
+        interrupted = {t['matcher'] for t in profiler.timeouts[timeouts_before:] if t['interrupted']}
+        new_rows = [row for row in new_rows
+                    if row[1] not in interrupted and not (row[1] == DETECTORS_KEY and interrupted & DETECTOR_NAMES)]
+    # callers annotate findings (e.g. with a path); keep the cached rows untouched
+    return [dict(f) for f in findings], new_rows
+
+
+def scan_file_cached(path: Path, cache: FindingsCache, fingerprints: Dict[str, str], ruleset=None, profiler=None):
+    """Memory-map and scan `path` through the cache; see `scan_buffer_cached`.
+
+    Returns `(findings, nbytes, content_hash, new_rows)`.
+    """
+    with open_mmap(path) as buf:
+        content_hash = hashlib.sha256(buf).hexdigest()
+        findings, new_rows = scan_buffer_cached(buf, content_hash, cache, fingerprints, ruleset, profiler)
+        return findings, len(buf), content_hash, new_rows
@@ -1,21 +1,285 @@
 """Command-line interface for the scanner."""
 import argparse
-from .scanner import scan_text
+import json
+import sys
+import time
+from pathlib import Path
+from .scanner import scan_stream
+from .cache import DEFAULT_MAX_ENTRIES, FindingsCache
+from .decoders import (DEFAULT_MAX_BYTES, DEFAULT_MAX_DEPTH, DEFAULT_MAX_SECONDS, DecodeLimits, DecodeStats,
+                       scan_decoded_file)
+from .diffscan import DEFAULT_CONTEXT, scan_diff, scan_staged
+from .fingerprints import FingerprintIndex, load_key
+from .lines import LineIndex
+from .parallel import DEFAULT_CHUNK_SIZE, scan_directory
+from .profiling import DEFAULT_TIME_CAP, Profiler
+from .triage import TriageConfig
 
 
-def main():
-    p = argparse.ArgumentParser(description="Scan a file for potential secrets")
-    p.add_argument("path")
-    args = p.parse_args()
-    with open(args.path, "r", encoding="utf-8") as fh:
-        text = fh.read()
-    findings = scan_text(text)
+def _print_finding(f):
+    where = f"{f['commit'][:12]} " if 'commit' in f else ""
+    where += f"{f['path']}:" if 'path' in f else ""
+    if 'column' in f:
+        where += f"(line {f['lineno']}, col {f['column']}) "
+    elif 'lineno' in f:
+        where += f"(line {f['lineno']}) "
+    if 'encoding' in f:
+        where += f"in {f['encoding']} "
+    if 'matcher' in f:
+        score = f"severity={f['severity']}" if f['severity'] else f"confidence={f['confidence']:.2f}"
+        print(f"[{f['matcher']}] {where}{score} -> {f['value']}")
+    elif 'token_id' in f:
+        print(f"[{f['token_id']}] {where}severity={f['severity']} -> {f['match']}")
+    else:
+        print(f"[{f['detector']}] {where}confidence={f['confidence']:.2f} -> {f['snippet']}")
+
+
+def _print_context(f, context: int, indexes: dict, default_path=None):
+    path = f.get("path", default_path)
+    if not path or not f.get("lineno"):
+        return
+    if path not in indexes:
+        try:
+            indexes[path] = LineIndex(Path(path).read_bytes())
+        except OSError:
+            indexes[path] = None
+    lines = indexes[path]
+    if lines is None:
+        return
+    for n, line in lines.around(f["lineno"], context, context):
+        print(f"  {'>' if n == f['lineno'] else ' '}{n:>6} | {line}")
+
+
+def _print_findings(findings, context: int = 0, default_path=None):
+    """Print findings, each followed by `context` lines of its file before and after when `context` > 0."""
     if not findings:
         print("No findings detected")
     else:
+        # one LineIndex per file, shared by all its findings
+        indexes = {}
+        for f in findings:
+            _print_finding(f)
+            if context:
+                _print_context(f, context, indexes, default_path)
+
+
+def _track(args, findings, default_path=None):
+    """With --fingerprints, record findings in the index; returns the findings to print and a summary line."""
+    if not args.fingerprints:
+        return findings, None
+    salt = load_key(Path(args.fingerprint_key)) if args.fingerprint_key else None
+    index = FingerprintIndex(Path(args.fingerprints), salt=salt)
+    try:
+        new = index.observe(findings, default_path=default_path)
+        summary = (f"Fingerprints: {index.stats.new} new secrets, {index.stats.known} already known "
+                   f"({len(index)} in the index)")
+    finally:
+        index.close()
+    return (new if args.new_only else findings), summary
+
+
+def _load_ruleset(args):
+    if not args.rules:
+        return None
+    from .rules import RuleSet
+    return RuleSet.from_path(Path(args.rules))
+
+
+def _scan_git(args):
+    from .history import scan_history, scan_history_added
+    ruleset = _load_ruleset(args)
+    if args.added_only:
+        findings, stats = scan_history_added(Path(args.path), ruleset, revs=args.rev)
+    else:
+        cache = FindingsCache(Path(args.cache), max_entries=args.cache_max_entries) if args.cache else None
+        try:
+            findings, stats = scan_history(Path(args.path), ruleset, revs=args.rev, cache=cache)
+        finally:
+            if cache is not None:
+                cache.evict()
+                cache.close()
+    findings, summary = _track(args, findings)
+    _print_findings(findings)
+    if summary:
+        print(summary)
+    print(f"Scanned {stats.commits} commits: {stats.blob_refs} blob references, {stats.unique_blobs} unique, "
+          f"{stats.blobs_scanned} scanned ({stats.bytes_scanned} bytes)")
+
+
+def _scan_diff(args) -> int:
+    ruleset = _load_ruleset(args)
+    if args.staged:
+        findings, stats = scan_staged(Path(args.path), ruleset, context=args.diff_context)
+    elif args.diff == "-":
+        findings, stats = scan_diff(sys.stdin.buffer, ruleset)
+    else:
+        with open(args.diff, "rb") as fh:
+            findings, stats = scan_diff(fh, ruleset)
+    # non-zero so a pre-commit hook blocks the commit; decided on every finding, since --fingerprints
+    # records them even when the commit is blocked and a retry would otherwise pass
+    blocked = bool(findings)
+    findings, summary = _track(args, findings)
+    _print_findings(findings)
+    if summary:
+        print(summary)
+    print(f"Scanned {stats.files} files, {stats.hunks} hunks: {stats.lines_added} added lines "
+          f"({stats.bytes_scanned} bytes with context)")
+    return 1 if blocked else 0
+
+
+def _scan_with_daemon(args):
+    """Findings from a running `src.daemon` serving the same catalog, or None to scan locally."""
+    from .daemon import DEFAULT_SOCKET, DaemonClient, DaemonError
+    client = DaemonClient(args.socket or DEFAULT_SOCKET)
+    info = client.ping()
+    rules = str(Path(args.rules).resolve()) if args.rules else None
+    if info is None or info.get("rules_path") != rules:
+        return None
+    try:
+        findings = client.scan_path(Path(args.path), unified=args.unified)
+    except DaemonError:
+        return None
+    if not args.unified:
+        # match scan_stream, which does not annotate single-file findings with a path
         for f in findings:
-            print(f"[{f['detector']}] (line {f['lineno']}) confidence={f['confidence']:.2f} -> {f['snippet']}")
+            f.pop("path", None)
+    return findings
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Scan a file, directory or git history for potential secrets")
+    p.add_argument("path")
+    p.add_argument("--rules", help="rule catalog (rules.yaml, rules.db, gitleaks .toml, trufflehog .json; "
+                                    "comma-separate several) to run in addition to the detectors")
+    p.add_argument("--workers", type=int, default=None, help="worker processes for directory scans (default: CPU count)")
+    p.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="files per work unit")
+    p.add_argument("--exclude", action="append", default=[], help="glob of paths to skip (repeatable)")
+    p.add_argument("--cache", help="SQLite findings cache for incremental directory rescans")
+    p.add_argument("--cache-max-entries", type=int, default=DEFAULT_MAX_ENTRIES, help="files kept in the cache (LRU)")
+    p.add_argument("--git", action="store_true", help="scan the git history of the repository at path (bare repos work)")
+    p.add_argument("--added-only", action="store_true", help="with --git, scan only the lines each commit adds")
+    p.add_argument("--rev", action="append", default=[], help="with --git, revisions to scan (default: --all)")
+    p.add_argument("--staged", action="store_true",
+                   help="scan only the lines staged for commit in the repository at path (for pre-commit hooks)")
+    p.add_argument("--diff", metavar="FILE", help="scan only the lines a unified diff adds ('-' reads stdin)")
+    p.add_argument("--diff-context", type=int, default=DEFAULT_CONTEXT, metavar="N",
+                   help="with --staged, unchanged lines around each change scanned with it")
+    p.add_argument("--fingerprints", metavar="DB",
+                   help="record each secret's salted fingerprint in this index; duplicates collapse across scans")
+    p.add_argument("--fingerprint-key", metavar="FILE",
+                   help="with --fingerprints, keep the index salt in this file (created with mode 0600 if missing) "
+                        "instead of in the index")
+    p.add_argument("--new-only", action="store_true", help="with --fingerprints, report only secrets not seen before")
+    p.add_argument("--unified", action="store_true",
+                   help="single-pass engine: detectors and rules share one pass and one finding per span")
+    p.add_argument("--export", help="with --unified, write findings to this .ndjson or .parquet file (pyarrow)")
+    p.add_argument("--profile", action="store_true", help="time every detector and rule and print a report")
+    p.add_argument("--profile-out", help="with --profile, also write the report as JSON to this file")
+    p.add_argument("--time-cap", type=float, default=DEFAULT_TIME_CAP,
+                   help="with --profile, seconds a single matcher may spend on one file (0: no cap)")
+    p.add_argument("--context", type=int, default=0, metavar="N",
+                   help="print N lines of the file before and after each finding")
+    p.add_argument("--decode", action="store_true",
+                   help="also scan the content of base64, URL-encoded and gzip spans (file and directory scans)")
+    p.add_argument("--decode-depth", type=int, default=DEFAULT_MAX_DEPTH, metavar="N",
+                   help="with --decode, nested encodings to follow")
+    p.add_argument("--decode-max-bytes", type=int, default=DEFAULT_MAX_BYTES, metavar="N",
+                   help="with --decode, decoded bytes per file")
+    p.add_argument("--decode-time-cap", type=float, default=DEFAULT_MAX_SECONDS, metavar="SECONDS",
+                   help="with --decode, seconds of decoding per file")
+    p.add_argument("--socket", default=None, help="scan daemon socket to use when it is running (see src.daemon)")
+    p.add_argument("--no-daemon", action="store_true", help="always scan in this process")
+    p.add_argument("--triage", action="store_true",
+                   help="for directory scans, skip binary/ignored files and scan generated ones with known-format rules only")
+    p.add_argument("--triage-config", help="YAML overriding the triage limits and per-category levels (implies --triage)")
+    args = p.parse_args(argv)
+    if args.export and not args.unified:
+        p.error("--export requires --unified")
+    if args.new_only and not args.fingerprints:
+        p.error("--new-only requires --fingerprints")
+    if args.fingerprint_key and not args.fingerprints:
+        p.error("--fingerprint-key requires --fingerprints")
+    if args.new_only and (args.staged or args.diff):
+        p.error("--new-only cannot be combined with --staged or --diff")
+    if args.fingerprints and args.export:
+        p.error("--fingerprints cannot be combined with --export")
+    if args.decode and args.unified:
+        p.error("--decode cannot be combined with --unified")
+    decode = DecodeLimits(args.decode_depth, args.decode_max_bytes, args.decode_time_cap) if args.decode else None
+
+    if args.staged or args.diff:
+        return _scan_diff(args)
+    if args.git:
+        _scan_git(args)
+        return
+    decode_stats = None
+    if Path(args.path).is_dir():
+        triage = None
+        if args.triage_config:
+            triage = TriageConfig.from_yaml(Path(args.triage_config))
+        elif args.triage:
+            triage = TriageConfig()
+        findings, stats = scan_directory(Path(args.path), rules_path=args.rules, workers=args.workers,
+                                         chunk_size=args.chunk_size, exclude=args.exclude,
+                                         cache_path=args.cache, cache_max_entries=args.cache_max_entries,
+                                         profile=args.profile, time_cap=args.time_cap, unified=args.unified,
+                                         triage=triage, decode=decode)
+        profiler = stats.profile
+        decode_stats = stats.decode
+    else:
+        profiler = Profiler(args.time_cap) if args.profile else None
+        if profiler is not None:
+            profiler.path = args.path
+        use_daemon = not (args.no_daemon or args.profile or args.export or args.decode)
+        findings = _scan_with_daemon(args) if use_daemon else None
+        if findings is None and args.unified:
+            from .engine import Engine
+            from .findings import FindingStore
+            found, _ = Engine(_load_ruleset(args)).scan_file(Path(args.path), profiler)
+            findings = FindingStore()
+            findings.extend(findings.add_path(args.path), found)
+        elif findings is None:
+            ruleset = _load_ruleset(args)
+            start = time.perf_counter()
+            with open(args.path, "rb") as fh:
+                findings = list(scan_stream(fh, ruleset, profiler=profiler))
+            if decode is not None:
+                decode_stats = DecodeStats()
+                decode_stats.scan_seconds = time.perf_counter() - start
+                decode_args = (Path(args.path), ruleset, decode, decode_stats)
+                findings.extend(profiler.run("decoders", scan_decoded_file, *decode_args) if profiler is not None
+                                else scan_decoded_file(*decode_args))
+        stats = None
+
+    default_path = None if Path(args.path).is_dir() else args.path
+    if args.export and args.unified:
+        count = findings.export(Path(args.export))
+        print(f"Exported {count} findings to {args.export}")
+    else:
+        findings, summary = _track(args, findings, default_path)
+        _print_findings(findings, args.context, default_path)
+        if summary:
+            print(summary)
+    if stats is not None:
+        print(f"Scanned {stats.files} files ({stats.bytes_scanned} bytes) in {stats.seconds:.2f}s: "
+              f"{stats.files_per_sec:.1f} files/s, {stats.mb_per_sec:.2f} MB/s")
+        if stats.cache is not None:
+            print(f"Cache: {stats.cache.hits} hits, {stats.cache.misses} misses "
+                  f"({stats.cache.hit_rate:.0%} hit rate)")
+        if stats.triage is not None:
+            t = stats.triage
+            print(f"Triage: {t.files['full']} full, {t.files['known']} known-format, {t.files['skip']} skipped files; "
+                  f"{t.bytes_saved} of {sum(t.bytes.values())} bytes kept from the full scan")
+    if decode_stats is not None:
+        d = decode_stats
+        print(f"Decoders: {d.decoded} of {d.spans} candidate spans decoded ({d.bytes_decoded} bytes), "
+              f"{d.findings} findings, {d.seconds:.2f}s (+{d.overhead:.0%} scan time)"
+              + (f"; limits hit in {d.limited} files" if d.limited else ""))
+    if profiler is not None:
+        print(profiler.format_table())
+        if args.profile_out:
+            Path(args.profile_out).write_text(json.dumps(profiler.to_dict(), indent=2) + "\n", encoding="utf-8")
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,379 @@
+"""Long-running scan service with a warm rule catalog.
+
+Usage: python -m src.daemon [--rules rules/rules.yaml] [--socket PATH | --http 127.0.0.1:8765]
+
+The catalog is loaded once and kept compiled in a pool of worker processes,
+so a scan request costs only the matching itself. Requests are JSON objects:
+
+- ``{"op": "scan", "path": "/abs/file"}`` or ``{"op": "scan", "text": "..."}``,
+  optionally with ``"unified": true`` for `engine.Engine` findings;
+- ``{"op": "ping"}``, ``{"op": "stats"}`` and ``{"op": "reload"}``.
+
+Over the Unix socket each request and response is one line of JSON; over
+HTTP, ``POST /scan`` takes the scan request as the body and ``GET /ping`` /
+``GET /stats`` answer the other operations. Any local user can reach the
+HTTP port, so it only scans ``text`` (never reads files on a client's
+behalf) and refuses requests whose ``Host`` is not a local address, which
+is what a DNS-rebinding web page would send. Scan jobs go through a bounded
+queue: when it is full, connection handlers wait before reading more, which
+pushes back on clients. The rules file is polled for changes; a catalog that
+loads cleanly replaces the worker pool, one that fails keeps the old one.
+
+`DaemonClient` is the thin synchronous client used by `src.cli`.
+"""
+import argparse
+import asyncio
+import getpass
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from . import parallel
+from .mmapscan import scan_buffer
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f"secrets-scan-{getpass.getuser()}.sock")
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_POLL_INTERVAL = 1.0
+# largest request line/body accepted, in bytes
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+LOCAL_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+
+class DaemonError(RuntimeError):
+    pass
+
+
+def _host_name(host: str) -> str:
+    """Host name of a `Host` header value, without the port ("[::1]:8765" -> "::1")."""
+    if host.startswith("["):
+        return host[1:].partition("]")[0]
+    return host.rpartition(":")[0] if host.count(":") == 1 else host
+
+
+def _scan_job(job: dict):
+    # runs in a pool worker initialized by parallel._init_worker
+    unified = job.get("unified")
+    if "path" in job:
+        path = Path(job["path"])
+        if unified:
+            found, _ = parallel._ENGINE.scan_file(path)
+            return [dict(f.to_dict(), path=str(path)) for f in found]
+        return parallel.scan_file(path, parallel._RULESET)[0]
+    data = job["text"].encode("utf-8", "surrogateescape")
+    if unified:
+        return [f.to_dict() for f in parallel._ENGINE.scan(data)]
+    return scan_buffer(data, parallel._RULESET)
+
+
+def _rules_mtime(rules_path: Optional[Path]):
+    try:
+        return rules_path.stat().st_mtime_ns if rules_path else None
+    except OSError:
+        return None
+
+
+class ScanService:
+    def __init__(self, rules_path: Optional[Path] = None, workers: Optional[int] = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.rules_path = Path(rules_path).resolve() if rules_path else None
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self.generation = 0
+        self.rules = 0
+        self.requests = 0
+        self.reload_errors = 0
+        self.started = time.time()
+        self._pool = None
+        self._queue = None
+        self._tasks = []
+        # open client connections, closed by stop()
+        self._connections = set()
+        self._mtime = None
+
+    def _validate(self) -> int:
+        """Load the catalog once and return its rule count; raises if the catalog is invalid.
+
+        CPU-bound (YAML parsing, the regex guard's timing probes): it runs in
+        the loop's default executor so connections are served meanwhile.
+        """
+        if not self.rules_path:
+            return 0
+        from .rules import RuleSet
+        # validate (and count) in the service first so a broken file never reaches the workers
+        return len(RuleSet.from_path(self.rules_path).rules)
+
+    async def _load(self):
+        """Validate the catalog off the event loop, then swap in a pool warmed with it."""
+        count = await asyncio.get_running_loop().run_in_executor(None, self._validate)
+        rules_arg = str(self.rules_path) if self.rules_path else None
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=parallel._init_worker,
+                                   initargs=(rules_arg, None, None, True))
+        old, self._pool = self._pool, pool
+        self.rules = count
+        self.generation += 1
+        if old is not None:
+            # jobs already handed to the old pool still complete
+            old.shutdown(wait=False)
+
+    async def reload(self) -> bool:
+        """Reload the catalog; returns False (keeping the current one) if it fails to load."""
+        self._mtime = _rules_mtime(self.rules_path)
+        try:
+            await self._load()
+        except Exception as exc:
+            self.reload_errors += 1
+            print(f"reload failed, keeping generation {self.generation}: {exc}", file=sys.stderr)
+            return False
+        return True
+
+    async def start(self):
+        self._mtime = _rules_mtime(self.rules_path)
+        await self._load()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+        if self.rules_path and self.poll_interval:
+            self._tasks.append(asyncio.create_task(self._watch()))
+
+    async def stop(self):
+        tasks = self._tasks + list(self._connections)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, fut = await self._queue.get()
+            try:
+                result = await loop.run_in_executor(self._pool, _scan_job, job)
+            except Exception as exc:
+                if not fut.done():
+                    fut.set_exception(exc)
+            else:
+                if not fut.done():
+                    fut.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            mtime = _rules_mtime(self.rules_path)
+            if mtime is not None and mtime != self._mtime:
+                await self.reload()
+
+    def stats(self) -> dict:
+        return {"rules_path": str(self.rules_path) if self.rules_path else None, "rules": self.rules,
+                "generation": self.generation, "workers": self.workers, "queued": self._queue.qsize(),
+                "queue_size": self.queue_size, "requests": self.requests, "reload_errors": self.reload_errors,
+                "uptime": time.time() - self.started, "pid": os.getpid()}
+
+    async def handle(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True, "rules_path": str(self.rules_path) if self.rules_path else None,
+                    "generation": self.generation}
+        if op == "stats":
+            return dict(self.stats(), ok=True)
+        if op == "reload":
+            return {"ok": await self.reload(), "generation": self.generation}
+        if op != "scan":
+            return {"ok": False, "error": f"unknown op {op!r}"}
+        if ("path" in request) == ("text" in request):
+            return {"ok": False, "error": "scan needs exactly one of 'path' or 'text'"}
+        if "path" in request and not os.path.isabs(request["path"]):
+            return {"ok": False, "error": "path must be absolute"}
+        job = {k: request[k] for k in ("path", "text", "unified") if k in request}
+        fut = asyncio.get_running_loop().create_future()
+        self.requests += 1
+        # blocks this connection while the queue is full
+        await self._queue.put((job, fut))
+        try:
+            findings = await fut
+        except Exception as exc:
+            return {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+        return {"ok": True, "generation": self.generation, "findings": findings}
+
+    async def _serve_lines(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {"ok": False, "error": "invalid JSON"}
+                else:
+                    response = await self.handle(request)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _serve_http(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            request_line = await reader.readline()
+            parts = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length") or 0)
+            if len(parts) < 2 or length > MAX_REQUEST_BYTES:
+                status, response = "400 Bad Request", {"ok": False, "error": "bad request"}
+            elif _host_name(headers.get("host", "")) not in LOCAL_HOSTS:
+                # a page that rebinds its own DNS name to 127.0.0.1 still sends that name
+                status, response = "403 Forbidden", {"ok": False, "error": "Host must be a local address"}
+            else:
+                method, target = parts[0], parts[1]
+                body = await reader.readexactly(length) if length else b""
+                status, response = await self._route(method, target, body)
+            payload = json.dumps(response).encode()
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _route(self, method: str, target: str, body: bytes):
+        if method == "GET" and target in ("/ping", "/stats"):
+            return "200 OK", await self.handle({"op": target[1:]})
+        if method == "POST" and target in ("/scan", "/reload"):
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                return "400 Bad Request", {"ok": False, "error": "invalid JSON"}
+            if "path" in request:
+                # any local user can reach the port: it must not read files on their behalf
+                return "403 Forbidden", {"ok": False, "error": "scan by path is only served on the Unix socket"}
+            response = await self.handle(dict(request, op=target[1:]))
+            return ("200 OK" if response["ok"] else "400 Bad Request"), response
+        return "404 Not Found", {"ok": False, "error": f"no route for {method} {target}"}
+
+    async def serve_unix(self, path: str):
+        if os.path.lexists(path):
+            if not stat.S_ISSOCK(os.lstat(path).st_mode):
+                raise DaemonError(f"{path} exists and is not a socket")
+            if DaemonClient(path, timeout=1.0).ping() is not None:
+                raise DaemonError(f"a daemon is already listening on {path}")
+            # left behind by a daemon that did not shut down cleanly
+            os.unlink(path)
+        # the socket is created 0600: no window in which other users can connect
+        umask = os.umask(0o177)
+        try:
+            return await asyncio.start_unix_server(self._serve_lines, path=path, limit=MAX_REQUEST_BYTES)
+        finally:
+            os.umask(umask)
+
+    async def serve_http(self, host: str, port: int):
+        if host not in LOCAL_HOSTS:
+            raise DaemonError(f"refusing to listen on non-local address {host}")
+        return await asyncio.start_server(self._serve_http, host, port, limit=MAX_REQUEST_BYTES)
+
+
+async def serve(service: ScanService, socket_path: Optional[str] = None, http: Optional[str] = None):
+    await service.start()
+    if http:
+        host, _, port = http.rpartition(":")
+        server = await service.serve_http(host or "127.0.0.1", int(port))
+    else:
+        server = await service.serve_unix(socket_path or DEFAULT_SOCKET)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+        if not http and os.path.exists(socket_path or DEFAULT_SOCKET):
+            os.unlink(socket_path or DEFAULT_SOCKET)
+
+
+class DaemonClient:
+    """Blocking client for the Unix-socket protocol."""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout: Optional[float] = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def request(self, request: dict) -> dict:
+        if not hasattr(socket, "AF_UNIX"):
+            raise DaemonError("Unix sockets are not available on this platform")
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.settimeout(self.timeout)
+                s.connect(self.socket_path)
+                s.sendall(json.dumps(request).encode() + b"\n")
+                with s.makefile("rb") as fh:
+                    line = fh.readline()
+        except OSError as exc:
+            raise DaemonError(str(exc)) from exc
+        if not line:
+            raise DaemonError("daemon closed the connection")
+        return json.loads(line)
+
+    def ping(self) -> Optional[dict]:
+        """The daemon's ping response, or None if no daemon is listening."""
+        if not os.path.exists(self.socket_path):
+            return None
+        try:
+            return self.request({"op": "ping"})
+        except DaemonError:
+            return None
+
+    def scan_path(self, path: Path, unified: bool = False) -> list:
+        response = self.request({"op": "scan", "path": str(Path(path).resolve()), "unified": unified})
+        if not response.get("ok"):
+            raise DaemonError(response.get("error", "scan failed"))
+        return response["findings"]
+
+    def scan_text(self, text: str, unified: bool = False) -> list:
+        response = self.request({"op": "scan", "text": text, "unified": unified})
+        if not response.get("ok"):
+            raise DaemonError(response.get("error", "scan failed"))
+        return response["findings"]
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Serve scan requests with a warm rule catalog")
+    p.add_argument("--rules", help="rule catalog (rules.yaml, rules.db or .catalog); reloaded when it changes")
+    p.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket to listen on")
+    p.add_argument("--http", help="listen on localhost HTTP instead, e.g. 127.0.0.1:8765")
+    p.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    p.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="pending scans before clients wait")
+    p.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                   help="seconds between checks of the rules file (0: never reload)")
+    args = p.parse_args(argv)
+    service = ScanService(args.rules, args.workers, args.queue_size, args.poll_interval)
+    try:
+        asyncio.run(serve(service, args.socket, args.http))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
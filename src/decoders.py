@@ -0,0 +1,234 @@
+"""Decoders for encoded payloads: base64, URL-encoded and gzip content.
+
+A secret inside a base64 or URL-encoded config value, or a gzip stream,
+never matches the rules as is; the high-entropy detector at best reports
+the encoded blob. `scan_decoded` finds spans that look encoded, decodes
+each one into a new buffer and runs the detectors and the `RuleSet` over
+it, recursing into the decoded content (base64 of gzip of ...) up to
+`DecodeLimits.max_depth` levels.
+
+Candidate spans are found with bytes regexes straight over the scanned
+buffer (an mmap for files) and sliced as memoryviews, so only the decoded
+content is copied. Decoded output that is mostly not text (random bytes
+that happened to be valid base64) is dropped before it is scanned. The
+total decoded size and the time spent per file are capped; when a cap is
+hit the rest of the file is not decoded and `DecodeStats.limited` counts it.
+
+Findings from decoded content have `offset`, `lineno` and `column` of the
+outermost encoded span in the file, `encoding` (the decoder chain, e.g.
+`base64/gzip`) and `decoded_offset` within the innermost decoded buffer.
+"""
+import binascii
+import re
+import time
+import zlib
+from typing import List, Optional
+from urllib.parse import unquote_to_bytes
+
+from .lines import LineIndex, annotate
+from .mmapscan import open_mmap, scan_buffer
+
+MIN_BASE64_LEN = 24
+MIN_URL_ESCAPES = 3
+DEFAULT_MAX_DEPTH = 2
+DEFAULT_MAX_BYTES = 1 << 20
+DEFAULT_MAX_SECONDS = 0.5
+# share of decoded bytes that must be printable for base64/URL output to be scanned
+MIN_PRINTABLE = 0.9
+
+# "=" may precede a span: NAME=<base64>, --flag=<base64>
+BASE64_RE = re.compile(rb"(?<![A-Za-z0-9+/_-])[A-Za-z0-9+/_-]{%d,}={0,2}" % MIN_BASE64_LEN)
+# starts at an escape so the regex engine can skip to the next "%"; `_url_start` extends the span backwards
+URL_RE = re.compile(rb"%%[0-9A-Fa-f]{2}(?:[A-Za-z0-9._~+/=:&?-]*%%[0-9A-Fa-f]{2}){%d,}[A-Za-z0-9._~+/=:&?-]*"
+                    % (MIN_URL_ESCAPES - 1))
+# unescaped characters before the first escape that are included in a URL-encoded span
+MAX_URL_PREFIX = 256
+GZIP_MAGIC = b"\x1f\x8b\x08"
+
+_PRINTABLE = bytes(range(0x20, 0x7F)) + b"\t\n\r"
+_URLSAFE = bytes.maketrans(b"-_", b"+/")
+_URL_CHARS = frozenset(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789._~+/=:&?-")
+
+
+class DecodeLimits:
+    def __init__(self, max_depth: int = DEFAULT_MAX_DEPTH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_seconds: float = DEFAULT_MAX_SECONDS):
+        # nesting levels decoded below the file itself
+        self.max_depth = max_depth
+        # decoded bytes per file, across all levels
+        self.max_bytes = max_bytes
+        # wall time of the decode stage per file
+        self.max_seconds = max_seconds
+
+
+class DecodeStats:
+    def __init__(self):
+        self.files = 0
+        self.spans = 0
+        self.decoded = 0
+        self.bytes_decoded = 0
+        self.findings = 0
+        self.limited = 0
+        # time spent decoding and scanning decoded content
+        self.seconds = 0.0
+        # time of the regular scan of the same files, the baseline for `overhead`
+        self.scan_seconds = 0.0
+
+    @property
+    def overhead(self):
+        """Decode stage time relative to the regular scan."""
+        return self.seconds / self.scan_seconds if self.scan_seconds else 0.0
+
+    def to_dict(self):
+        return {"files": self.files, "spans": self.spans, "decoded": self.decoded,
+                "bytes_decoded": self.bytes_decoded, "findings": self.findings, "limited": self.limited,
+                "seconds": self.seconds, "scan_seconds": self.scan_seconds, "overhead": self.overhead}
+
+    def merge(self, other: dict):
+        for k in ("files", "spans", "decoded", "bytes_decoded", "findings", "limited", "seconds", "scan_seconds"):
+            setattr(self, k, getattr(self, k) + other[k])
+
+
+def _mostly_text(data: bytes) -> bool:
+    return len(data.translate(None, _PRINTABLE)) <= len(data) * (1 - MIN_PRINTABLE)
+
+
+def decode_base64(span) -> Optional[bytes]:
+    """Decode a base64 (standard or URL-safe, padding optional) span; None if it is not valid."""
+    data = bytes(span).rstrip(b"=")
+    if b"-" in data or b"_" in data:
+        if b"+" in data or b"/" in data:
+            return None
+        data = data.translate(_URLSAFE)
+    if len(data) % 4 == 1:
+        return None
+    try:
+        return binascii.a2b_base64(data + b"=" * (-len(data) % 4))
+    except binascii.Error:
+        return None
+
+
+def _usable_base64(span) -> Optional[bytes]:
+    """Decoded `span` if it is valid base64 of text or of a gzip stream, else None."""
+    decoded = decode_base64(span)
+    if decoded and (decoded.startswith(GZIP_MAGIC) or _mostly_text(decoded)):
+        return decoded
+    return None
+
+
+def _url_start(buf, start: int, floor: int) -> int:
+    limit = max(floor, start - MAX_URL_PREFIX)
+    while start > limit and buf[start - 1] in _URL_CHARS:
+        start -= 1
+    return start
+
+
+def decode_url(span) -> Optional[bytes]:
+    return unquote_to_bytes(bytes(span))
+
+
+def decode_gzip(buf, start: int, max_bytes: int) -> Optional[bytes]:
+    """Decompress the gzip stream at `buf[start:]`, at most `max_bytes` of it; None if it is not valid."""
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        return d.decompress(memoryview(buf)[start:], max_bytes)
+    except zlib.error:
+        return None
+
+
+class _Decoder:
+    """State of the decode stage for one file."""
+
+    def __init__(self, ruleset, limits: DecodeLimits, stats: DecodeStats):
+        self.ruleset = ruleset
+        self.limits = limits
+        self.stats = stats
+        self.budget = limits.max_bytes
+        self.deadline = time.perf_counter() + limits.max_seconds
+        self.stopped = False
+
+    def _exhausted(self) -> bool:
+        if not self.stopped and (self.budget <= 0 or time.perf_counter() > self.deadline):
+            self.stopped = True
+            self.stats.limited += 1
+        return self.stopped
+
+    def _spans(self, buf):
+        """`(start, encoding, decoded)` for each decodable span of `buf`, in order."""
+        for m in BASE64_RE.finditer(buf):
+            if self._exhausted():
+                return
+            self.stats.spans += 1
+            start = m.start()
+            decoded = _usable_base64(memoryview(buf)[start:m.end()])
+            if decoded is None:
+                # "-" and "_" also join words to the value ("data-<base64>"): retry after the last one
+                cut = max(buf.rfind(b"-", start, m.end()), buf.rfind(b"_", start, m.end())) + 1
+                if cut and m.end() - cut >= MIN_BASE64_LEN:
+                    start = cut
+                    decoded = _usable_base64(memoryview(buf)[start:m.end()])
+            if decoded is not None:
+                yield start, "base64", decoded
+        end = 0
+        for m in URL_RE.finditer(buf):
+            if self._exhausted():
+                return
+            self.stats.spans += 1
+            start = _url_start(buf, m.start(), end)
+            end = m.end()
+            decoded = decode_url(memoryview(buf)[start:end])
+            if _mostly_text(decoded):
+                yield start, "url", decoded
+        pos = buf.find(GZIP_MAGIC)
+        while pos != -1 and not self._exhausted():
+            self.stats.spans += 1
+            decoded = decode_gzip(buf, pos, self.budget)
+            if decoded:
+                yield pos, "gzip", decoded
+            pos = buf.find(GZIP_MAGIC, pos + 1)
+
+    def scan(self, buf, depth: int) -> List[dict]:
+        """Findings in content decoded from `buf`, with offsets into `buf`."""
+        findings = []
+        for start, encoding, decoded in self._spans(buf):
+            decoded = decoded[:max(0, self.budget)]
+            self.budget -= len(decoded)
+            self.stats.decoded += 1
+            self.stats.bytes_decoded += len(decoded)
+            # a compressed stream is only worth decompressing, not scanning
+            found = [] if decoded.startswith(GZIP_MAGIC) else scan_buffer(decoded, self.ruleset)
+            for f in found:
+                f["decoded_offset"] = f["offset"]
+            if depth + 1 < self.limits.max_depth:
+                found.extend(self.scan(decoded, depth + 1))
+            for f in found:
+                f["offset"] = start
+                f["encoding"] = f"{encoding}/{f['encoding']}" if "encoding" in f else encoding
+            findings.extend(found)
+        return findings
+
+
+def scan_decoded(buf, ruleset=None, limits: Optional[DecodeLimits] = None, stats: Optional[DecodeStats] = None,
+                 lines: Optional[LineIndex] = None) -> List[dict]:
+    """Scan the content of the encoded spans of `buf`; see the module docstring.
+
+    `lines` is the `LineIndex` of `buf` if the caller already has one.
+    """
+    limits = limits or DecodeLimits()
+    stats = stats if stats is not None else DecodeStats()
+    start = time.perf_counter()
+    findings = []
+    if limits.max_depth > 0:
+        findings = _Decoder(ruleset, limits, stats).scan(buf, 0)
+        annotate(findings, lines or LineIndex(buf))
+    stats.files += 1
+    stats.findings += len(findings)
+    stats.seconds += time.perf_counter() - start
+    return findings
+
+
+def scan_decoded_file(path, ruleset=None, limits: Optional[DecodeLimits] = None,
+                      stats: Optional[DecodeStats] = None) -> List[dict]:
+    """Memory-map `path` and run `scan_decoded` over it."""
+    with open_mmap(path) as buf:
+        return scan_decoded(buf, ruleset, limits, stats)
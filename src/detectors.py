@@ -1,72 +1,177 @@
 """Simple detectors for secrets scanning."""
 import re
-import math
+from .entropy import batch_entropy, shannon_entropy as _shannon_entropy
+from .lines import LineIndex
+from .prefilter import trie_pattern
+
+# bump whenever detector behaviour changes so cached results are invalidated
+DETECTOR_VERSION = 3
 
 KEYWORDS = ["password", "secret", "token", "apikey", "api_key", "aws_access_key_id", "private_key"]
+# shorter keywords (e.g. from a catalog's keywords_prefixes) would flag too many lines
+MIN_KEYWORD_LEN = 3
+# characters (bytes) lowercased at a time by the keyword detector, extended to a line boundary
+KEYWORD_CHUNK = 1 << 20
 
 AWS_ACCESS_KEY_RE = re.compile(r"AKIA[0-9A-Z]{16}")
 PRIVATE_KEY_BEGIN = re.compile(r"-----BEGIN (RSA|DSA|EC|OPENSSH) PRIVATE KEY-----")
+# reported instead of the key material
+PRIVATE_KEY_SNIPPET = "<privkey>"
 GENERIC_SECRET_RE = re.compile(r"(?P<quote>[\'\"])?(?P<val>[A-Za-z0-9]{20,})\1")
 
 
-def _shannon_entropy(data: str) -> float:
-    if not data:
-        return 0.0
-    import collections
-    counts = collections.Counter(data)
-    entropy = 0.0
-    for c in counts.values():
-        p = c / len(data)
-        entropy -= p * math.log2(p)
-    return entropy
-
-
 class Finding:
-    def __init__(self, detector: str, snippet: str, lineno: int, confidence: float):
+    __slots__ = ("detector", "snippet", "lineno", "confidence", "offset", "column")
+
+    def __init__(self, detector: str, snippet: str, lineno: int, confidence: float, offset: int = None,
+                 column: int = 1):
         self.detector = detector
         self.snippet = snippet
         self.lineno = lineno
         self.confidence = confidence
+        # character offset of the match in the scanned text, when known
+        self.offset = offset
+        self.column = column
 
     def to_dict(self):
         return {
             "detector": self.detector,
             "snippet": self.snippet,
             "lineno": self.lineno,
+            "column": self.column,
             "confidence": self.confidence,
         }
 
 
-def detect_aws_access_key(text: str):
-    findings = []
-    for m in AWS_ACCESS_KEY_RE.finditer(text):
-        findings.append(Finding("aws-access-key", m.group(0), 0, 0.9))
-    return findings
+def located_finding(detector: str, snippet: str, confidence: float, offset: int, lines: LineIndex) -> Finding:
+    """A `Finding` at `offset`, with line and column looked up in `lines`."""
+    lineno, column = lines.position(offset)
+    return Finding(detector, snippet, lineno, confidence, offset, column)
+
+
+def detect_aws_access_key(text: str, lines: LineIndex = None):
+    """`lines` is a `LineIndex` over `text` shared between detectors; one is built if omitted."""
+    lines = lines or LineIndex(text)
+    return [located_finding("aws-access-key", m.group(0), 0.9, m.start(), lines) for m in AWS_ACCESS_KEY_RE.finditer(text)]
 
 
-def detect_private_key(text: str):
+def detect_private_key(text: str, lines: LineIndex = None):
     findings = []
-    if PRIVATE_KEY_BEGIN.search(text):
-        findings.append(Finding("private-key-block", "<privkey>", 0, 0.95))
+    m = PRIVATE_KEY_BEGIN.search(text)
+    if m:
+        findings.append(located_finding("private-key-block", PRIVATE_KEY_SNIPPET, 0.95, m.start(), lines or LineIndex(text)))
     return findings
 
 
-def detect_high_entropy_strings(text: str, entropy_threshold: float = 3.5):
+def detect_high_entropy_strings(text: str, entropy_threshold: float = 3.5, stats=None, lines: LineIndex = None):
+    candidates = [(m.group('val'), m.start('val')) for m in GENERIC_SECRET_RE.finditer(text)]
+    return high_entropy_findings(candidates, entropy_threshold, lines=lines or LineIndex(text), stats=stats)
+
+
+def high_entropy_findings(candidates, entropy_threshold: float = 3.5, lines: LineIndex = None, stats=None):
+    """Score `(value, offset)` candidates in one entropy batch and keep those above the threshold.
+
+    `lines`, if given, is the `LineIndex` the offsets index into; `stats`
+    is an optional `profiling.MatcherStats`.
+    """
+    if stats is not None:
+        stats.candidates += len(candidates)
+    candidates = [(val, off) for val, off in candidates if len(val) >= 20]
+    entropies = batch_entropy([val for val, _ in candidates], threshold=entropy_threshold)
+    if stats is not None:
+        stats.matches += len(candidates)
     findings = []
-    for m in GENERIC_SECRET_RE.finditer(text):
-        val = m.group('val')
-        ent = _shannon_entropy(val)
-        if ent >= entropy_threshold and len(val) >= 20:
-            findings.append(Finding("high-entropy", val, 0, min(0.5 + (ent - entropy_threshold) / 4, 0.95)))
+    for (val, off), ent in zip(candidates, entropies):
+        if ent is None or ent < entropy_threshold:
+            if stats is not None:
+                stats.entropy_rejected += 1
+        else:
+            lineno, column = lines.position(off) if lines else (0, 1)
+            findings.append(Finding("high-entropy", val, lineno, min(0.5 + (ent - entropy_threshold) / 4, 0.95), off,
+                                    column))
     return findings
 
 
-def detect_keywords_context(text: str):
+class KeywordMatcher:
+    """Finds the lines mentioning any of a (possibly large) keyword list in one case-insensitive pass.
+
+    The keywords are compiled into one trie-shaped regex (`prefilter.trie_pattern`)
+    that runs case-sensitively over lowercased, line-aligned chunks of the
+    input, so the search stays linear in the input whether there are 7 or
+    700 keywords, and memory is bounded by `KEYWORD_CHUNK` plus one line.
+    Bytes input is lowercased as bytes, which only folds ASCII; when a
+    keyword is not ASCII, bytes chunks are decoded and searched as text.
+    """
+
+    def __init__(self, keywords=KEYWORDS):
+        self.keywords = sorted({k.lower() for k in keywords
+                                if len(k) >= MIN_KEYWORD_LEN and any(c.isalnum() for c in k)})
+        # keywords that extend a shorter one are dropped from the pattern; the line is found either way
+        self.pattern = trie_pattern(self.keywords, shortest=True) if self.keywords else None
+        self._re = re.compile(self.pattern) if self.pattern else None
+        self._re_bytes = re.compile(self.pattern.encode("utf-8")) if self.pattern else None
+        self._re_ignorecase = None
+        # bytes.lower() only folds ASCII: with a non-ASCII keyword, bytes chunks are searched decoded
+        self._decode_bytes = not all(k.isascii() for k in self.keywords)
+
+    def _search_decoded(self, chunk):
+        """`_search_chunk` over a bytes chunk decoded as UTF-8, with offsets mapped back to bytes."""
+        text = bytes(chunk).decode("utf-8", "surrogateescape")
+        char_pos = byte_pos = 0
+        for hit in self._search_chunk(text, True):
+            byte_pos += len(text[char_pos:hit].encode("utf-8", "surrogateescape"))
+            char_pos = hit
+            yield byte_pos
+
+    def _search_chunk(self, chunk, is_text: bool):
+        """Offsets in `chunk` of the first keyword hit of each line, in order."""
+        if not is_text and self._decode_bytes:
+            yield from self._search_decoded(chunk)
+            return
+        low = chunk.lower()
+        regex = self._re if is_text else self._re_bytes
+        if len(low) != len(chunk):
+            # a few characters (e.g. U+0130) lowercase to two; keep offsets exact for this chunk
+            if self._re_ignorecase is None:
+                self._re_ignorecase = re.compile(self.pattern, re.IGNORECASE)
+            low, regex = chunk, self._re_ignorecase
+        nl = "\n" if is_text else b"\n"
+        pos = 0
+        while True:
+            m = regex.search(low, pos)
+            if m is None:
+                return
+            yield m.start()
+            pos = low.find(nl, m.end()) + 1
+            if pos == 0:
+                return
+
+    def lines(self, text):
+        """Yield `(start, end)` offsets of each line of `text` (str or bytes-like) holding a keyword, in order."""
+        if self.pattern is None:
+            return
+        is_text = isinstance(text, str)
+        nl = "\n" if is_text else b"\n"
+        chunk_start = 0
+        while chunk_start < len(text):
+            chunk_end = text.find(nl, min(chunk_start + KEYWORD_CHUNK, len(text)))
+            chunk_end = len(text) if chunk_end == -1 else chunk_end + 1
+            chunk = text[chunk_start:chunk_end]
+            for hit in self._search_chunk(chunk, is_text):
+                hit += chunk_start
+                start = text.rfind(nl, chunk_start, hit) + 1 or chunk_start
+                end = text.find(nl, hit, chunk_end)
+                yield start, len(text) if end == -1 else end
+            chunk_start = chunk_end
+
+
+DEFAULT_KEYWORDS = KeywordMatcher()
+
+
+def detect_keywords_context(text: str, lines: LineIndex = None, keywords: KeywordMatcher = None):
+    """One finding per line mentioning a keyword; `keywords` defaults to `KEYWORDS`."""
+    lines = lines or LineIndex(text)
     findings = []
-    for i, line in enumerate(text.splitlines(), start=1):
-        low = line.lower()
-        for kw in KEYWORDS:
-            if kw in low and any(c.isalnum() for c in low):
-                findings.append(Finding("keyword-context", line.strip(), i, 0.4))
-                break
+    for start, end in (keywords or DEFAULT_KEYWORDS).lines(text):
+        findings.append(Finding("keyword-context", text[start:end].strip(), lines.lineno(start), 0.4, start))
     return findings
@@ -0,0 +1,135 @@
+"""Diff-only scanning for pre-commit hooks.
+
+`scan_diff` reads a unified diff (`git diff --cached`, or any `diff -u`
+style patch from stdin) and scans only the new side of each hunk: the
+added lines plus the context lines the diff carries around them, so a
+pattern that spans lines still sees its neighbours. Each hunk's new side
+is scanned as one buffer; a finding is reported only if it covers an
+added line, with its line number mapped to the new file.
+Unchanged parts of the touched files are never read, so the cost follows
+the size of the change.
+"""
+import subprocess
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from .history import GitError, _git, _unquote
+from .mmapscan import scan_buffer
+
+# context lines requested from git around each change
+DEFAULT_CONTEXT = 3
+
+
+class DiffStats:
+    def __init__(self):
+        self.files = 0
+        self.hunks = 0
+        self.lines_added = 0
+        self.bytes_scanned = 0
+
+    def to_dict(self):
+        return {"files": self.files, "hunks": self.hunks, "lines_added": self.lines_added,
+                "bytes_scanned": self.bytes_scanned}
+
+
+class Hunk:
+    """New-side lines of one hunk: `lines` holds `(new_lineno, text, added)`."""
+
+    __slots__ = ("path", "lines")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lines: List[Tuple[int, str, bool]] = []
+
+
+def _hunk_range(spec: bytes) -> Tuple[int, int]:
+    # "-a,b" / "+c,d"; the count defaults to 1
+    start, _, count = spec[1:].partition(b",")
+    return int(start), int(count) if count else 1
+
+
+def parse_unified_diff(lines: Iterable[bytes]):
+    """Yield a `Hunk` per hunk of a unified diff given as bytes lines; deleted files are skipped.
+
+    Hunk bodies are delimited by the line counts in their `@@` header, so
+    added lines that look like file headers ("+++ x") are read correctly.
+    """
+    path = None
+    hunk = None
+    old_left = new_left = 0
+    lineno = 0
+    for raw in lines:
+        if hunk is not None and (old_left > 0 or new_left > 0):
+            tag, text = raw[:1], raw[1:].rstrip(b"\n").rstrip(b"\r")
+            if tag == b"\\":
+                # "\ No newline at end of file"
+                continue
+            if tag == b"-":
+                old_left -= 1
+                continue
+            added = tag == b"+"
+            if not added:
+                old_left -= 1
+            new_left -= 1
+            hunk.lines.append((lineno, text.decode("utf-8", "surrogateescape"), added))
+            lineno += 1
+            if old_left <= 0 and new_left <= 0:
+                yield hunk
+                hunk = None
+            continue
+        if raw.startswith(b"+++ "):
+            target = raw[4:].rstrip(b"\r\n").split(b"\t")[0]
+            path = None if target == b"/dev/null" else _unquote(target)
+            if path is not None and path[:2] == "b/":
+                path = path[2:]
+        elif raw.startswith(b"@@ ") and path is not None:
+            parts = raw.split(b" ")
+            old_left = _hunk_range(parts[1])[1]
+            lineno, new_left = _hunk_range(parts[2])
+            hunk = Hunk(path)
+            if old_left == 0 and new_left == 0:
+                hunk = None
+
+
+def scan_hunks(hunks: Iterable[Hunk], ruleset=None, stats: Optional[DiffStats] = None):
+    """Scan each hunk's new side; returns finding dicts with `path` and new-file `lineno`."""
+    stats = stats if stats is not None else DiffStats()
+    findings = []
+    paths = set()
+    for hunk in hunks:
+        paths.add(hunk.path)
+        stats.hunks += 1
+        # 1-based positions within the hunk of the added lines
+        added = {i for i, (_, _, is_added) in enumerate(hunk.lines, 1) if is_added}
+        if not added:
+            continue
+        stats.lines_added += len(added)
+        data = ("\n".join(text for _, text, _ in hunk.lines) + "\n").encode("utf-8", "surrogateescape")
+        stats.bytes_scanned += len(data)
+        for f in scan_buffer(data, ruleset):
+            first = f["lineno"]
+            value = f.get("match", f.get("snippet", ""))
+            if added.isdisjoint(range(first, first + value.count("\n") + 1)):
+                # lies entirely in context lines, which the commit does not change
+                continue
+            f["lineno"] = hunk.lines[first - 1][0]
+            # offsets are relative to the scanned hunk, not the file
+            f.pop("offset", None)
+            f["path"] = hunk.path
+            findings.append(f)
+    stats.files = len(paths)
+    return findings, stats
+
+
+def scan_diff(lines: Iterable[bytes], ruleset=None):
+    """Scan the added lines of a unified diff; returns `(findings, DiffStats)`."""
+    return scan_hunks(parse_unified_diff(lines), ruleset)
+
+
+def scan_staged(repo: Path, ruleset=None, context: int = DEFAULT_CONTEXT):
+    """Scan what `git commit` would add in `repo` (`git diff --cached`); returns `(findings, DiffStats)`."""
+    cmd = _git(repo, "diff", "--cached", f"-U{context}", "--no-color", "--no-ext-diff", "--find-renames")
+    proc = subprocess.run(cmd, capture_output=True)
+    if proc.returncode != 0:
+        raise GitError(proc.stderr.decode("utf-8", "replace").strip())
+    return scan_diff(proc.stdout.splitlines(keepends=True), ruleset)
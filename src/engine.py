@@ -0,0 +1,166 @@
+"""Single-pass scan engine over the built-in detectors and the rule catalog.
+
+The built-in detectors are expressed as rules (`BUILTIN_RULES`) and indexed
+together with the catalog in one `RuleIndex`, so the input is walked once by
+the combined literal prefilter and each regex only runs where its literals
+occur. Every matcher emits the same `ScanFinding`, carrying line, column and
+byte offset.
+
+When several matchers report the same span, e.g. the `aws-access-key`
+detector and rule `AWS-001` on one key, a single finding is kept: the
+catalog rule's if there is one, otherwise the first built-in in
+`BUILTIN_RULES` order. All matchers that reported it are listed in
+`ScanFinding.matchers`.
+"""
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from . import detectors
+from .lines import LineIndex
+from .mmapscan import open_mmap
+from .prefilter import RuleIndex
+from .rules import Rule
+
+BUILTIN_CATEGORY = "builtin"
+
+
+def keyword_line_pattern(keywords: detectors.KeywordMatcher) -> str:
+    """One match per line mentioning a keyword, like `detect_keywords_context`."""
+    return r"(?im)^[ \t]*(?P<val>[^\n]*?" + keywords.pattern + r"[^\n]*?)[ \t\r]*$"
+
+
+class BuiltinRule(Rule):
+    """A built-in detector expressed as a catalog rule.
+
+    `confidence` is fixed per detector, or None to derive it from entropy as
+    `detect_high_entropy_strings` does. `first_only` keeps only the first
+    match per input and `redact` replaces the reported value.
+    """
+
+    def __init__(self, row, confidence=None, first_only=False, redact=None):
+        super().__init__(dict(row, detection_category=BUILTIN_CATEGORY))
+        self.confidence = confidence
+        self.first_only = first_only
+        self.redact = redact
+
+
+def _keyword_rule(keywords: detectors.KeywordMatcher) -> BuiltinRule:
+    return BuiltinRule({"token_id": "keyword-context", "token_name": "Secret keyword",
+                        "regex_pattern": keyword_line_pattern(keywords)}, confidence=0.4)
+
+
+BUILTIN_RULES = [
+    BuiltinRule({"token_id": "aws-access-key", "token_name": "AWS access key ID",
+                 "regex_pattern": detectors.AWS_ACCESS_KEY_RE.pattern}, confidence=0.9),
+    BuiltinRule({"token_id": "private-key-block", "token_name": "Private key block",
+                 "regex_pattern": detectors.PRIVATE_KEY_BEGIN.pattern}, confidence=0.95, first_only=True,
+                redact=detectors.PRIVATE_KEY_SNIPPET),
+    BuiltinRule({"token_id": "high-entropy", "token_name": "High-entropy string",
+                 "regex_pattern": detectors.GENERIC_SECRET_RE.pattern, "minimum_entropy": 3.5}),
+    _keyword_rule(detectors.DEFAULT_KEYWORDS),
+]
+
+
+class ScanFinding:
+    """One finding of the unified engine.
+
+    `offset` and `end` delimit the matched bytes (UTF-8 for str input);
+    `value` is their text unless the matcher redacts it. `lineno` and
+    `column` are 1-based and `column` counts characters. `matcher` is the
+    rule `token_id` or built-in detector name that reported the finding.
+    """
+    __slots__ = ("matcher", "name", "category", "value", "lineno", "column", "offset", "end", "severity",
+                 "confidence", "entropy", "matchers")
+
+    def __init__(self, matcher, name, category, value, offset, end, severity=None, confidence=None, entropy=None):
+        self.matcher = matcher
+        self.name = name
+        self.category = category
+        self.value = value
+        self.lineno = 0
+        self.column = 0
+        self.offset = offset
+        self.end = end
+        self.severity = severity
+        self.confidence = confidence
+        self.entropy = entropy
+        self.matchers = [matcher]
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        return f"ScanFinding({self.matcher!r}, {self.value!r}, line={self.lineno}, col={self.column})"
+
+
+def _finding(rule, f, is_text: bool) -> ScanFinding:
+    # `end` is a character offset for str input until `_locate` converts it
+    end = f["offset"] + (len(f["match"]) if is_text else len(f["match"].encode("utf-8")))
+    if isinstance(rule, BuiltinRule):
+        confidence = rule.confidence
+        if confidence is None:
+            confidence = min(0.5 + (f["entropy"] - rule.minimum_entropy) / 4, 0.95)
+        return ScanFinding(rule.token_id, rule.token_name, rule.detection_category, rule.redact or f["match"],
+                           f["offset"], end, confidence=confidence, entropy=f["entropy"])
+    return ScanFinding(rule.token_id, rule.token_name, rule.detection_category, f["match"], f["offset"], end,
+                       severity=f["severity"], entropy=f["entropy"])
+
+
+def _locate(text, findings: List[ScanFinding]):
+    # findings are sorted by offset: lines and columns come from one LineIndex,
+    # and byte offsets for str input from one forward walk
+    lines = LineIndex(text)
+    is_text = isinstance(text, str)
+    pos = 0
+    byte_pos = 0
+    for f in findings:
+        off = f.offset
+        f.lineno, f.column = lines.position(off)
+        if is_text:
+            byte_pos += len(text[pos:off].encode("utf-8", "surrogateescape"))
+            f.offset = byte_pos
+            f.end = byte_pos + len(text[off:f.end].encode("utf-8", "surrogateescape"))
+            pos = off
+
+
+class Engine:
+    """Runs the built-in detectors and an optional `RuleSet` in one pass."""
+
+    def __init__(self, ruleset=None, builtins=True):
+        """`builtins` is True for every built-in, False for none, or a collection of their names."""
+        catalog = list(ruleset.rules) if ruleset is not None else []
+        if builtins is True or builtins is False:
+            chosen = list(BUILTIN_RULES) if builtins else []
+        else:
+            chosen = [r for r in BUILTIN_RULES if r.token_id in builtins]
+        if ruleset is not None:
+            # the keyword built-in also looks for the catalog's keywords_prefixes
+            chosen = [_keyword_rule(ruleset.keyword_matcher) if r.token_id == "keyword-context" else r
+                      for r in chosen]
+        # catalog rules first: they win span ties against the built-ins
+        self.rules = catalog + chosen
+        self.index = RuleIndex(self.rules)
+
+    def scan(self, text, profiler=None) -> List[ScanFinding]:
+        """Scan a str or bytes-like buffer and return findings ordered by offset."""
+        is_text = isinstance(text, str)
+        by_span: Dict[Tuple[int, str], ScanFinding] = {}
+        for i, found in self.index.iter_matches(text, profiler):
+            rule = self.rules[i]
+            if getattr(rule, "first_only", False):
+                found = found[:1]
+            for f in found:
+                key = (f["offset"], f["match"])
+                kept = by_span.get(key)
+                if kept is None:
+                    by_span[key] = _finding(rule, f, is_text)
+                elif rule.token_id not in kept.matchers:
+                    kept.matchers.append(rule.token_id)
+        findings = sorted(by_span.values(), key=lambda f: f.offset)
+        _locate(text, findings)
+        return findings
+
+    def scan_file(self, path: Path, profiler=None):
+        """Memory-map `path` and scan it; returns `(findings, nbytes)`."""
+        with open_mmap(path) as buf:
+            return self.scan(buf, profiler), len(buf)
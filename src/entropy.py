@@ -0,0 +1,82 @@
+"""Shannon entropy shared by the detectors and the rule matcher.
+
+`batch_entropy` scores many candidate strings at once. With NumPy
+installed, ASCII candidates are scored together from a single byte
+histogram (`bincount` over `(candidate, byte)` pairs); otherwise, and for
+non-ASCII candidates, a pure-Python `Counter` is used. When a threshold is
+given, candidates that provably cannot reach it are rejected before any
+histogram is built: a string of length n with k distinct characters has at
+most log2(min(n, k)) bits of entropy.
+"""
+import math
+from collections import Counter
+from typing import List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+# below this many candidates the NumPy setup cost is not worth it
+NUMPY_MIN_BATCH = 32
+# candidates per histogram block; bounds the (block x 256) count matrix
+NUMPY_BLOCK = 4096
+
+
+def shannon_entropy(data: str) -> float:
+    if not data:
+        return 0.0
+    n = len(data)
+    entropy = 0.0
+    for c in Counter(data).values():
+        p = c / n
+        entropy -= p * math.log2(p)
+    return entropy
+
+
+def max_entropy(data: str) -> float:
+    """Cheap upper bound on `shannon_entropy(data)` from its length alone."""
+    return math.log2(len(data)) if data else 0.0
+
+
+def _numpy_entropies(values: List[str]) -> List[float]:
+    out: List[float] = []
+    for start in range(0, len(values), NUMPY_BLOCK):
+        block = [v.encode("ascii") for v in values[start:start + NUMPY_BLOCK]]
+        lengths = np.fromiter((len(b) for b in block), dtype=np.int64, count=len(block))
+        data = np.frombuffer(b"".join(block), dtype=np.uint8)
+        owner = np.repeat(np.arange(len(block), dtype=np.int64), lengths)
+        counts = np.bincount(owner * 256 + data, minlength=len(block) * 256).reshape(len(block), 256)
+        c = counts.astype(np.float64)
+        # H = log2(n) - sum(c * log2(c)) / n, with 0 * log2(0) taken as 0
+        clogc = (c * np.log2(np.where(c > 0, c, 1.0))).sum(axis=1)
+        n = np.maximum(lengths, 1).astype(np.float64)
+        ent = np.where(lengths > 0, np.log2(n) - clogc / n, 0.0)
+        out.extend(ent.tolist())
+    return out
+
+
+def batch_entropy(values: Sequence[str], threshold: Optional[float] = None) -> List[Optional[float]]:
+    """Entropy of every value, in order.
+
+    With `threshold`, values whose entropy is certainly below it are returned
+    as None without computing their entropy; every other value gets its exact
+    entropy (which may still be below the threshold).
+    """
+    result: List[Optional[float]] = [None] * len(values)
+    pending = []
+    for i, v in enumerate(values):
+        if threshold and (max_entropy(v) < threshold or math.log2(len(set(v)) or 1) < threshold):
+            continue
+        pending.append(i)
+
+    vectorized = []
+    if np is not None and len(pending) >= NUMPY_MIN_BATCH:
+        vectorized = [i for i in pending if values[i].isascii()]
+        for i, ent in zip(vectorized, _numpy_entropies([values[i] for i in vectorized])):
+            result[i] = ent
+        done = set(vectorized)
+        pending = [i for i in pending if i not in done]
+    for i in pending:
+        result[i] = shannon_entropy(values[i])
+    return result
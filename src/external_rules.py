@@ -0,0 +1,342 @@
+"""Load gitleaks and trufflehog rule files as catalog `Rule`s.
+
+`load_gitleaks` reads a gitleaks TOML config and `load_trufflehog` a
+trufflehog3-style JSON rule list; both return `(rules, skipped)`, where
+`skipped` lists the entries that could not be translated and why. Rules
+are namespaced (`gitleaks:<id>`, `trufflehog:<id>`) so they can share a
+`RuleSet` with `rules.yaml`, and run through the same prefilter, guard and
+entropy checks.
+
+gitleaks patterns are Go RE2; `translate_re2` rewrites the syntax Python's
+`re` spells differently (`(?<name>`, `\\z`, `\\Q..\\E`, `\\x{..}`, POSIX
+classes, flags in the middle of a pattern, literal `{,n}`) and rejects
+what it cannot express (`(?U)`, most `\\p{..}` classes, `\\C`). The
+secret is the capture group named by `secretGroup`, else the first group,
+else the whole match, as gitleaks does. Rule `entropy` becomes
+`minimum_entropy`; `keywords`, `path` conditions and allowlists are not
+translated (rules with a `path` are skipped).
+
+`differential` compares our findings with a gitleaks or trufflehog report
+over the same tree, for `tools.diff_external`.
+"""
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+from .rules import Rule
+
+GITLEAKS = 'gitleaks'
+TRUFFLEHOG = 'trufflehog'
+DEFAULT_SEVERITY = 'Medium'
+
+_POSIX_CLASSES = {
+    'alnum': '0-9A-Za-z', 'alpha': 'A-Za-z', 'ascii': '\\x00-\\x7f', 'blank': '\\t ',
+    'cntrl': '\\x00-\\x1f\\x7f', 'digit': '0-9', 'graph': '!-~', 'lower': 'a-z', 'print': ' -~',
+    'punct': '!-/:-@\\[-`{-~', 'space': '\\t\\n\\v\\f\\r ', 'upper': 'A-Z', 'word': '0-9A-Za-z_',
+    'xdigit': '0-9A-Fa-f',
+}
+# \p{..} classes with a Python equivalent: (outside a class, negated outside, inside a class)
+_UNICODE_CLASSES = {
+    'L': ('[^\\W\\d_]', '[\\W\\d_]', None),
+    'N': ('\\d', '\\D', '\\d'),
+    'Nd': ('\\d', '\\D', '\\d'),
+}
+_FLAGS_GROUP = re.compile(r'\(\?([a-zA-Z-]+)([:)])')
+_NAMED_GROUP = re.compile(r'\(\?P?<([A-Za-z_][A-Za-z0-9_]*)>')
+_EMPTY_MIN = re.compile(r'\{,\d*\}')
+
+
+class UnsupportedPattern(ValueError):
+    """An RE2 construct with no Python `re` equivalent."""
+
+
+def _escape(pattern: str, i: int, in_class: bool) -> Tuple[str, int]:
+    """Translate the escape sequence at `pattern[i]`; returns `(python, next index)`."""
+    nxt = pattern[i + 1:i + 2]
+    if nxt == 'z':
+        return '\\Z', i + 2
+    if nxt == 'Q':
+        end = pattern.find('\\E', i + 2)
+        end = len(pattern) if end < 0 else end
+        return re.escape(pattern[i + 2:end]), min(end + 2, len(pattern))
+    if nxt == 'x' and pattern[i + 2:i + 3] == '{':
+        end = pattern.index('}', i + 3)
+        return f'\\U{int(pattern[i + 3:end], 16):08x}', end + 1
+    if nxt in ('p', 'P'):
+        if pattern[i + 2:i + 3] == '{':
+            end = pattern.index('}', i + 3)
+            name, after = pattern[i + 3:end], end + 1
+        else:
+            name, after = pattern[i + 2:i + 3], i + 3
+        forms = _UNICODE_CLASSES.get(name)
+        negated = nxt == 'P' or name.startswith('^')
+        form = None
+        if forms is not None:
+            form = forms[2] if in_class else forms[1] if negated else forms[0]
+            if in_class and negated:
+                form = None
+        if form is None:
+            raise UnsupportedPattern(f'unsupported class \\{nxt}{{{name}}}')
+        return form, after
+    if nxt == 'C':
+        raise UnsupportedPattern('unsupported \\C (any byte)')
+    return pattern[i:i + 2], i + 2
+
+
+def translate_re2(pattern: str) -> str:
+    """Rewrite a Go RE2 pattern for Python `re`; raises `UnsupportedPattern`."""
+    out = []
+    # per open group, the scoped flag groups opened inside it: RE2 flags last until the group ends
+    scopes: List[List[str]] = [[]]
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '\\':
+            tok, i = _escape(pattern, i, False)
+            out.append(tok)
+        elif c == '[':
+            i = _translate_class(pattern, i, out)
+        elif c == '(':
+            m = _FLAGS_GROUP.match(pattern, i)
+            named = _NAMED_GROUP.match(pattern, i)
+            if m and 'U' in m.group(1):
+                raise UnsupportedPattern('unsupported ungreedy flag (?U)')
+            if m and m.group(2) == ')':
+                if i == 0:
+                    out.append(m.group(0))
+                else:
+                    out.append(f'(?{m.group(1)}:')
+                    scopes[-1].append(m.group(1))
+                i = m.end()
+                continue
+            scopes.append([])
+            if named:
+                out.append(f'(?P<{named.group(1)}>')
+                i = named.end()
+            else:
+                out.append(c)
+                i += 1
+        elif c == ')':
+            out.append(')' * len(scopes.pop() if len(scopes) > 1 else []) + ')')
+            i += 1
+        elif c == '|':
+            flags = scopes[-1]
+            out.append(')' * len(flags) + '|' + ''.join(f'(?{f}:' for f in flags))
+            i += 1
+        elif c == '{' and _EMPTY_MIN.match(pattern, i):
+            # RE2 reads `{,n}` literally; Python would repeat 0..n times
+            out.append('\\{')
+            i += 1
+        else:
+            out.append(c)
+            i += 1
+    out.append(')' * len(scopes[0]))
+    return ''.join(out)
+
+
+def _translate_class(pattern: str, i: int, out: List[str]) -> int:
+    """Translate the bracket expression starting at `pattern[i]`; returns the index after it."""
+    out.append('[')
+    i += 1
+    if pattern[i:i + 1] == '^':
+        out.append('^')
+        i += 1
+    if pattern[i:i + 1] == ']':
+        out.append('\\]')
+        i += 1
+    while i < len(pattern):
+        c = pattern[i]
+        if c == ']':
+            out.append(']')
+            return i + 1
+        if c == '\\':
+            tok, i = _escape(pattern, i, True)
+            out.append(tok)
+        elif pattern.startswith('[:', i):
+            end = pattern.find(':]', i + 2)
+            name = pattern[i + 2:end] if end > 0 else ''
+            if name not in _POSIX_CLASSES:
+                raise UnsupportedPattern(f'unsupported POSIX class [:{name}:]')
+            out.append(_POSIX_CLASSES[name])
+            i = end + 2
+        elif c in '[&~|':
+            # Python warns about these as possible set operations
+            out.append('\\' + c)
+            i += 1
+        else:
+            out.append(c)
+            i += 1
+    raise UnsupportedPattern('unterminated character class')
+
+
+def name_group(pattern: str, number: int, name: str = 'val') -> str:
+    """Rename capture group `number` (1-based) of a Python pattern to `name`."""
+    count = 0
+    i, in_class = 0, False
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\':
+            i += 2
+            continue
+        if in_class:
+            in_class = c != ']'
+        elif c == '[':
+            in_class = True
+            if pattern[i + 1:i + 2] == '^':
+                i += 1
+            if pattern[i + 1:i + 2] == ']':
+                i += 1
+        elif c == '(':
+            named = _NAMED_GROUP.match(pattern, i)
+            if named or pattern[i + 1:i + 2] != '?':
+                count += 1
+                if count == number:
+                    end = named.end() if named else i + 1
+                    return pattern[:i] + f'(?P<{name}>' + pattern[end:]
+        i += 1
+    raise ValueError(f'pattern has no capture group {number}')
+
+
+def _secret_group(pattern: str, group) -> str:
+    if 'val' in re.compile(pattern).groupindex:
+        return pattern
+    if group:
+        return name_group(pattern, int(group))
+    if re.compile(pattern).groups:
+        return name_group(pattern, 1)
+    return pattern
+
+
+def _rule(tool: str, rid: str, pattern: str, entry: dict) -> Rule:
+    severity = entry.get('severity') or DEFAULT_SEVERITY
+    return Rule({
+        'token_id': f'{tool}:{rid}',
+        'token_name': entry.get('description') or entry.get('message') or rid,
+        'detection_category': f'External/{tool}',
+        'regex_pattern': pattern,
+        'minimum_entropy': entry.get('entropy'),
+        'default_severity': str(severity).capitalize(),
+        'rule_status': 'Active',
+    })
+
+
+def load_gitleaks(path: Path) -> Tuple[List[Rule], List[Dict[str, str]]]:
+    """Rules of a gitleaks TOML config; returns `(rules, skipped)`."""
+    if tomllib is None:
+        raise ImportError('reading gitleaks configs needs Python 3.11+ or the tomli package')
+    with open(path, 'rb') as fh:
+        config = tomllib.load(fh)
+    rules, skipped = [], []
+    for entry in config.get('rules', []):
+        rid = entry.get('id', '')
+        if 'path' in entry:
+            skipped.append({'id': rid, 'reason': 'path conditions are not supported'})
+            continue
+        if 'regex' not in entry:
+            skipped.append({'id': rid, 'reason': 'no regex'})
+            continue
+        try:
+            pattern = _secret_group(translate_re2(entry['regex']), entry.get('secretGroup'))
+            rules.append(_rule(GITLEAKS, rid, pattern, entry))
+        except (UnsupportedPattern, ValueError, re.error) as e:
+            skipped.append({'id': rid, 'reason': str(e)})
+    return rules, skipped
+
+
+def load_trufflehog(path: Path) -> Tuple[List[Rule], List[Dict[str, str]]]:
+    """Rules of a trufflehog JSON rule file (`{"rules": [{id, regex|pattern, ...}]}`); returns `(rules, skipped)`.
+
+    Patterns are used as-is when Python accepts them (trufflehog3 rules are
+    Python regexes) and translated as RE2 otherwise.
+    """
+    with open(path, 'r', encoding='utf-8') as fh:
+        data = json.load(fh)
+    entries = data.get('rules', []) if isinstance(data, dict) else data
+    rules, skipped = [], []
+    for entry in entries:
+        rid = entry.get('id', '')
+        pattern = entry.get('regex') or entry.get('pattern')
+        if not pattern:
+            skipped.append({'id': rid, 'reason': 'no regex'})
+            continue
+        try:
+            try:
+                re.compile(pattern)
+            except re.error:
+                pattern = translate_re2(pattern)
+            rules.append(_rule(TRUFFLEHOG, rid, _secret_group(pattern, entry.get('secretGroup')), entry))
+        except (UnsupportedPattern, ValueError, re.error) as e:
+            skipped.append({'id': rid, 'reason': str(e)})
+    return rules, skipped
+
+
+def native_findings(ruleset, root: Path, files) -> set:
+    """`(relative path, line, rule id)` of every finding of `ruleset` in `files`, ids without the tool prefix."""
+    found = set()
+    for path in files:
+        text = Path(path).read_text(encoding='utf-8', errors='replace')
+        rel = Path(path).relative_to(root).as_posix()
+        for f in ruleset.match_text(text):
+            rid = f['token_id'].split(':', 1)[-1]
+            found.add((rel, text.count('\n', 0, f['offset']) + 1, rid))
+    return found
+
+
+def parse_gitleaks_report(data, root: Path) -> set:
+    """`(relative path, line, rule id)` from a gitleaks JSON report."""
+    found = set()
+    for item in data:
+        found.add((_relative(item['File'], root), item['StartLine'], item['RuleID']))
+    return found
+
+
+def parse_trufflehog_report(lines, root: Path) -> set:
+    """`(relative path, line, rule id)` from trufflehog3 JSON or JSON-lines output."""
+    found = set()
+    items = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            value = json.loads(line)
+            items.extend(value if isinstance(value, list) else [value])
+    for item in items:
+        rule = item.get('rule') or {}
+        rid = rule.get('id') if isinstance(rule, dict) else rule
+        found.add((_relative(item['path'], root), int(item.get('line') or 0), rid or item.get('id')))
+    return found
+
+
+def _relative(path: str, root: Path) -> str:
+    p = Path(path)
+    if p.is_absolute():
+        try:
+            p = p.relative_to(Path(root).resolve())
+        except ValueError:
+            return p.as_posix()
+    return p.as_posix()
+
+
+def differential(ours: set, theirs: set, scanned) -> dict:
+    """Where two sets of `(path, line, rule id)` findings disagree.
+
+    Findings of theirs in files outside `scanned` (relative paths we scanned)
+    are counted separately, since file selection differs between tools.
+    """
+    scanned = set(scanned)
+    outside = {f for f in theirs if f[0] not in scanned}
+    theirs = theirs - outside
+    return {
+        'agreed': len(ours & theirs),
+        'only_ours': sorted(ours - theirs),
+        'only_theirs': sorted(theirs - ours),
+        'unscanned_files': len({f[0] for f in outside}),
+    }
@@ -0,0 +1,224 @@
+"""Compact, columnar storage for large numbers of `engine.ScanFinding`s.
+
+A `FindingStore` keeps one typed `array` per numeric column. Matcher ids,
+their metadata and the lists of co-reporting matchers are interned, and a
+finding's value is kept as the `(offset, end)` span of its source rather
+than as a string: sources are file paths (re-read on demand) or in-memory
+buffers. Only values that cannot be recovered from the span (redacted or
+lossily decoded) are stored as strings.
+
+Dicts are materialized on demand, one row at a time or in batches, and the
+store can be exported to NDJSON or, with `pyarrow` installed, to Arrow record
+batches and Parquet. A path source is read when its rows are materialized,
+so the file must not change between scanning and exporting.
+"""
+import json
+import math
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from .mmapscan import open_mmap
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional dependency
+    pa = None
+
+DEFAULT_BATCH_SIZE = 65536
+
+# order of the keys of a materialized row; matches `ScanFinding.to_dict()` plus `path`
+COLUMNS = ("matcher", "name", "category", "value", "lineno", "column", "offset", "end", "severity", "confidence",
+           "entropy", "matchers", "path")
+
+
+def _nan(value: Optional[float]) -> float:
+    return math.nan if value is None else value
+
+
+def _none(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+class FindingStore:
+    """Append-only, array-backed table of findings; iterates as dicts."""
+
+    def __init__(self):
+        self._source = array("i")
+        self._matcher = array("i")
+        self._matchers = array("i")
+        self._lineno = array("i")
+        self._column = array("q")
+        self._offset = array("q")
+        self._end = array("q")
+        self._confidence = array("d")
+        self._entropy = array("d")
+        # interned tables
+        self._sources: List[object] = []
+        self._matcher_meta: List[tuple] = []
+        self._matcher_ids: Dict[str, int] = {}
+        self._groups: List[tuple] = []
+        self._group_ids: Dict[tuple, int] = {}
+        # row -> value for findings whose value is not their source span
+        self._values: Dict[int, str] = {}
+        # the most recently read path source, as (source id, bytes)
+        self._loaded = (None, b"")
+
+    def __len__(self):
+        return len(self._offset)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def add_path(self, path) -> int:
+        """Register a file whose findings will be appended; returns its source id."""
+        self._sources.append(str(path))
+        return len(self._sources) - 1
+
+    def add_buffer(self, data) -> int:
+        """Register an in-memory str or bytes buffer; returns its source id."""
+        if isinstance(data, str):
+            data = data.encode("utf-8", "surrogateescape")
+        self._sources.append(bytes(data))
+        return len(self._sources) - 1
+
+    def _intern_matcher(self, f) -> int:
+        mid = self._matcher_ids.get(f.matcher)
+        if mid is None:
+            mid = self._matcher_ids[f.matcher] = len(self._matcher_meta)
+            self._matcher_meta.append((f.matcher, f.name, f.category, f.severity))
+        return mid
+
+    def _intern_group(self, matchers) -> int:
+        key = tuple(matchers)
+        gid = self._group_ids.get(key)
+        if gid is None:
+            gid = self._group_ids[key] = len(self._groups)
+            self._groups.append(key)
+        return gid
+
+    def append(self, source_id: int, f):
+        """Add one `ScanFinding` found in source `source_id`."""
+        row = len(self)
+        self._source.append(source_id)
+        self._matcher.append(self._intern_matcher(f))
+        self._matchers.append(self._intern_group(f.matchers))
+        self._lineno.append(f.lineno)
+        self._column.append(f.column)
+        self._offset.append(f.offset)
+        self._end.append(f.end)
+        self._confidence.append(_nan(f.confidence))
+        self._entropy.append(_nan(f.entropy))
+        value = f.value
+        if "\ufffd" in value or len(value.encode("utf-8", "surrogateescape")) != f.end - f.offset:
+            self._values[row] = value
+
+    def extend(self, source_id: int, findings):
+        for f in findings:
+            self.append(source_id, f)
+
+    def _source_bytes(self, source_id: int):
+        source = self._sources[source_id]
+        if not isinstance(source, str):
+            return source
+        if self._loaded[0] != source_id:
+            with open_mmap(Path(source)) as buf:
+                self._loaded = (source_id, bytes(buf))
+        return self._loaded[1]
+
+    def value(self, row: int) -> str:
+        value = self._values.get(row)
+        if value is None:
+            data = self._source_bytes(self._source[row])
+            value = bytes(data[self._offset[row]:self._end[row]]).decode("utf-8", "surrogateescape")
+        return value
+
+    def path(self, row: int) -> Optional[str]:
+        source = self._sources[self._source[row]]
+        return source if isinstance(source, str) else None
+
+    def row(self, i: int) -> dict:
+        """Materialize row `i` as a dict with the keys in `COLUMNS`."""
+        matcher, name, category, severity = self._matcher_meta[self._matcher[i]]
+        return {
+            "matcher": matcher,
+            "name": name,
+            "category": category,
+            "value": self.value(i),
+            "lineno": self._lineno[i],
+            "column": self._column[i],
+            "offset": self._offset[i],
+            "end": self._end[i],
+            "severity": severity,
+            "confidence": _none(self._confidence[i]),
+            "entropy": _none(self._entropy[i]),
+            "matchers": list(self._groups[self._matchers[i]]),
+            "path": self.path(i),
+        }
+
+    def __getitem__(self, i: int) -> dict:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.row(i)
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def iter_batches(self, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Dict[str, list]]:
+        """Yield `{column: [values]}` batches of up to `batch_size` rows."""
+        for start in range(0, len(self), batch_size):
+            rows = [self.row(i) for i in range(start, min(start + batch_size, len(self)))]
+            yield {c: [r[c] for r in rows] for c in COLUMNS}
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns and interned tables (excluding in-memory sources)."""
+        total = sum(a.itemsize * len(a) for a in (self._source, self._matcher, self._matchers, self._lineno,
+                                                     self._column, self._offset, self._end, self._confidence,
+                                                     self._entropy))
+        total += sum(len(s) for s in self._sources if isinstance(s, str))
+        total += sum(sum(len(x or "") for x in meta) for meta in self._matcher_meta)
+        total += sum(len(v) + 64 for v in self._values.values())
+        return total
+
+    def to_ndjson(self, fh, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """Write one JSON object per line to the text file `fh`; returns the row count."""
+        for start in range(0, len(self), batch_size):
+            end = min(start + batch_size, len(self))
+            fh.write("".join(json.dumps(self.row(i)) + "\n" for i in range(start, end)))
+        return len(self)
+
+    def to_arrow_batches(self, batch_size: int = DEFAULT_BATCH_SIZE):
+        """Yield `pyarrow.RecordBatch`es; requires pyarrow."""
+        if pa is None:
+            raise RuntimeError("Arrow/Parquet export requires pyarrow (pip install pyarrow)")
+        for batch in self.iter_batches(batch_size):
+            yield pa.RecordBatch.from_pydict(batch, schema=arrow_schema())
+
+    def to_parquet(self, path: Path, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """Write the store to a Parquet file batch by batch; requires pyarrow."""
+        if pa is None:
+            raise RuntimeError("Arrow/Parquet export requires pyarrow (pip install pyarrow)")
+        import pyarrow.parquet as pq
+        with pq.ParquetWriter(str(path), arrow_schema()) as writer:
+            for batch in self.to_arrow_batches(batch_size):
+                writer.write_batch(batch)
+        return len(self)
+
+    def export(self, path: Path, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """Write to `path` as Parquet (`.parquet`) or NDJSON (anything else)."""
+        if Path(path).suffix == ".parquet":
+            return self.to_parquet(path, batch_size)
+        with open(path, "w", encoding="utf-8") as fh:
+            return self.to_ndjson(fh, batch_size)
+
+
+def arrow_schema():
+    return pa.schema([
+        ("matcher", pa.string()), ("name", pa.string()), ("category", pa.string()), ("value", pa.string()),
+        ("lineno", pa.int64()), ("column", pa.int64()), ("offset", pa.int64()), ("end", pa.int64()),
+        ("severity", pa.string()), ("confidence", pa.float64()), ("entropy", pa.float64()),
+        ("matchers", pa.list_(pa.string())), ("path", pa.string()),
+    ])
@@ -0,0 +1,329 @@
+"""Secret fingerprint index: deduplicate findings across files and scans.
+
+Each finding's secret value is normalized and hashed with a per-index
+random salt (keyed BLAKE2b), so the index never holds a raw secret and the
+same secret has unrelated fingerprints in different indexes. By default
+the salt is stored in the index, so whoever holds the index can still
+confirm a guessed secret (and keyword-context snippets are whole lines,
+often guessable); to rule that out, keep the salt in a separate key file
+(`load_key`) and pass it in, and the index stores only a check value.
+`FingerprintIndex` keeps one SQLite row per fingerprint with the
+number of sightings and the first and last time and location it was seen.
+`observe` records a batch of findings and returns one finding per secret
+the index had not seen before, so repeated scans can report only new
+secrets.
+
+An in-memory Bloom filter over the stored fingerprints answers most
+lookups of new secrets without touching SQLite; only fingerprints the
+filter may contain are looked up, in batches. The filter is saved in the
+database on `close` and rebuilt from the table when it is missing, out of
+date or over capacity. Several processes can share one index: `observe`
+writes under SQLite's write lock, and an index that sees secrets added by
+another process stops trusting its filter and looks every fingerprint up.
+"""
+import datetime
+import hashlib
+import json
+import math
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .detectors import PRIVATE_KEY_SNIPPET
+
+DEFAULT_CAPACITY = 1_000_000
+DEFAULT_ERROR_RATE = 0.001
+SALT_BYTES = 16
+FINGERPRINT_BYTES = 16
+# fingerprints per `IN (...)` lookup, below SQLite's default variable limit
+LOOKUP_BATCH = 500
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value BLOB
+);
+CREATE TABLE IF NOT EXISTS secrets (
+    fingerprint BLOB PRIMARY KEY,
+    matcher TEXT,
+    occurrences INTEGER NOT NULL,
+    first_seen TEXT NOT NULL,
+    first_commit TEXT,
+    first_path TEXT,
+    first_lineno INTEGER,
+    last_seen TEXT NOT NULL,
+    last_commit TEXT,
+    last_path TEXT,
+    last_lineno INTEGER
+) WITHOUT ROWID;
+'''
+
+_QUOTES = '\'"`'
+
+
+def normalize(value: str) -> str:
+    """The secret as compared across findings: surrounding whitespace and quotes removed."""
+    return value.strip().strip(_QUOTES).strip()
+
+
+def secret_value(finding: dict) -> Optional[str]:
+    """Secret value of a finding dict (detector, rule or unified engine), or None if it is redacted."""
+    value = finding.get('match', finding.get('value', finding.get('snippet')))
+    if value is None or value == PRIVATE_KEY_SNIPPET:
+        return None
+    value = normalize(value)
+    return value or None
+
+
+def _location(finding: dict, default_path: Optional[str] = None) -> tuple:
+    return finding.get('commit'), finding.get('path', default_path), finding.get('lineno')
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+
+
+def _salt_check(salt: bytes) -> bytes:
+    return hashlib.blake2b(b'salt-check', digest_size=FINGERPRINT_BYTES, key=salt).digest()
+
+
+def load_key(path: Path) -> bytes:
+    """The salt held in the key file `path`, which is created (mode 0600) with a random salt if missing."""
+    path = Path(path)
+    try:
+        fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return bytes.fromhex(path.read_text(encoding='utf-8').strip())
+    with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+        fh.write(os.urandom(SALT_BYTES).hex() + '\n')
+    return bytes.fromhex(path.read_text(encoding='utf-8').strip())
+
+
+class BloomFilter:
+    """Bloom filter over fingerprints, which are already uniform hashes.
+
+    The `hashes` bit positions of a fingerprint are derived from its two
+    64-bit halves by double hashing.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE, bits: bytes = None):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray(bits) if bits is not None else bytearray((self.size + 7) // 8)
+
+    def add(self, fp: bytes):
+        bits = self.bits
+        size = self.size
+        pos = int.from_bytes(fp[:8], 'little') % size
+        step = (int.from_bytes(fp[8:16], 'little') | 1) % size
+        for _ in range(self.hashes):
+            bits[pos >> 3] |= 1 << (pos & 7)
+            pos = (pos + step) % size
+
+    def __contains__(self, fp: bytes) -> bool:
+        bits = self.bits
+        size = self.size
+        pos = int.from_bytes(fp[:8], 'little') % size
+        step = (int.from_bytes(fp[8:16], 'little') | 1) % size
+        for _ in range(self.hashes):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+            pos = (pos + step) % size
+        return True
+
+
+class IndexStats:
+    def __init__(self):
+        self.observed = 0
+        self.unfingerprinted = 0
+        self.new = 0
+        self.known = 0
+        self.bloom_negatives = 0
+        self.db_lookups = 0
+        self.bloom_false_positives = 0
+
+    def to_dict(self):
+        return {'observed': self.observed, 'unfingerprinted': self.unfingerprinted, 'new': self.new,
+                'known': self.known, 'bloom_negatives': self.bloom_negatives, 'db_lookups': self.db_lookups,
+                'bloom_false_positives': self.bloom_false_positives}
+
+
+class FingerprintIndex:
+    def __init__(self, path: Path, salt: Optional[bytes] = None, capacity: int = DEFAULT_CAPACITY,
+                 error_rate: float = DEFAULT_ERROR_RATE):
+        """Open or create the index at `path`.
+
+        Without `salt`, a new index gets a random salt stored in the index
+        itself. A `salt` given for a new index stays with the caller: only a
+        check value is stored, and the index must be opened with the same
+        salt again. An existing index refuses a different `salt`.
+        """
+        self.path = Path(path)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        # with WAL, NORMAL only risks the last transactions on power loss, never corruption
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        meta = dict(self.conn.execute('SELECT key, value FROM meta'))
+        if 'salt' not in meta and 'salt_check' not in meta:
+            stored = ('salt', os.urandom(SALT_BYTES)) if salt is None else ('salt_check', _salt_check(salt))
+            with self.conn:
+                # another process may create the same index at once; the first salt written wins
+                self.conn.executemany('INSERT OR IGNORE INTO meta VALUES (?, ?)', [stored, ('count', 0)])
+            meta = dict(self.conn.execute('SELECT key, value FROM meta'))
+        if 'salt' in meta:
+            if salt is not None and salt != meta['salt']:
+                raise ValueError(f'{self.path} was created with a different salt')
+            self.salt = bytes(meta['salt'])
+        elif salt is None:
+            raise ValueError(f'{self.path} keeps its salt outside the index; pass it to open the index')
+        elif _salt_check(salt) != meta['salt_check']:
+            raise ValueError(f'{self.path} was created with a different salt')
+        else:
+            self.salt = salt
+        # stored secrets the Bloom filter covers
+        self.count = int(meta.get('count', 0))
+        self.error_rate = error_rate
+        self.stats = IndexStats()
+        self.bloom = None
+        self._bloom_dirty = False
+        # set when another process added secrets the filter does not hold; lookups then go to SQLite
+        self._bloom_stale = False
+        if 'bloom' in meta and int(meta.get('bloom_count', -1)) == self.count:
+            saved = json.loads(meta['bloom_params'])
+            if saved['error_rate'] == error_rate and saved['capacity'] >= self.count:
+                self.bloom = BloomFilter(saved['capacity'], error_rate, meta['bloom'])
+        if self.bloom is None:
+            self._rebuild_bloom(max(capacity, 2 * self.count))
+
+    def _rebuild_bloom(self, capacity: int):
+        self.bloom = BloomFilter(capacity, self.error_rate)
+        for (fp,) in self.conn.execute('SELECT fingerprint FROM secrets'):
+            self.bloom.add(fp)
+        self._bloom_dirty = True
+
+    def fingerprint(self, value: str) -> bytes:
+        """Salted fingerprint of an already normalized secret value."""
+        return hashlib.blake2b(value.encode('utf-8', 'surrogateescape'), digest_size=FINGERPRINT_BYTES,
+                               key=self.salt).digest()
+
+    def __len__(self):
+        return int(self.conn.execute("SELECT value FROM meta WHERE key = 'count'").fetchone()[0])
+
+    def _lookup(self, fps: List[bytes]) -> Dict[bytes, int]:
+        """`{fingerprint: occurrences}` for the stored ones among `fps`."""
+        found = {}
+        for i in range(0, len(fps), LOOKUP_BATCH):
+            batch = fps[i:i + LOOKUP_BATCH]
+            self.stats.db_lookups += 1
+            rows = self.conn.execute('SELECT fingerprint, occurrences FROM secrets WHERE fingerprint IN '
+                                     f'({",".join("?" * len(batch))})', batch)
+            found.update((bytes(fp), n) for fp, n in rows)
+        return found
+
+    def get(self, value: str) -> Optional[dict]:
+        """The stored record of a secret value (normalized first), or None."""
+        fp = self.fingerprint(normalize(value))
+        if fp not in self.bloom and not self._bloom_stale:
+            return None
+        cur = self.conn.execute('SELECT * FROM secrets WHERE fingerprint = ?', (fp,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        record = dict(zip((d[0] for d in cur.description), row))
+        record['fingerprint'] = fp.hex()
+        return record
+
+    def observe(self, findings: Iterable[dict], seen_at: Optional[str] = None,
+                default_path: Optional[str] = None) -> List[dict]:
+        """Record `findings` and return the first finding of each secret new to the index.
+
+        Every returned finding carries its `fingerprint` (hex) and how many
+        `occurrences` of the secret the batch held. Findings whose value is
+        redacted (private key blocks) cannot be fingerprinted and are always
+        returned. `default_path` is the location recorded for findings
+        without a `path`.
+        """
+        seen_at = seen_at or _now()
+        groups: Dict[bytes, List[dict]] = {}
+        out = []
+        for f in findings:
+            self.stats.observed += 1
+            value = secret_value(f)
+            if value is None:
+                self.stats.unfingerprinted += 1
+                out.append((None, dict(f)))
+                continue
+            fp = self.fingerprint(value)
+            if fp not in groups:
+                groups[fp] = []
+                out.append((fp, f))
+            groups[fp].append(f)
+
+        # the write lock is taken before the lookups, so a concurrent writer cannot add
+        # the same fingerprints between the lookup and the insert
+        self.conn.execute('BEGIN IMMEDIATE')
+        with self.conn:
+            stored = int(self.conn.execute("SELECT value FROM meta WHERE key = 'count'").fetchone()[0])
+            if stored != self.count:
+                self._bloom_stale = True
+            if self._bloom_stale:
+                maybe = list(groups)
+            else:
+                maybe = []
+                for fp in groups:
+                    if fp in self.bloom:
+                        maybe.append(fp)
+                    else:
+                        self.stats.bloom_negatives += 1
+            known = self._lookup(sorted(maybe))
+            if not self._bloom_stale:
+                self.stats.bloom_false_positives += len(maybe) - len(known)
+            new_rows = []
+            updates = []
+            for fp, group in groups.items():
+                last = _location(group[-1], default_path)
+                if fp in known:
+                    updates.append((len(group), seen_at, *last, fp))
+                else:
+                    first = group[0]
+                    new_rows.append((fp, first.get('token_id') or first.get('matcher') or first.get('detector'),
+                                     len(group), seen_at, *_location(first, default_path), seen_at, *last))
+            # in key order, rows are appended to the b-tree instead of inserted all over it
+            new_rows.sort()
+            self.stats.known += len(updates)
+            self.stats.new += len(new_rows)
+            self.conn.executemany('INSERT INTO secrets VALUES (?,?,?,?,?,?,?,?,?,?,?)', new_rows)
+            self.conn.executemany('UPDATE secrets SET occurrences = occurrences + ?, last_seen = ?, last_commit = ?, '
+                                  'last_path = ?, last_lineno = ? WHERE fingerprint = ?', updates)
+            self.conn.execute("UPDATE meta SET value = value + ? WHERE key = 'count'", (len(new_rows),))
+            self.count = stored + len(new_rows)
+        if self.count > self.bloom.capacity:
+            self._rebuild_bloom(2 * self.count)
+            self._bloom_stale = False
+        else:
+            for row in new_rows:
+                self.bloom.add(row[0])
+            self._bloom_dirty = self._bloom_dirty or bool(new_rows)
+
+        result = []
+        for fp, f in out:
+            if fp is None:
+                result.append(f)
+            elif fp not in known:
+                result.append(dict(f, fingerprint=fp.hex(), occurrences=len(groups[fp])))
+        return result
+
+    def close(self):
+        # a stale filter is not saved; the next open rebuilds it from the table
+        if self._bloom_dirty and not self._bloom_stale:
+            params = json.dumps({'capacity': self.bloom.capacity, 'error_rate': self.bloom.error_rate})
+            with self.conn:
+                self.conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                                      [('bloom', bytes(self.bloom.bits)), ('bloom_params', params),
+                                       ('bloom_count', self.count)])
+            self._bloom_dirty = False
+        self.conn.close()
@@ -0,0 +1,257 @@
+"""Native git history scanning.
+
+Commits are enumerated with `git log --raw` and every blob they add or
+modify is scanned exactly once, however many commits or paths reference
+it, by streaming unique object ids through a single `git cat-file --batch`
+process. Findings are attributed back to every `(commit, path)` that
+introduced the blob. Because a blob id is already a content hash, blob
+results can be kept in a `FindingsCache` so repeated history scans only
+scan blobs that are new since the last run. A merge commit contributes
+the files and lines that match none of its parents (conflict resolutions
+and changes made in the merge itself); what it takes unchanged from a
+parent was already introduced by that parent's commits.
+
+`scan_history_added` scans just the lines each commit adds (from
+`git log -p -U0`), deduplicated by `(old blob, new blob)` pair, with line
+numbers mapped to the new file.
+"""
+import codecs
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .cache import DETECTORS_KEY, catalog_fingerprints, scan_buffer_cached
+from .mmapscan import scan_buffer
+
+NULL_OID = "0" * 40
+
+
+class GitError(RuntimeError):
+    pass
+
+
+class HistoryStats:
+    def __init__(self):
+        self.commits = 0
+        self.blob_refs = 0
+        self.unique_blobs = 0
+        self.blobs_scanned = 0
+        self.bytes_scanned = 0
+
+    def to_dict(self):
+        return {"commits": self.commits, "blob_refs": self.blob_refs, "unique_blobs": self.unique_blobs,
+                "blobs_scanned": self.blobs_scanned, "bytes_scanned": self.bytes_scanned}
+
+
+def _git(repo: Path, *args: str) -> List[str]:
+    return ["git", "-C", str(repo), *args]
+
+
+def _log_args(revs: Optional[List[str]]) -> List[str]:
+    return list(revs) if revs else ["--all"]
+
+
+def iter_blob_refs(repo: Path, revs: Optional[List[str]] = None):
+    """Yield `(commit, path, blob_oid)` for every regular file added or modified, oldest first."""
+    # -c: merges list the files whose result matches none of the parents (conflict resolutions,
+    # changes made in the merge itself); without it git prints nothing for a merge
+    cmd = _git(repo, "log", *_log_args(revs), "--reverse", "--format=commit %H", "--raw", "-c", "--no-renames",
+               "--no-abbrev", "-z")
+    res = subprocess.run(cmd, capture_output=True)
+    if res.returncode != 0:
+        raise GitError(res.stderr.decode("utf-8", "replace").strip())
+    tokens = res.stdout.split(b"\0")
+    commit = None
+    i = 0
+    while i < len(tokens):
+        tok = tokens[i].lstrip(b"\n")
+        i += 1
+        if tok.startswith(b"commit "):
+            commit = tok[7:].decode()
+        elif tok.startswith(b":"):
+            # ":<old mode> <new mode> <old oid> <new oid> <status>" followed by the path token; a merge
+            # with n parents has n colons, n old modes and n old oids ("::<mode1> <mode2> <new mode> ...")
+            parents = len(tok) - len(tok.lstrip(b":"))
+            fields = tok[parents:].decode().split(" ")
+            new_mode, new_oid = fields[parents], fields[2 * parents + 1]
+            path = tokens[i].decode("utf-8", "surrogateescape")
+            i += 1
+            if new_mode.startswith("100") and new_oid != NULL_OID:
+                yield commit, path, new_oid
+
+
+def iter_blobs(repo: Path, oids):
+    """Yield `(oid, content)` for each oid, using one `git cat-file --batch` process."""
+    proc = subprocess.Popen(_git(repo, "cat-file", "--batch"), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        for oid in oids:
+            proc.stdin.write(oid.encode() + b"\n")
+            proc.stdin.flush()
+            header = proc.stdout.readline().split()
+            if len(header) < 3 or header[1] != b"blob":
+                continue
+            size = int(header[2])
+            data = proc.stdout.read(size)
+            proc.stdout.read(1)  # trailing newline
+            yield oid, data
+    finally:
+        proc.stdin.close()
+        proc.stdout.close()
+        proc.wait()
+
+
+def scan_history(repo: Path, ruleset=None, revs: Optional[List[str]] = None, cache=None):
+    """Scan every blob introduced in the history of `repo` once.
+
+    Returns `(findings, HistoryStats)`. Each finding carries `commit`,
+    `path` and `blob`; a blob introduced by several commits yields one
+    finding per introduction. `cache` is an optional `FindingsCache`.
+    """
+    stats = HistoryStats()
+    refs: Dict[str, List[Tuple[str, str]]] = {}
+    commits = set()
+    for commit, path, oid in iter_blob_refs(repo, revs):
+        commits.add(commit)
+        stats.blob_refs += 1
+        refs.setdefault(oid, []).append((commit, path))
+    stats.commits = len(commits)
+    stats.unique_blobs = len(refs)
+
+    results: Dict[str, list] = {}
+    to_scan = list(refs)
+    new_rows = []
+    if cache is not None:
+        fingerprints = catalog_fingerprints(ruleset)
+        to_scan = []
+        for oid in refs:
+            cached = cache.lookup("git:" + oid, fingerprints)
+            if set(fingerprints) <= set(cached):
+                # fully cached: the blob does not even need to be read from git
+                results[oid] = cached[DETECTORS_KEY] + [f for tid in dict.fromkeys(fingerprints)
+                                                        if tid != DETECTORS_KEY for f in cached[tid]]
+            else:
+                to_scan.append(oid)
+    for oid, data in iter_blobs(repo, to_scan):
+        stats.blobs_scanned += 1
+        stats.bytes_scanned += len(data)
+        if cache is None:
+            results[oid] = scan_buffer(data, ruleset)
+        else:
+            results[oid], rows = scan_buffer_cached(data, "git:" + oid, cache, fingerprints, ruleset)
+            new_rows.extend(rows)
+
+    findings = []
+    for oid, introduced in refs.items():
+        for commit, path in introduced:
+            for f in results.get(oid, ()):
+                findings.append(dict(f, commit=commit, path=path, blob=oid))
+    if cache is not None:
+        cache.store(new_rows, ["git:" + oid for oid in refs])
+    return findings, stats
+
+
+def _unquote(path: bytes) -> str:
+    # git C-quotes paths with special characters: "a\303\251.txt"
+    if path.startswith(b'"') and path.endswith(b'"'):
+        path = codecs.escape_decode(path[1:-1])[0]
+    return path.decode("utf-8", "surrogateescape")
+
+
+def iter_added_hunks(repo: Path, revs: Optional[List[str]] = None):
+    """Yield `(commit, path, old_oid, new_oid, [(new_lineno, line), ...])` per changed file."""
+    # --cc: merges show the lines that match none of the parents (see iter_blob_refs)
+    cmd = _git(repo, "log", *_log_args(revs), "--reverse", "--format=commit %H", "-p", "--cc", "-U0",
+               "--full-index", "--no-renames", "--no-color")
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    commit = path = old_oid = new_oid = None
+    added: List[Tuple[int, str]] = []
+    lineno = 0
+    # prefix columns of each hunk line: 1, or the number of parents in a merge's combined diff
+    columns = 1
+    # file headers (index/---/+++) come before the first hunk; afterwards a
+    # line like "+++ x" is an added line that happens to start with "++"
+    in_header = False
+
+    def flush():
+        if path is not None and added:
+            return (commit, path, old_oid, new_oid, list(added))
+        return None
+
+    try:
+        for raw in proc.stdout:
+            if raw.startswith(b"commit "):
+                item = flush()
+                if item:
+                    yield item
+                commit, path, added = raw[7:].strip().decode(), None, []
+            elif raw.startswith(b"diff --git ") or raw.startswith(b"diff --cc "):
+                item = flush()
+                if item:
+                    yield item
+                path, old_oid, new_oid, added = None, None, None, []
+                in_header = True
+            elif in_header and raw.startswith(b"index "):
+                # "index <old>..<new>", or "index <parent1>,<parent2>..<new>" in a merge
+                old_oids, new_oid = raw[6:].split()[0].decode().split("..")
+                old_oid = old_oids.split(",")[0]
+            elif in_header and raw.startswith(b"+++ "):
+                target = raw[4:].rstrip(b"\n")
+                path = None if target == b"/dev/null" else _unquote(target)[2:]
+            elif raw.startswith(b"@@"):
+                # @@ -a,b +c,d @@, or @@@ -a,b -c,d +e,f @@@ in a merge
+                in_header = False
+                parts = raw.split(b" ")
+                columns = len(parts[0]) - 1
+                lineno = int(parts[columns + 1][1:].split(b",")[0])
+            elif not in_header and path is not None:
+                tag = raw[:columns]
+                if tag == b"+" * columns:
+                    added.append((lineno, raw[columns:].rstrip(b"\n").decode("utf-8", "surrogateescape")))
+                    lineno += 1
+                elif b"-" not in tag and not tag.startswith(b"\\"):
+                    # in a merge, a line added against only some parents came from another one
+                    lineno += 1
+        item = flush()
+        if item:
+            yield item
+        err = proc.stderr.read()
+        if proc.wait() != 0:
+            raise GitError(err.decode("utf-8", "replace").strip())
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+
+def scan_history_added(repo: Path, ruleset=None, revs: Optional[List[str]] = None):
+    """Scan only the lines added by each commit; see `iter_added_hunks`.
+
+    Line numbers refer to the new version of the file. A given
+    `(old blob, new blob)` change is scanned once even if it recurs.
+    """
+    stats = HistoryStats()
+    seen: Dict[Tuple[str, str], list] = {}
+    commits = set()
+    findings = []
+    for commit, path, old_oid, new_oid, added in iter_added_hunks(repo, revs):
+        commits.add(commit)
+        stats.blob_refs += 1
+        key = (old_oid, new_oid)
+        if key not in seen:
+            text = "\n".join(line for _, line in added) + "\n"
+            data = text.encode("utf-8", "surrogateescape")
+            stats.blobs_scanned += 1
+            stats.bytes_scanned += len(data)
+            found = scan_buffer(data, ruleset)
+            for f in found:
+                f["lineno"] = added[f["lineno"] - 1][0]
+                # offsets are relative to the extracted added lines, not the file
+                f.pop("offset", None)
+            seen[key] = found
+        for f in seen[key]:
+            findings.append(dict(f, commit=commit, path=path, blob=new_oid))
+    stats.commits = len(commits)
+    stats.unique_blobs = len(seen)
+    return findings, stats
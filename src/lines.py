@@ -0,0 +1,109 @@
+"""Line index shared by the detectors, rules and scanners.
+
+A `LineIndex` records the offsets of the newlines of one input (str or
+bytes-like, including an mmap) in an `array` and answers offset -> line,
+column and context-line queries with `bisect`, so locating many findings
+costs one pass over the text in total. The index is extended lazily, a
+block at a time, only as far as the largest offset asked about.
+"""
+import re
+from array import array
+from bisect import bisect_left
+from typing import List, Tuple
+
+# newlines are indexed this many characters (bytes) ahead of the furthest query
+BLOCK = 1 << 20
+
+_NL = re.compile("\n")
+_NL_B = re.compile(b"\n")
+
+
+class LineIndex:
+    """Newline offsets of `text`. Offsets index `text` (characters for str, bytes otherwise);
+    line numbers and columns are 1-based and columns count characters."""
+
+    __slots__ = ("text", "newlines", "_is_text", "_scanned")
+
+    def __init__(self, text):
+        self.text = text
+        self._is_text = isinstance(text, str)
+        self.newlines = array("q")
+        # every newline before this offset is in `newlines`
+        self._scanned = 0
+
+    def _extend(self, offset: int):
+        if offset <= self._scanned:
+            return
+        end = min(len(self.text), max(offset, self._scanned + BLOCK))
+        pattern = _NL if self._is_text else _NL_B
+        self.newlines.extend(map(re.Match.start, pattern.finditer(self.text, self._scanned, end)))
+        self._scanned = end
+
+    def _ensure_lines(self, count: int):
+        # index until `count` newlines are known or the text ends
+        while len(self.newlines) < count and self._scanned < len(self.text):
+            self._extend(self._scanned + BLOCK)
+
+    def lineno(self, offset: int) -> int:
+        self._extend(offset)
+        return bisect_left(self.newlines, offset) + 1
+
+    def line_start(self, lineno: int) -> int:
+        if lineno <= 1:
+            return 0
+        self._ensure_lines(lineno - 1)
+        if len(self.newlines) < lineno - 1:
+            raise IndexError(f"line {lineno} is past the end of the text")
+        return self.newlines[lineno - 2] + 1
+
+    def line_end(self, lineno: int) -> int:
+        """Offset of the newline ending `lineno`, or the end of the text."""
+        self._ensure_lines(lineno)
+        return self.newlines[lineno - 1] if len(self.newlines) >= lineno else len(self.text)
+
+    def _chars(self, start: int, end: int) -> str:
+        part = self.text[start:end]
+        return part if self._is_text else bytes(part).decode("utf-8", "surrogateescape")
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        """`(lineno, column)` of `offset`."""
+        line = self.lineno(offset)
+        start = self.line_start(line)
+        return line, (offset - start if self._is_text else len(self._chars(start, offset))) + 1
+
+    def line(self, lineno: int) -> str:
+        """Text of line `lineno` without its line ending."""
+        start = self.line_start(lineno)
+        text = self._chars(start, self.line_end(lineno))
+        return text[:-1] if text.endswith("\r") else text
+
+    def context(self, offset: int, before: int = 2, after: int = 2, end: int = None) -> List[Tuple[int, str]]:
+        """`(lineno, line)` for the lines holding `offset`..`end` plus `before`/`after` lines around them."""
+        first = self.lineno(offset)
+        last = self.lineno(end) if end is not None and end > offset else first
+        return self.around(first, before, after, last)
+
+    def around(self, lineno: int, before: int = 2, after: int = 2, last: int = None) -> List[Tuple[int, str]]:
+        """`(lineno, line)` for lines `lineno`..`last` plus `before`/`after` lines around them."""
+        first = lineno
+        last = last or lineno
+        lines = []
+        for n in range(max(1, first - before), last + after + 1):
+            if n > last and not self._has_line(n):
+                break
+            lines.append((n, self.line(n)))
+        return lines
+
+    def _has_line(self, lineno: int) -> bool:
+        # a trailing newline does not start another line
+        if lineno <= 1:
+            return True
+        self._ensure_lines(lineno - 1)
+        return len(self.newlines) >= lineno - 1 and self.newlines[lineno - 2] + 1 < len(self.text)
+
+
+def annotate(findings, lines: LineIndex):
+    """Set `lineno` and `column` on finding dicts from their `offset`, which must index `lines.text`."""
+    for f in findings:
+        f["lineno"], f["column"] = lines.position(f["offset"])
+    return findings
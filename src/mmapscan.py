@@ -0,0 +1,133 @@
+"""Bytes-mode scanning over memory-mapped files.
+
+The detector regexes and each rule's pattern are compiled for bytes and run
+directly over an `mmap` of the file, so nothing is decoded or copied up
+front. Only matched values and the lines reported by the keyword detector
+are decoded, which also means files in any encoding can be scanned.
+"""
+import contextlib
+import mmap
+import re
+from functools import partial
+from pathlib import Path
+
+from . import detectors
+from .lines import LineIndex, annotate
+
+AWS_ACCESS_KEY_RE_B = re.compile(detectors.AWS_ACCESS_KEY_RE.pattern.encode())
+PRIVATE_KEY_BEGIN_B = re.compile(detectors.PRIVATE_KEY_BEGIN.pattern.encode())
+GENERIC_SECRET_RE_B = re.compile(detectors.GENERIC_SECRET_RE.pattern.encode())
+
+
+def _decode(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace")
+
+
+def _detect_aws(buf, lines):
+    return [detectors.located_finding("aws-access-key", _decode(m.group(0)), 0.9, m.start(), lines)
+            for m in AWS_ACCESS_KEY_RE_B.finditer(buf)]
+
+
+def _detect_private_key(buf, lines):
+    m = PRIVATE_KEY_BEGIN_B.search(buf)
+    if m:
+        return [detectors.located_finding("private-key-block", detectors.PRIVATE_KEY_SNIPPET, 0.95, m.start(), lines)]
+    return []
+
+
+def _detect_high_entropy(buf, lines, stats=None):
+    candidates = [(_decode(m.group("val")), m.start("val")) for m in GENERIC_SECRET_RE_B.finditer(buf)]
+    return detectors.high_entropy_findings(candidates, lines=lines, stats=stats)
+
+
+def _detect_keywords(buf, lines, keywords=None):
+    # one finding per line containing any keyword
+    findings = []
+    for start, end in (keywords or detectors.DEFAULT_KEYWORDS).lines(buf):
+        line = _decode(buf[start:end]).rstrip("\r")
+        findings.append(detectors.Finding("keyword-context", line.strip(), lines.lineno(start), 0.4, start))
+    return findings
+
+
+_DETECTORS = [("aws-access-key", _detect_aws), ("private-key-block", _detect_private_key),
+              ("high-entropy", _detect_high_entropy), ("keyword-context", _detect_keywords)]
+DETECTOR_NAMES = frozenset(name for name, _ in _DETECTORS)
+
+
+def _detect(buf, profiler=None, names=None, lines=None, keywords=None):
+    findings = []
+    lines = lines or LineIndex(buf)
+    for name, func in _DETECTORS:
+        if names is not None and name not in names:
+            continue
+        if func is _detect_keywords and keywords is not None:
+            func = partial(_detect_keywords, keywords=keywords)
+        if profiler is None:
+            findings.extend(func(buf, lines))
+        else:
+            findings.extend(profiler.run(name, func, buf, lines, pass_stats=func is _detect_high_entropy))
+    return findings
+
+
+def detect_buffer(buf, profiler=None, names=None, lines=None, keywords=None):
+    """Run the built-in detectors (or only those in `names`) over `buf`; returns finding dicts with byte offsets.
+
+    `lines` is a `LineIndex` over `buf` to share with `match_buffer`;
+    `keywords` is the keyword detector's `KeywordMatcher` (e.g.
+    `RuleSet.keyword_matcher`), `detectors.KEYWORDS` by default.
+    """
+    findings = []
+    for hit in _detect(buf, profiler, names, lines, keywords):
+        d = hit.to_dict()
+        d["offset"] = hit.offset
+        findings.append(d)
+    return findings
+
+
+def match_buffer(buf, ruleset, rules=None, profiler=None, lines=None):
+    """Run `ruleset` (or only the given `rules` from it) over `buf`, adding line numbers and columns."""
+    lines = lines or LineIndex(buf)
+    if rules is None:
+        return ruleset.match_bytes(buf, profiler, lines)
+    found = []
+    for r in rules:
+        if profiler is None:
+            found.extend(r.matches_bytes(buf, lines=lines))
+        else:
+            found.extend(annotate(profiler.run(r.token_id, r.matches_bytes, buf, pass_stats=True), lines))
+    return found
+
+
+def scan_buffer(buf, ruleset=None, profiler=None, detector_names=None):
+    """Scan a bytes-like buffer with the detectors and, if given, a RuleSet.
+
+    Returns finding dicts in the same order as `scan_text` followed by
+    `RuleSet.match_text`, with byte `offset`s and real line numbers. The
+    keyword detector also looks for the catalog's `keywords_prefixes`.
+    `detector_names` restricts the scan to a subset of the detectors.
+    """
+    lines = LineIndex(buf)
+    keywords = ruleset.keyword_matcher if ruleset is not None else None
+    findings = detect_buffer(buf, profiler, detector_names, lines, keywords)
+    if ruleset is not None:
+        findings.extend(match_buffer(buf, ruleset, profiler=profiler, lines=lines))
+    return findings
+
+
+@contextlib.contextmanager
+def open_mmap(path: Path):
+    """Map `path` read-only; yields `b""` for empty files, which cannot be mapped."""
+    with open(path, "rb") as fh:
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield b""
+            return
+        with mm:
+            yield mm
+
+
+def scan_mmap(path: Path, ruleset=None, profiler=None, detector_names=None):
+    """Memory-map `path` and scan it; see `scan_buffer`. Returns `(findings, nbytes)`."""
+    with open_mmap(path) as buf:
+        return scan_buffer(buf, ruleset, profiler, detector_names), len(buf)
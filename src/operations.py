@@ -1,8 +1,52 @@
-"""Loader and calculator for rules operations/tuning metrics."""
+"""Loader and calculator for rules operations/tuning metrics.
+
+Audits are stored in SQLite by `OperationsStore`: the `audits` table keeps
+one row per rule and audit date (the time series), indexed by rule id and
+by date, and the `operations` view exposes the latest audit of each rule
+with the columns of the original `operations` table. Databases created
+with that table are migrated into `audits` when opened.
+"""
 from pathlib import Path
 import sqlite3
 import yaml
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+
+COLUMNS = ('detection_rule_id', 'test_audit_sample_size', 'true_positives', 'false_positives', 'false_negatives',
+           'last_audit_date', 'tuning_recommendation')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS audits (
+    detection_rule_id TEXT NOT NULL,
+    test_audit_sample_size INTEGER,
+    true_positives INTEGER,
+    false_positives INTEGER,
+    false_negatives INTEGER,
+    last_audit_date TEXT NOT NULL DEFAULT '',
+    tuning_recommendation TEXT,
+    PRIMARY KEY (detection_rule_id, last_audit_date)
+);
+CREATE INDEX IF NOT EXISTS audits_date ON audits (last_audit_date);
+-- with a single MAX(), SQLite takes the bare columns from the row holding the maximum
+CREATE VIEW IF NOT EXISTS operations AS
+    SELECT detection_rule_id, test_audit_sample_size, true_positives, false_positives, false_negatives,
+           MAX(last_audit_date) AS last_audit_date, tuning_recommendation
+    FROM audits GROUP BY detection_rule_id;
+'''
+
+# strftime() formats of the periods `OperationsStore.trend` can group by
+PERIODS = {'day': '%Y-%m-%d', 'week': '%Y-W%W', 'month': '%Y-%m', 'year': '%Y'}
+
+
+def recommend(tp, fp, fn):
+    """Naive tuning recommendation from TP/FP/FN counts."""
+    precision = tp / (tp + fp) if (tp + fp) else 1.0
+    recall = tp / (tp + fn) if (tp + fn) else 1.0
+    if precision < 0.7:
+        return 'Refine regex or add stricter keywords to reduce false positives.'
+    if recall < 0.7:
+        return 'Loosen regex or add more prefixes/keywords to improve recall.'
+    return 'No change recommended; rule is balanced.'
 
 
 def _safe_div(a, b):
@@ -32,10 +76,16 @@ class OperationEntry:
         denom = (self.true_positives + self.false_negatives)
         return _safe_div(self.true_positives, denom) if denom else None
 
+    def to_row(self):
+        return tuple(getattr(self, c) for c in COLUMNS)
+
 
 class OperationsSet:
     def __init__(self, entries):
         self.entries = entries
+        # token_id -> latest entry, rebuilt when `entries` changes length
+        self._by_rule = None
+        self._indexed = 0
 
     @classmethod
     def from_yaml(cls, path: Path):
@@ -46,6 +96,7 @@ class OperationsSet:
 
     @classmethod
     def from_sqlite(cls, path: Path):
+        """Load the latest audit of every rule."""
         conn = sqlite3.connect(str(path))
         cur = conn.cursor()
         cur.execute('SELECT detection_rule_id, test_audit_sample_size, true_positives, false_positives, false_negatives, last_audit_date, tuning_recommendation FROM operations')
@@ -56,8 +107,121 @@ class OperationsSet:
         entries = [OperationEntry(r) for r in data]
         return cls(entries)
 
+    def to_sqlite(self, path: Path):
+        """Record every entry as an audit in `path` in one transaction; see `OperationsStore.add`."""
+        store = OperationsStore(path)
+        try:
+            store.add(self.entries)
+        finally:
+            store.close()
+
     def get_by_rule(self, token_id):
-        for e in self.entries:
-            if e.detection_rule_id == token_id:
-                return e
-        return None
+        """The entry of `token_id` (the most recent one if there are several), or None."""
+        if self._by_rule is None or self._indexed != len(self.entries):
+            self._by_rule = {}
+            self._indexed = len(self.entries)
+            for e in self.entries:
+                kept = self._by_rule.get(e.detection_rule_id)
+                if kept is None or str(e.last_audit_date or '') >= str(kept.last_audit_date or ''):
+                    self._by_rule[e.detection_rule_id] = e
+        return self._by_rule.get(token_id)
+
+
+class OperationsStore:
+    """SQLite store of the audit history of every rule."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(str(self.path))
+        tables = dict(self.conn.execute("SELECT name, type FROM sqlite_master "
+                                        "WHERE name IN ('operations', 'operations_legacy')"))
+        if tables.get('operations') == 'table' or 'operations_legacy' in tables:
+            self._migrate(rename=tables.get('operations') == 'table')
+        else:
+            with self.conn:
+                self.conn.executescript(SCHEMA)
+
+    def _migrate(self, rename: bool):
+        # a database from before the audit history: its rows become the first audits. executescript()
+        # commits first, so the statements run one by one in a single transaction; an
+        # `operations_legacy` table without `rename` is a migration that an older version left half done
+        self.conn.execute('BEGIN')
+        with self.conn:
+            if rename:
+                self.conn.execute('ALTER TABLE operations RENAME TO operations_legacy')
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    self.conn.execute(statement)
+            self.conn.execute(f'INSERT OR REPLACE INTO audits ({", ".join(COLUMNS)}) '
+                              f'SELECT detection_rule_id, test_audit_sample_size, true_positives, false_positives, '
+                              f"false_negatives, COALESCE(last_audit_date, ''), tuning_recommendation "
+                              f'FROM operations_legacy')
+            self.conn.execute('DROP TABLE operations_legacy')
+
+    def add(self, entries) -> int:
+        """Insert `OperationEntry`s with one `executemany` in one transaction; returns the row count.
+
+        An entry replaces the audit of the same rule on the same date.
+        """
+        rows = []
+        for e in entries:
+            row = list(e.to_row())
+            # YAML loads unquoted dates as datetime.date
+            row[5] = str(row[5]) if row[5] else ''
+            rows.append(row)
+        with self.conn:
+            self.conn.executemany(f'INSERT OR REPLACE INTO audits ({", ".join(COLUMNS)}) VALUES (?,?,?,?,?,?,?)',
+                                  rows)
+        return len(rows)
+
+    def latest(self) -> OperationsSet:
+        """The most recent audit of every rule."""
+        rows = self.conn.execute(f'SELECT {", ".join(COLUMNS)} FROM operations').fetchall()
+        return OperationsSet([OperationEntry(dict(zip(COLUMNS, r))) for r in rows])
+
+    def history(self, token_id: str, since: Optional[str] = None, until: Optional[str] = None) -> List[OperationEntry]:
+        """Audits of `token_id` in date order, optionally within `[since, until]`."""
+        sql = f'SELECT {", ".join(COLUMNS)} FROM audits WHERE detection_rule_id = ?'
+        args = [token_id]
+        if since is not None:
+            sql += ' AND last_audit_date >= ?'
+            args.append(since)
+        if until is not None:
+            sql += ' AND last_audit_date <= ?'
+            args.append(until)
+        rows = self.conn.execute(sql + ' ORDER BY last_audit_date', args).fetchall()
+        return [OperationEntry(dict(zip(COLUMNS, r))) for r in rows]
+
+    def trend(self, period: str = 'month', token_id: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, by_rule: bool = True) -> List[Dict[str, Any]]:
+        """Precision/recall per `period` ('day', 'week', 'month' or 'year'), aggregated in SQL.
+
+        TP/FP/FN are summed over the audits of each period, per rule unless
+        `by_rule` is False; precision and recall are None where undefined.
+        """
+        fmt = PERIODS[period]
+        where = ["last_audit_date != ''"]
+        args: List[Any] = []
+        if token_id is not None:
+            where.append('detection_rule_id = ?')
+            args.append(token_id)
+        if since is not None:
+            where.append('last_audit_date >= ?')
+            args.append(since)
+        if until is not None:
+            where.append('last_audit_date <= ?')
+            args.append(until)
+        rule_col = 'detection_rule_id' if by_rule else 'NULL'
+        sql = f"""
+            SELECT {rule_col} AS rule, strftime('{fmt}', last_audit_date) AS period, COUNT(*) AS audits,
+                   SUM(true_positives) AS tp, SUM(false_positives) AS fp, SUM(false_negatives) AS fn,
+                   CAST(SUM(true_positives) AS REAL) / NULLIF(SUM(true_positives) + SUM(false_positives), 0),
+                   CAST(SUM(true_positives) AS REAL) / NULLIF(SUM(true_positives) + SUM(false_negatives), 0)
+            FROM audits WHERE {' AND '.join(where)}
+            GROUP BY rule, period ORDER BY rule, period"""
+        keys = ('detection_rule_id', 'period', 'audits', 'true_positives', 'false_positives', 'false_negatives',
+                'precision', 'recall')
+        return [dict(zip(keys, r)) for r in self.conn.execute(sql, args)]
+
+    def close(self):
+        self.conn.close()
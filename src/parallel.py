@@ -0,0 +1,372 @@
+"""Parallel directory scanning on top of the detectors and `RuleSet`.
+
+Files are discovered with a deterministic walk, grouped into chunks and fanned
+out to a `concurrent.futures` process pool. Results are merged back in walk
+order so the output does not depend on the number of workers.
+"""
+import fnmatch
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from .cache import DEFAULT_MAX_ENTRIES, CacheStats, FindingsCache, catalog_fingerprints, scan_file_cached
+from .decoders import DecodeStats, scan_decoded_file
+from .findings import FindingStore
+from .mmapscan import DETECTOR_NAMES, scan_mmap
+from .profiling import DEFAULT_TIME_CAP, Profiler
+from .triage import FULL, KNOWN, SKIP, GitIgnore, TriageStats, classify_path, route_plan
+
+SKIP_DIRS = {".git", ".hg", ".svn", "node_modules", "vendor", "third_party", "bower_components",
+             "__pycache__", ".venv", "venv", ".tox", ".mypy_cache", ".pytest_cache"}
+BINARY_SNIFF_BYTES = 8192
+DEFAULT_CHUNK_SIZE = 64
+
+# per-process RuleSet and read-only cache, loaded once by the pool initializer
+_RULESET = None
+_CACHE = None
+_FINGERPRINTS = None
+# time cap of the per-chunk Profiler, or None when profiling is off
+_PROFILE = None
+# engine.Engine for unified scans
+_ENGINE = None
+# triage.TriageConfig, and per route the (detector names, RuleSet, Engine) subset to run,
+# or None where the route runs every matcher
+_TRIAGE = None
+_PLANS = None
+# decoders.DecodeLimits when encoded spans are decoded and rescanned
+_DECODE = None
+
+
+def is_binary(path: Path) -> bool:
+    """Cheap binary sniff: a NUL byte in the first block."""
+    try:
+        with open(path, "rb") as fh:
+            return b"\0" in fh.read(BINARY_SNIFF_BYTES)
+    except OSError:
+        return True
+
+
+def iter_files(root: Path, exclude: Iterable[str] = (), skip_dirs=SKIP_DIRS, triage_stats=None,
+               gitignore: bool = True):
+    """Yield scannable files under `root` in a stable, sorted order.
+
+    Vendored/VCS directories in `skip_dirs`, paths matching an `exclude` glob
+    (relative to `root`) and binary files are skipped. With `triage_stats`
+    (a `triage.TriageStats`), binary files are left to the triage stage and,
+    unless `gitignore` is False, paths ignored by `.gitignore` are skipped
+    and recorded there instead.
+    """
+    root = Path(root)
+    exclude = list(exclude)
+    gitignore = GitIgnore(root) if triage_stats is not None and gitignore else None
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        kept = []
+        for d in sorted(dirnames):
+            rel = os.path.normpath(os.path.join(rel_dir, d))
+            if d in skip_dirs or _excluded(rel, exclude):
+                continue
+            if gitignore is not None and gitignore.ignored(rel.replace(os.sep, "/"), is_dir=True):
+                # ignored directories are pruned unwalked, so only their count is recorded
+                triage_stats.reasons["gitignore-dir"] = triage_stats.reasons.get("gitignore-dir", 0) + 1
+                continue
+            kept.append(d)
+        dirnames[:] = kept
+        for name in sorted(filenames):
+            rel = os.path.normpath(os.path.join(rel_dir, name))
+            if _excluded(rel, exclude):
+                continue
+            path = Path(dirpath) / name
+            if not path.is_file():
+                continue
+            if gitignore is not None and gitignore.ignored(rel.replace(os.sep, "/")):
+                triage_stats.add(SKIP, "gitignore", path.stat().st_size)
+                continue
+            if triage_stats is None and is_binary(path):
+                continue
+            yield path
+
+
+def _excluded(rel: str, patterns) -> bool:
+    rel = rel.replace(os.sep, "/")
+    return any(fnmatch.fnmatch(rel, p) or fnmatch.fnmatch(os.path.basename(rel), p) for p in patterns)
+
+
+class ScanStats:
+    def __init__(self, files: int = 0, bytes_scanned: int = 0, findings: int = 0, seconds: float = 0.0):
+        self.files = files
+        self.bytes_scanned = bytes_scanned
+        self.findings = findings
+        self.seconds = seconds
+        # CacheStats when a findings cache is in use
+        self.cache = None
+        # Profiler when the scan was profiled
+        self.profile = None
+        # triage.TriageStats when files were triaged
+        self.triage = None
+        # decoders.DecodeStats when encoded content was decoded and rescanned
+        self.decode = None
+
+    @property
+    def files_per_sec(self):
+        return self.files / self.seconds if self.seconds else 0.0
+
+    @property
+    def mb_per_sec(self):
+        return self.bytes_scanned / (1024 * 1024) / self.seconds if self.seconds else 0.0
+
+    def to_dict(self):
+        return {
+            "files": self.files,
+            "bytes": self.bytes_scanned,
+            "findings": self.findings,
+            "seconds": self.seconds,
+            "files_per_sec": self.files_per_sec,
+            "mb_per_sec": self.mb_per_sec,
+            "cache": self.cache.to_dict() if self.cache else None,
+            "profile": self.profile.to_dict() if self.profile else None,
+            "triage": self.triage.to_dict() if self.triage else None,
+            "decode": self.decode.to_dict() if self.decode else None,
+        }
+
+
+def _init_worker(rules_path: Optional[str], cache_path: Optional[str] = None, profile=None, unified: bool = False,
+                 triage=None, decode=None):
+    global _RULESET, _CACHE, _FINGERPRINTS, _PROFILE, _ENGINE, _TRIAGE, _PLANS, _DECODE
+    _RULESET = None
+    _CACHE = None
+    _ENGINE = None
+    _PROFILE = profile
+    _TRIAGE = triage
+    _PLANS = None
+    _DECODE = decode
+    if rules_path:
+        from .rules import RuleSet
+        _RULESET = RuleSet.from_path(Path(rules_path))
+    if unified:
+        from .engine import Engine
+        _ENGINE = Engine(_RULESET)
+    if triage is not None:
+        from .engine import Engine
+        _PLANS = {}
+        for route in (KNOWN, FULL):
+            names, ruleset = route_plan(triage, _RULESET, route)
+            if names == DETECTOR_NAMES and (ruleset is None or len(ruleset.rules) == len(_RULESET.rules)):
+                _PLANS[route] = None
+            else:
+                _PLANS[route] = (names, ruleset, Engine(ruleset, names) if unified else None)
+    if cache_path:
+        # workers only read; new entries are written by the parent process
+        _CACHE = FindingsCache(Path(cache_path), readonly=True)
+        _FINGERPRINTS = catalog_fingerprints(_RULESET)
+
+
+def _reset_worker():
+    """Close and clear the state `_init_worker` set up, after an in-process (`workers=1`) scan."""
+    global _RULESET, _CACHE, _FINGERPRINTS, _PROFILE, _ENGINE, _TRIAGE, _PLANS, _DECODE
+    if _CACHE is not None:
+        _CACHE.close()
+    _RULESET = _CACHE = _FINGERPRINTS = _PROFILE = _ENGINE = _TRIAGE = _PLANS = _DECODE = None
+
+
+def scan_file(path: Path, ruleset=None, profiler=None):
+    """Scan one file with the built-in detectors and, if given, a RuleSet.
+
+    Returns `(findings, nbytes)`; each finding dict carries a `path` key.
+    Detector findings come first, followed by rule findings. The file is
+    memory-mapped and scanned as bytes (see `mmapscan`), so it is never
+    decoded or copied as a whole and any encoding is accepted.
+    """
+    findings, nbytes = scan_mmap(path, ruleset, profiler)
+    for f in findings:
+        f["path"] = str(path)
+    return findings, nbytes
+
+
+def _scan_one(p: str, profiler=None, route: str = FULL):
+    path = Path(p)
+    plan = _PLANS[route] if _PLANS is not None else None
+    if _ENGINE is not None:
+        found, nbytes = (plan[2] if plan is not None else _ENGINE).scan_file(path, profiler)
+        # ScanFindings carry no path; _merge files them under `p` in the FindingStore
+        return (p, found), nbytes, None, []
+    if plan is not None:
+        # cache entries cover every matcher, so a partial plan bypasses the cache
+        findings, nbytes = scan_mmap(path, plan[1], profiler, plan[0])
+        for f in findings:
+            f["path"] = p
+        return findings, nbytes, None, []
+    if _CACHE is not None:
+        findings, nbytes, content_hash, new_rows = scan_file_cached(path, _CACHE, _FINGERPRINTS, _RULESET, profiler)
+        for f in findings:
+            f["path"] = p
+        return findings, nbytes, content_hash, new_rows
+    return scan_file(path, _RULESET, profiler) + (None, [])
+
+
+def _scan_decoded(p: str, profiler, decode_stats: DecodeStats):
+    if profiler is not None:
+        found = profiler.run("decoders", scan_decoded_file, Path(p), _RULESET, _DECODE, decode_stats)
+    else:
+        found = scan_decoded_file(Path(p), _RULESET, _DECODE, decode_stats)
+    for f in found:
+        f["path"] = p
+    return found
+
+
+def _scan_chunk(paths: List[str]):
+    """Scan one work unit; returns `(per-file results, {"profile": ..., "triage": ..., "decode": ...} reports)`."""
+    results = []
+    profiler = Profiler(_PROFILE) if _PROFILE is not None else None
+    triage_stats = TriageStats() if _TRIAGE is not None else None
+    decode_stats = DecodeStats() if _DECODE is not None else None
+    empty = (lambda p: (p, [])) if _ENGINE is not None else (lambda p: [])
+    for p in paths:
+        if profiler is not None:
+            profiler.path = p
+        try:
+            route = FULL
+            if triage_stats is not None:
+                route, reason, size = classify_path(Path(p), _TRIAGE)
+                triage_stats.add(route, reason, size)
+                if route == SKIP:
+                    continue
+            start = time.perf_counter()
+            result = _scan_one(p, profiler, route)
+            if decode_stats is not None and route == FULL:
+                decode_stats.scan_seconds += time.perf_counter() - start
+                # decoded findings follow the file's own; cache rows only ever hold the latter
+                result[0].extend(_scan_decoded(p, profiler, decode_stats))
+            results.append(result)
+        except OSError:
+            results.append((empty(p), 0, None, []))
+    reports = {"profile": profiler.to_dict() if profiler is not None else None,
+               "triage": triage_stats.to_dict() if triage_stats is not None else None,
+               "decode": decode_stats.to_dict() if decode_stats is not None else None}
+    return results, reports
+
+
+def _chunks(items: List[str], size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def scan_paths(paths: Iterable[Path], rules_path: Optional[Path] = None, workers: Optional[int] = None,
+               chunk_size: int = DEFAULT_CHUNK_SIZE, cache_path: Optional[Path] = None,
+               cache_max_entries: int = DEFAULT_MAX_ENTRIES, profile: bool = False,
+               time_cap: Optional[float] = DEFAULT_TIME_CAP, unified: bool = False, triage=None,
+               triage_stats=None, decode=None):
+    """Scan `paths` in parallel and return `(findings, ScanStats)`.
+
+    `workers=1` scans in-process without starting a pool. Findings are merged
+    in the order of `paths`, so the output is identical for any worker count.
+    With `cache_path`, unchanged files are answered from a `FindingsCache`
+    and `ScanStats.cache` reports the hit/miss counts. With `profile`, every
+    detector and rule is timed (see `profiling`) and the merged `Profiler`
+    is returned as `ScanStats.profile`. With `unified`, files are scanned by
+    `engine.Engine` and findings are returned as a `findings.FindingStore`
+    (iterating as `ScanFinding.to_dict()` rows plus `path`); the findings
+    cache is not supported in that mode. With `triage` (a
+    `triage.TriageConfig`), each file is first routed to skip, known-format
+    or full scanning and `ScanStats.triage` reports files and bytes per
+    route, merged into `triage_stats` when given. With `decode` (a
+    `decoders.DecodeLimits`), the content of base64, URL-encoded and gzip
+    spans of each fully scanned file is scanned as well and
+    `ScanStats.decode` reports the extra time it cost.
+    """
+    if unified and cache_path:
+        raise ValueError("the findings cache is not supported for unified scans")
+    if unified and decode is not None:
+        raise ValueError("decoding is not supported for unified scans")
+    start = time.perf_counter()
+    paths = [str(p) for p in paths]
+    rules_arg = str(rules_path) if rules_path else None
+    cache_arg = str(cache_path) if cache_path else None
+    chunk_size = max(1, chunk_size)
+    findings = FindingStore() if unified else []
+    stats = ScanStats()
+    cache = None
+    if cache_path:
+        cache = FindingsCache(Path(cache_path), max_entries=cache_max_entries)
+        stats.cache = CacheStats()
+    profile_arg = None
+    if profile:
+        # 0 disables the cap; Profiler treats a falsy time_cap as "never interrupt"
+        profile_arg = time_cap or 0
+        stats.profile = Profiler(time_cap)
+    if triage is not None:
+        stats.triage = triage_stats if triage_stats is not None else TriageStats()
+    if decode is not None:
+        stats.decode = DecodeStats()
+
+    try:
+        if workers == 1:
+            _init_worker(rules_arg, cache_arg, profile_arg, unified, triage, decode)
+            results = (_scan_chunk(c) for c in _chunks(paths, chunk_size))
+            for chunk in results:
+                _merge(chunk, findings, stats, cache)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(rules_arg, cache_arg, profile_arg, unified, triage, decode)) as ex:
+                # map() yields results in submission order, which keeps the merge deterministic
+                for chunk in ex.map(_scan_chunk, _chunks(paths, chunk_size)):
+                    _merge(chunk, findings, stats, cache)
+    finally:
+        if workers == 1:
+            _reset_worker()
+        if cache is not None:
+            cache.evict()
+            cache.close()
+
+    stats.findings = len(findings)
+    stats.seconds = time.perf_counter() - start
+    return findings, stats
+
+
+def _merge(chunk, findings, stats, cache=None):
+    chunk, reports = chunk
+    if reports["profile"] is not None:
+        stats.profile.merge(reports["profile"])
+    if reports["triage"] is not None:
+        stats.triage.merge(reports["triage"])
+    if reports["decode"] is not None:
+        stats.decode.merge(reports["decode"])
+    new_rows = []
+    used = []
+    for file_findings, nbytes, content_hash, rows in chunk:
+        if isinstance(findings, FindingStore):
+            path, found = file_findings
+            if found:
+                findings.extend(findings.add_path(path), found)
+        else:
+            findings.extend(file_findings)
+        stats.files += 1
+        stats.bytes_scanned += nbytes
+        if cache is None or content_hash is None:
+            continue
+        if rows:
+            stats.cache.misses += 1
+            stats.cache.stale_matchers += len(rows)
+            new_rows.extend(rows)
+        else:
+            stats.cache.hits += 1
+        used.append(content_hash)
+    if cache is not None:
+        cache.store(new_rows, used)
+
+
+def scan_directory(root: Path, rules_path: Optional[Path] = None, workers: Optional[int] = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE, exclude: Iterable[str] = (),
+                   cache_path: Optional[Path] = None, cache_max_entries: int = DEFAULT_MAX_ENTRIES,
+                   profile: bool = False, time_cap: Optional[float] = DEFAULT_TIME_CAP, unified: bool = False,
+                   triage=None, decode=None):
+    """Walk `root` and scan every eligible file; see `scan_paths`."""
+    triage_stats = TriageStats() if triage is not None else None
+    files = iter_files(root, exclude=exclude, triage_stats=triage_stats,
+                       gitignore=triage is None or triage.gitignore)
+    return scan_paths(files, rules_path=rules_path, workers=workers,
+                      chunk_size=chunk_size, cache_path=cache_path, cache_max_entries=cache_max_entries,
+                      profile=profile, time_cap=time_cap, unified=unified, triage=triage,
+                      triage_stats=triage_stats, decode=decode)
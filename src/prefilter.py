@@ -0,0 +1,290 @@
+"""Multi-pattern prefilter for the rule catalog.
+
+`RuleIndex` is built once per `RuleSet`. It collects one set of required
+literals per rule (from `keywords_prefixes`, or extracted from
+`regex_pattern`, e.g. `AKIA` from `AKIA[0-9A-Z]{16}`), finds every literal in
+a single case-insensitive pass over the text and only runs a rule's full
+regex where one of its literals occurs.
+
+Each rule is executed in one of three modes:
+
+- ``window``: the pattern has a bounded width and no anchors/lookarounds, so
+  it is run only on line-aligned windows around each literal hit;
+- ``gate``: the pattern is unbounded (e.g. `{20,}`), so it runs over the whole
+  text, but only when at least one of its literals occurs;
+- ``full``: no literal could be extracted; the rule always runs (slow path).
+
+Over bytes input, rules with a non-ASCII literal run in ``full`` mode: bytes
+regexes only fold ASCII case, so their literals cannot be found reliably.
+"""
+import re
+from typing import Dict, List, Tuple
+
+from .profiling import MatcherTimeout
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+MIN_LITERAL_LEN = 3
+MAX_ALTERNATIVES = 16
+# patterns wider than this are treated as unbounded and run in gate mode
+MAX_WINDOW_WIDTH = 4096
+
+_REPEAT_OPS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+               getattr(sre_constants, 'POSSESSIVE_REPEAT', sre_constants.MAX_REPEAT)}
+_ANCHOR_OPS = {sre_constants.ASSERT, sre_constants.ASSERT_NOT}
+_ANCHOR_ATS = {sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_STRING,
+               sre_constants.AT_END, sre_constants.AT_END_STRING}
+
+
+def _literal_candidates(seq) -> List[List[str]]:
+    """Return sets of alternatives, any one of which must occur in every match."""
+    candidates = []
+    # current run of literals; small character classes fan it out into alternatives
+    run = ['']
+
+    def flush():
+        if run != ['']:
+            candidates.append(list(run))
+        run[:] = ['']
+
+    def extend(chars):
+        run[:] = [prefix + c for prefix in run for c in chars]
+
+    for op, av in seq:
+        if op is sre_constants.LITERAL:
+            extend([chr(av)])
+            continue
+        if op is sre_constants.IN and all(o is sre_constants.LITERAL for o, _ in av) \
+                and len(run) * len(av) <= MAX_ALTERNATIVES:
+            extend([chr(a) for _, a in av])
+            continue
+        if op is sre_constants.SUBPATTERN:
+            # a plain group is part of the sequence: keep extending the run
+            inner = list(av[-1])
+            if all(o is sre_constants.LITERAL for o, _ in inner):
+                extend([''.join(chr(a) for _, a in inner)])
+                continue
+            flush()
+            candidates.extend(_literal_candidates(inner))
+            continue
+        flush()
+        if op is sre_constants.BRANCH:
+            alternatives = []
+            for branch in av[1]:
+                best = _best(_literal_candidates(branch))
+                if not best:
+                    alternatives = []
+                    break
+                alternatives.extend(best)
+            if alternatives:
+                candidates.append(alternatives)
+        elif op in _REPEAT_OPS and av[0] >= 1:
+            candidates.extend(_literal_candidates(av[2]))
+    flush()
+    return candidates
+
+
+def _best(candidates: List[List[str]]) -> List[str]:
+    usable = [c for c in candidates if c and min(len(s) for s in c) >= MIN_LITERAL_LEN]
+    if not usable:
+        return []
+    return max(usable, key=lambda c: (min(len(s) for s in c), -len(c)))
+
+
+def _walk(seq):
+    for op, av in seq:
+        yield op, av
+        if op is sre_constants.SUBPATTERN:
+            yield from _walk(av[-1])
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                yield from _walk(branch)
+        elif op in _REPEAT_OPS:
+            yield from _walk(av[2])
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            yield from _walk(av[1])
+
+
+def analyze_pattern(pattern: str) -> Tuple[List[str], int, bool]:
+    """Return `(required_literals, max_width, windowable)` for a regex.
+
+    `required_literals` is empty when nothing useful could be extracted;
+    `max_width` is None when the pattern is unbounded.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return [], None, False
+    literals = _best(_literal_candidates(list(parsed)))
+    hi = parsed.getwidth()[1]
+    width = hi if hi <= MAX_WINDOW_WIDTH else None
+    windowable = width is not None
+    for op, av in _walk(list(parsed)):
+        if op in _ANCHOR_OPS or (op is sre_constants.AT and av in _ANCHOR_ATS):
+            windowable = False
+            break
+    return literals, width, windowable
+
+
+def trie_pattern(words, shortest: bool = False) -> str:
+    """Regex source matching any of `words`, factored into a prefix trie.
+
+    At each position the regex engine follows at most one branch per
+    distinct next character, so the matching cost does not grow with the
+    number of words. Like an alternation sorted longest first, the longest
+    word matching at a position wins; with `shortest`, words that extend a
+    shorter word are dropped, which is enough to tell whether any occurs.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def emit(node):
+        if '' in node and (shortest or len(node) == 1):
+            return ''
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if '' in node:
+            # a word ends here, so the longer ones are optional
+            return '(?:' + '|'.join(alts) + ')?'
+        return alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+
+    return emit(trie)
+
+
+class RuleIndex:
+    """Combined literal index over a list of `Rule` objects."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._modes: List[str] = []
+        self._literals: List[List[str]] = []
+        self._widths: List[int] = []
+        owners: Dict[str, List[int]] = {}
+        for i, r in enumerate(self.rules):
+            literals, width, windowable = r.analysis
+            literals = list(literals)
+            kws = [k for k in r.keywords_prefixes if k]
+            if not literals and kws and min(len(k) for k in kws) >= MIN_LITERAL_LEN:
+                # Rule.matches requires one keyword inside the matched value
+                literals = kws
+            self._literals.append(literals)
+            self._widths.append(width if windowable else None)
+            if not literals:
+                self._modes.append('full')
+                continue
+            self._modes.append('window' if windowable else 'gate')
+            for lit in literals:
+                owners.setdefault(lit.lower(), []).append(i)
+        # bytes IGNORECASE and bytes.lower() only fold ASCII, so a rule with a non-ASCII literal
+        # cannot be prefiltered over bytes: it runs over the whole buffer there
+        self._byte_modes = ['full' if any(not lit.isascii() for lit in lits) else mode
+                            for lits, mode in zip(self._literals, self._modes)]
+        ascii_owners = {k: o for k, o in owners.items() if k.isascii()}
+        # every literal that is a prefix of a key also matches wherever the key does
+        self._prefixes = {k: [(len(p), owners[p]) for p in owners if k.startswith(p)] for k in owners}
+        self._prefixes_bytes = {k.encode('ascii'): [(len(p), o) for p, o in ascii_owners.items() if k.startswith(p)]
+                                for k in ascii_owners}
+        self._combined = None
+        self._combined_bytes = None
+        if owners:
+            self._combined = re.compile('(?=(' + trie_pattern(owners) + '))', re.IGNORECASE)
+        if ascii_owners:
+            self._combined_bytes = re.compile(('(?=(' + trie_pattern(ascii_owners) + '))').encode('ascii'),
+                                              re.IGNORECASE)
+        # a non-ASCII character can take up to four bytes in the bytes form of a pattern
+        self._byte_widths = [w if w is None or r.regex_pattern.isascii() else w * 4
+                             for r, w in zip(self.rules, self._widths)]
+
+    @property
+    def modes(self) -> Dict[str, str]:
+        return {r.token_id: mode for r, mode in zip(self.rules, self._modes)}
+
+    @property
+    def unaccelerated(self) -> List[str]:
+        """token_ids of rules that always run over the full text."""
+        return [r.token_id for r, mode in zip(self.rules, self._modes) if mode == 'full']
+
+    def report(self) -> List[Dict[str, object]]:
+        return [{'token_id': r.token_id, 'mode': self._modes[i], 'literals': self._literals[i]}
+                for i, r in enumerate(self.rules)]
+
+    def candidates(self, text) -> Dict[int, List[Tuple[int, int]]]:
+        """Map rule position -> list of (offset, literal length) hits, in one pass.
+
+        `text` may be a str or a bytes-like buffer; offsets follow its type.
+        """
+        hits: Dict[int, List[Tuple[int, int]]] = {}
+        if isinstance(text, str):
+            combined, prefixes = self._combined, self._prefixes
+        else:
+            combined, prefixes = self._combined_bytes, self._prefixes_bytes
+        if combined is None:
+            return hits
+        for m in combined.finditer(text):
+            pos = m.start()
+            for n, idxs in prefixes.get(m.group(1).lower(), ()):
+                for i in idxs:
+                    hits.setdefault(i, []).append((pos, n))
+        return hits
+
+    def _windows(self, text, hits, width: int):
+        nl = '\n' if isinstance(text, str) else b'\n'
+        windows = []
+        for pos, n in hits:
+            start = text.rfind(nl, 0, max(pos - width, 0)) + 1
+            end = text.find(nl, min(pos + n + width, len(text)))
+            end = len(text) if end == -1 else end
+            if windows and start <= windows[-1][1]:
+                windows[-1][1] = max(windows[-1][1], end)
+            else:
+                windows.append([start, end])
+        return windows
+
+    def _run_rule(self, i, text, rule_hits, width, stats=None):
+        r = self.rules[i]
+        matches = r.matches if isinstance(text, str) else r.matches_bytes
+        mode = self._modes[i] if isinstance(text, str) else self._byte_modes[i]
+        if mode != 'window':
+            return matches(text, stats=stats)
+        found = []
+        for start, end in self._windows(text, rule_hits, width):
+            found.extend(matches(text, start, end, stats=stats))
+        return found
+
+    def iter_matches(self, text, profiler=None):
+        """Yield `(rule position, finding dicts)` for every rule that ran over `text`.
+
+        `text` is a str, or bytes-like for `Rule.matches_bytes`. With a
+        `profiling.Profiler`, each rule is timed and capped separately.
+        """
+        widths, modes = (self._widths, self._modes) if isinstance(text, str) else (self._byte_widths, self._byte_modes)
+        hits = self.candidates(text)
+        for i, r in enumerate(self.rules):
+            rule_hits = hits.get(i, ())
+            if modes[i] != 'full' and not rule_hits:
+                continue
+            if profiler is None:
+                yield i, self._run_rule(i, text, rule_hits, widths[i])
+                continue
+            try:
+                with profiler.measure(r.token_id) as stats:
+                    stats.candidates += len(rule_hits)
+                    found = self._run_rule(i, text, rule_hits, widths[i], stats)
+                    stats.findings += len(found)
+            except MatcherTimeout:
+                continue
+            yield i, found
+
+    def match_text(self, text, profiler=None):
+        """Run every rule over `text` and return all finding dicts in rule order; see `iter_matches`."""
+        findings = []
+        for _, found in self.iter_matches(text, profiler):
+            findings.extend(found)
+        return findings
@@ -0,0 +1,142 @@
+"""Opt-in per-rule and per-detector profiling.
+
+A `Profiler` is passed down through `scan_text`, `RuleSet.match_text` and the
+mmap scanning path. For each matcher (a detector name or a rule's
+`token_id`) it aggregates, across every file of a scan:
+
+- wall time and number of calls;
+- prefilter candidates (literal hits for rules, regex hits for detectors);
+- regex matches;
+- matches rejected by the entropy threshold;
+- emitted findings.
+
+Each matcher also gets a per-file time budget (`time_cap`). On POSIX the
+budget is enforced with `SIGALRM`, which also interrupts a regex stuck in
+catastrophic backtracking; the matcher's findings for that file are
+dropped and the offender is recorded in `Profiler.timeouts`. Where timers
+are unavailable (non-main threads, Windows) over-budget runs are still
+reported, just not interrupted.
+"""
+import contextlib
+import signal
+import threading
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_TIME_CAP = 5.0
+
+
+class MatcherTimeout(Exception):
+    pass
+
+
+class MatcherStats:
+    __slots__ = ('calls', 'seconds', 'candidates', 'matches', 'entropy_rejected', 'findings', 'max_seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.candidates = 0
+        self.matches = 0
+        self.entropy_rejected = 0
+        self.findings = 0
+        self.max_seconds = 0.0
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def merge(self, other: dict):
+        for k in self.__slots__:
+            if k == 'max_seconds':
+                self.max_seconds = max(self.max_seconds, other[k])
+            else:
+                setattr(self, k, getattr(self, k) + other[k])
+
+
+def _can_interrupt() -> bool:
+    return hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+
+
+def _on_alarm(signum, frame):
+    raise MatcherTimeout()
+
+
+class Profiler:
+    def __init__(self, time_cap: Optional[float] = DEFAULT_TIME_CAP):
+        self.time_cap = time_cap
+        self.stats: Dict[str, MatcherStats] = {}
+        self.timeouts: List[dict] = []
+        self.path: Optional[str] = None
+
+    def get(self, name: str) -> MatcherStats:
+        s = self.stats.get(name)
+        if s is None:
+            s = self.stats[name] = MatcherStats()
+        return s
+
+    @contextlib.contextmanager
+    def measure(self, name: str):
+        """Time one matcher run on the current file; yields its `MatcherStats`.
+
+        Raises `MatcherTimeout` out of the block when the time cap interrupts
+        it; callers treat that as "no findings from this matcher".
+        """
+        stats = self.get(name)
+        interrupt = bool(self.time_cap) and _can_interrupt()
+        if interrupt:
+            previous = signal.signal(signal.SIGALRM, _on_alarm)
+            signal.setitimer(signal.ITIMER_REAL, self.time_cap)
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            yield stats
+        except MatcherTimeout:
+            timed_out = True
+            raise
+        finally:
+            if interrupt:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous)
+            elapsed = time.perf_counter() - start
+            stats.calls += 1
+            stats.seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            if timed_out or (self.time_cap and elapsed > self.time_cap):
+                self.timeouts.append({'matcher': name, 'path': self.path, 'seconds': elapsed,
+                                      'interrupted': timed_out})
+
+    def run(self, name: str, func, *args, pass_stats: bool = False):
+        """Call `func(*args)` under `measure(name)`; returns [] if it was interrupted.
+
+        With `pass_stats`, the matcher's `MatcherStats` is passed as `stats=`
+        so `func` can record candidates, matches and entropy rejections.
+        """
+        try:
+            with self.measure(name) as stats:
+                result = func(*args, stats=stats) if pass_stats else func(*args)
+                stats.findings += len(result)
+                return result
+        except MatcherTimeout:
+            return []
+
+    def to_dict(self):
+        """Machine-readable report, slowest matchers first."""
+        ordered = sorted(self.stats.items(), key=lambda kv: kv[1].seconds, reverse=True)
+        return {'time_cap': self.time_cap, 'matchers': {k: v.to_dict() for k, v in ordered},
+                'timeouts': list(self.timeouts)}
+
+    def merge(self, report: dict):
+        """Fold in a report produced by `to_dict` (e.g. from a pool worker)."""
+        for name, data in report['matchers'].items():
+            self.get(name).merge(data)
+        self.timeouts.extend(report['timeouts'])
+
+    def format_table(self) -> str:
+        lines = [f"{'matcher':<28} {'calls':>7} {'seconds':>9} {'cands':>8} {'matches':>8} {'ent-rej':>8} {'finds':>7}"]
+        for name, s in sorted(self.stats.items(), key=lambda kv: kv[1].seconds, reverse=True):
+            lines.append(f"{name:<28} {s.calls:>7} {s.seconds:>9.4f} {s.candidates:>8} {s.matches:>8} "
+                         f"{s.entropy_rejected:>8} {s.findings:>7}")
+        for t in self.timeouts:
+            verb = 'interrupted' if t['interrupted'] else 'exceeded time cap'
+            lines.append(f"SLOW: {t['matcher']} {verb} on {t['path']} after {t['seconds']:.2f}s")
+        return '\n'.join(lines)
@@ -0,0 +1,421 @@
+"""Load-time cost analysis of catalog regexes (ReDoS guard).
+
+Every rule loaded through `RuleSet.from_yaml` / `from_sqlite` is checked by
+a `RegexGuard`:
+
+- statically, from the parsed pattern: nested quantifiers such as `(a+)+`
+  and repeated alternations whose branches overlap (exponential
+  backtracking), adjacent unbounded quantifiers over overlapping characters
+  and backreferences (polynomial backtracking);
+- dynamically, by timing the compiled pattern on adversarial inputs built
+  from it (each unbounded repeat's body pumped to a few KiB, followed by a
+  character that makes the match fail) and on generic runs of letters,
+  digits and spaces. Each run has a time budget, enforced with `SIGALRM`
+  like the profiler's time cap. By default only rules with static findings
+  are timed at load; `tools.analyze_rules` times every rule.
+
+A rule whose run is interrupted, whose worst-case cost exceeds
+`max_cost_per_mb`, or whose time grows super-linearly with the input is
+quarantined: its `rule_status` becomes ``Testing`` and the `RuleSet` keeps
+it in `quarantined` instead of running it. With `action="refuse"`, loading
+raises `UnsafeRuleError` instead. The `GuardReport` lists every check, with
+the rule's required prefilter literals, ranked by measured cost per MB.
+"""
+import re
+import time
+from typing import Dict, List, Optional
+
+from .profiling import MatcherTimeout, Profiler, _can_interrupt
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+QUARANTINE = 'quarantine'
+REFUSE = 'refuse'
+REPORT = 'report'
+QUARANTINED_STATUS = 'Testing'
+
+# seconds one rule may spend on one adversarial input
+DEFAULT_BUDGET = 0.25
+# worst-case seconds per MiB above which a rule is quarantined
+DEFAULT_MAX_COST_PER_MB = 5.0
+# adversarial input sizes; time growing much faster than size is super-linear
+SMALL_SIZE = 1024
+LARGE_SIZE = 8 * 1024
+# growth factor of the time from SMALL_SIZE to LARGE_SIZE treated as super-linear (linear is 8)
+SUPERLINEAR_GROWTH = 24
+# below this many seconds timings are too noisy to judge growth
+MIN_GROWTH_SECONDS = 0.005
+# the worst input is re-timed this many times per size and the fastest run kept
+REPEAT = 3
+GENERIC_PUMPS = ['a', 'A', '0', ' ', 'aA0_-', 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/']
+KILLERS = ['', '!', '\n']
+
+_MAXREPEAT = sre_constants.MAXREPEAT
+_BACKTRACKING_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+_CATEGORY_CHARS = {
+    sre_constants.CATEGORY_DIGIT: '0123456789',
+    sre_constants.CATEGORY_WORD: 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_',
+    sre_constants.CATEGORY_SPACE: ' \t\n\r\f\v',
+}
+# candidates tried when a negated set or category needs a sample character
+_SAMPLE_CHARS = 'a0A_ -!.\n'
+
+
+class UnsafeRuleError(ValueError):
+    pass
+
+
+def _chars(op, av) -> Optional[set]:
+    """Characters a single-character item can match, or None if too many to enumerate."""
+    if op is sre_constants.LITERAL:
+        return {chr(av)}
+    if op is sre_constants.IN:
+        chars = set()
+        for o, a in av:
+            if o is sre_constants.NEGATE:
+                return None
+            if o is sre_constants.LITERAL:
+                chars.add(chr(a))
+            elif o is sre_constants.RANGE:
+                if a[1] - a[0] > 512:
+                    return None
+                chars.update(chr(c) for c in range(a[0], a[1] + 1))
+            elif o is sre_constants.CATEGORY and a in _CATEGORY_CHARS:
+                chars.update(_CATEGORY_CHARS[a])
+            else:
+                return None
+        return chars
+    return None
+
+
+def _first_chars(seq) -> Optional[set]:
+    """Characters a match of `seq` can start with; None means unknown or any."""
+    for op, av in seq:
+        if op is sre_constants.AT:
+            continue
+        if op is sre_constants.SUBPATTERN:
+            return _first_chars(av[-1])
+        if op is sre_constants.BRANCH:
+            chars = set()
+            for branch in av[1]:
+                first = _first_chars(branch)
+                if first is None:
+                    return None
+                chars |= first
+            return chars
+        if op in _BACKTRACKING_REPEATS or op is getattr(sre_constants, 'POSSESSIVE_REPEAT', None):
+            return _first_chars(av[2]) if av[0] else None
+        return _chars(op, av)
+    return None
+
+
+def _overlap(a: Optional[set], b: Optional[set]) -> bool:
+    return a is None or b is None or bool(a & b)
+
+
+def _has_repeat(seq) -> bool:
+    for op, av in seq:
+        if op in _BACKTRACKING_REPEATS and av[1] > 1:
+            return True
+        if op is sre_constants.SUBPATTERN and _has_repeat(av[-1]):
+            return True
+        if op is sre_constants.BRANCH and any(_has_repeat(b) for b in av[1]):
+            return True
+    return False
+
+
+def _static(seq, issues: List[dict], in_repeat: bool = False):
+    prev = None
+    for op, av in seq:
+        if op in _BACKTRACKING_REPEATS:
+            lo, hi, body = av
+            unbounded = hi == _MAXREPEAT
+            if (unbounded or hi > 16) and _has_repeat(body):
+                issues.append({'severity': 'error', 'kind': 'nested-quantifier',
+                               'detail': 'a repeated group contains another quantifier'})
+            if unbounded and prev is not None and _overlap(prev, _first_chars(body)):
+                issues.append({'severity': 'warning', 'kind': 'adjacent-quantifiers',
+                               'detail': 'consecutive unbounded quantifiers can match the same characters'})
+            _static(body, issues, in_repeat or unbounded)
+            prev = _first_chars(body) if unbounded else None
+            continue
+        if op is sre_constants.BRANCH:
+            if in_repeat:
+                firsts = [_first_chars(b) for b in av[1]]
+                if any(_overlap(firsts[i], firsts[j]) for i in range(len(firsts)) for j in range(i + 1, len(firsts))):
+                    issues.append({'severity': 'error', 'kind': 'overlapping-alternation',
+                                   'detail': 'alternatives inside a repeat can match the same input'})
+            for branch in av[1]:
+                _static(branch, issues, in_repeat)
+        elif op is sre_constants.SUBPATTERN:
+            _static(av[-1], issues, in_repeat)
+            # a group ending in an unbounded repeat is still "open" for the adjacency check
+            last = av[-1][-1] if len(av[-1]) else None
+            if last is not None and last[0] in _BACKTRACKING_REPEATS and last[1][1] == _MAXREPEAT:
+                prev = _first_chars(last[1][2])
+                continue
+        elif op in (sre_constants.GROUPREF, getattr(sre_constants, 'GROUPREF_EXISTS', None)):
+            issues.append({'severity': 'warning', 'kind': 'backreference',
+                           'detail': 'backreferences force backtracking over the referenced group'})
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            _static(av[1], issues, in_repeat)
+        prev = None
+
+
+def static_issues(pattern: str) -> List[dict]:
+    """Super-linear constructs in `pattern`, as `{"severity", "kind", "detail"}` dicts."""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception as exc:
+        return [{'severity': 'error', 'kind': 'invalid', 'detail': str(exc)}]
+    issues: List[dict] = []
+    _static(list(parsed), issues)
+    # one entry per kind is enough for the report
+    return list({i['kind']: i for i in issues}.values())
+
+
+def _escape(c: str) -> str:
+    return '\\' + c if c in '\\]^-[' else c
+
+
+_CATEGORY_PATTERNS = {
+    sre_constants.CATEGORY_DIGIT: r'\d', sre_constants.CATEGORY_NOT_DIGIT: r'\D',
+    sre_constants.CATEGORY_WORD: r'\w', sre_constants.CATEGORY_NOT_WORD: r'\W',
+    sre_constants.CATEGORY_SPACE: r'\s', sre_constants.CATEGORY_NOT_SPACE: r'\S',
+}
+
+
+def _item_pattern(op, av) -> str:
+    """Rebuild a one-character item (set, negated literal, any) as a pattern."""
+    if op is sre_constants.NOT_LITERAL:
+        return '[^' + _escape(chr(av)) + ']'
+    if op is not sre_constants.IN:
+        return '.'
+    negate = ''
+    parts = []
+    for o, a in av:
+        if o is sre_constants.NEGATE:
+            negate = '^'
+        elif o is sre_constants.LITERAL:
+            parts.append(_escape(chr(a)))
+        elif o is sre_constants.RANGE:
+            parts.append(_escape(chr(a[0])) + '-' + _escape(chr(a[1])))
+        elif o is sre_constants.CATEGORY:
+            parts.append(_CATEGORY_PATTERNS.get(a, ''))
+    return '[' + negate + ''.join(parts) + ']'
+
+
+def _sample_char(op, av) -> str:
+    chars = _chars(op, av)
+    if chars:
+        return min(chars)
+    try:
+        item = re.compile(_item_pattern(op, av))
+    except re.error:
+        return 'a'
+    return next((c for c in _SAMPLE_CHARS if item.fullmatch(c)), 'a')
+
+
+def _sample(seq, groups: Optional[Dict[int, str]] = None) -> str:
+    """A short string matched by `seq` (best effort: lookarounds are ignored)."""
+    groups = {} if groups is None else groups
+    out = []
+    for op, av in seq:
+        if op in (sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.IN, sre_constants.ANY):
+            out.append(chr(av) if op is sre_constants.LITERAL else _sample_char(op, av))
+        elif op is sre_constants.SUBPATTERN:
+            text = _sample(av[-1], groups)
+            if av[0] is not None:
+                groups[av[0]] = text
+            out.append(text)
+        elif op is sre_constants.BRANCH:
+            out.append(_sample(av[1][0], groups))
+        elif op in _BACKTRACKING_REPEATS or op is getattr(sre_constants, 'POSSESSIVE_REPEAT', None):
+            out.append(_sample(av[2], groups) * av[0])
+        elif op is sre_constants.GROUPREF:
+            out.append(groups.get(av, ''))
+    return ''.join(out)
+
+
+def _pumps(seq, prefix: str, found: List[tuple]):
+    """Collect `(prefix, pumped body)` for every unbounded repeat in `seq`."""
+    for i, (op, av) in enumerate(seq):
+        before = prefix + _sample(seq[:i])
+        if op in _BACKTRACKING_REPEATS:
+            body = _sample(av[2])
+            if av[1] == _MAXREPEAT and body:
+                found.append((before, body))
+            _pumps(list(av[2]), before, found)
+        elif op is sre_constants.SUBPATTERN:
+            _pumps(list(av[-1]), before, found)
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                _pumps(list(branch), before, found)
+
+
+def adversarial_inputs(pattern: str, size: int) -> List[str]:
+    """Inputs of about `size` characters that make backtracking patterns work hardest.
+
+    The list has the same length and order for every `size`.
+    """
+    inputs = []
+    try:
+        parsed = list(sre_parse.parse(pattern))
+    except Exception:
+        parsed = []
+    pumps: List[tuple] = []
+    _pumps(parsed, '', pumps)
+    for prefix, body in pumps:
+        core = prefix + body * max(1, (size - len(prefix)) // len(body))
+        inputs.extend(core + k for k in KILLERS)
+    for pump in GENERIC_PUMPS:
+        inputs.append((pump * (size // len(pump) + 1))[:size])
+    return inputs
+
+
+class RuleCheck:
+    """Outcome of guarding one rule."""
+
+    def __init__(self, token_id: str, issues: List[dict], literals: List[str]):
+        self.token_id = token_id
+        self.issues = issues
+        self.literals = literals
+        self.cost_per_mb: Optional[float] = None
+        self.growth: Optional[float] = None
+        self.timed_out = False
+        self.reasons: List[str] = []
+
+    @property
+    def unsafe(self) -> bool:
+        return bool(self.reasons)
+
+    def to_dict(self):
+        return {'token_id': self.token_id, 'issues': self.issues, 'literals': self.literals,
+                'cost_per_mb': self.cost_per_mb, 'growth': self.growth, 'timed_out': self.timed_out,
+                'reasons': self.reasons}
+
+
+class GuardReport:
+    def __init__(self, checks: Optional[List[RuleCheck]] = None):
+        self.checks = checks or []
+
+    @property
+    def unsafe(self) -> List[RuleCheck]:
+        return [c for c in self.checks if c.unsafe]
+
+    def ranked(self) -> List[RuleCheck]:
+        """Checks by measured cost per MB, most expensive first; unmeasured rules last."""
+        return sorted(self.checks, key=lambda c: (c.timed_out, c.cost_per_mb or 0.0), reverse=True)
+
+    def to_dict(self):
+        return {'rules': [c.to_dict() for c in self.ranked()], 'unsafe': [c.token_id for c in self.unsafe]}
+
+    def format_table(self) -> str:
+        lines = [f"{'rule':<28} {'s/MB':>9} {'growth':>7} {'literals':<20} issues"]
+        for c in self.ranked():
+            cost = 'timeout' if c.timed_out else '-' if c.cost_per_mb is None else f'{c.cost_per_mb:.3f}'
+            growth = '-' if c.growth is None else f'{c.growth:.1f}x'
+            literals = ','.join(c.literals)[:20] or '-'
+            issues = ', '.join(i['kind'] for i in c.issues) or '-'
+            flag = '  QUARANTINE: ' + '; '.join(c.reasons) if c.unsafe else ''
+            lines.append(f'{c.token_id:<28} {cost:>9} {growth:>7} {literals:<20} {issues}{flag}')
+        return '\n'.join(lines)
+
+
+class RegexGuard:
+    """Checks rules for super-linear regexes; see the module docstring.
+
+    `measure` is 'suspect' (time only rules with static findings), 'all'
+    or 'none'. `action` is QUARANTINE, REFUSE or REPORT.
+    """
+
+    def __init__(self, budget: float = DEFAULT_BUDGET, max_cost_per_mb: float = DEFAULT_MAX_COST_PER_MB,
+                 measure: str = 'suspect', action: str = QUARANTINE):
+        if measure not in ('suspect', 'all', 'none') or action not in (QUARANTINE, REFUSE, REPORT):
+            raise ValueError(f'unknown guard mode {measure!r}/{action!r}')
+        self.budget = budget
+        self.max_cost_per_mb = max_cost_per_mb
+        self.measure = measure
+        self.action = action
+
+    def _time(self, compiled, text: str, profiler: Profiler, name: str, repeat: int = 1) -> Optional[float]:
+        """Best of `repeat` runs of `compiled` over `text` in seconds, or None if the budget interrupted one."""
+        best = None
+        for _ in range(repeat):
+            try:
+                with profiler.measure(name):
+                    start = time.perf_counter()
+                    for _ in compiled.finditer(text):
+                        pass
+                    elapsed = time.perf_counter() - start
+            except MatcherTimeout:
+                return None
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def check(self, rule) -> RuleCheck:
+        issues = static_issues(rule.regex_pattern)
+        check = RuleCheck(rule.token_id, issues, list(rule.analysis[0]))
+        errors = [i for i in issues if i['severity'] == 'error']
+        if self.measure == 'none' or (self.measure == 'suspect' and not issues):
+            if errors:
+                check.reasons.append('static: ' + ', '.join(i['kind'] for i in errors))
+            return check
+        if errors and not _can_interrupt():
+            # an exponential pattern could hang an uninterruptible run
+            check.reasons.append('static: ' + ', '.join(i['kind'] for i in errors))
+            return check
+        compiled = rule._compiled
+        profiler = Profiler(self.budget)
+        worst = 0
+        worst_small = 0.0
+        for i, text in enumerate(adversarial_inputs(rule.regex_pattern, SMALL_SIZE)):
+            elapsed = self._time(compiled, text, profiler, rule.token_id)
+            if elapsed is None:
+                check.timed_out = True
+                check.reasons.append(f'over the {self.budget}s budget on a {len(text)}-character input')
+                return check
+            if elapsed >= worst_small:
+                worst, worst_small = i, elapsed
+        # re-time the worst input at both sizes, best of REPEAT so scheduler noise does not read as growth
+        small = adversarial_inputs(rule.regex_pattern, SMALL_SIZE)[worst]
+        worst_small = self._time(compiled, small, profiler, rule.token_id, REPEAT) or 0.0
+        text = adversarial_inputs(rule.regex_pattern, LARGE_SIZE)[worst]
+        elapsed = self._time(compiled, text, profiler, rule.token_id, REPEAT)
+        if elapsed is None:
+            check.timed_out = True
+            check.reasons.append(f'over the {self.budget}s budget on a {len(text)}-character input')
+            return check
+        check.cost_per_mb = elapsed / len(text) * 2 ** 20
+        if worst_small > 0:
+            check.growth = elapsed / worst_small
+        if check.cost_per_mb > self.max_cost_per_mb:
+            check.reasons.append(f'{check.cost_per_mb:.1f} s/MB worst case')
+        if elapsed >= MIN_GROWTH_SECONDS and check.growth is not None and check.growth > SUPERLINEAR_GROWTH:
+            check.reasons.append(f'time grows {check.growth:.0f}x for {LARGE_SIZE // SMALL_SIZE}x input')
+        return check
+
+    def check_all(self, rules) -> GuardReport:
+        return GuardReport([self.check(r) for r in rules])
+
+    def apply(self, rules):
+        """Return `(safe rules, quarantined rules, GuardReport)`; raises `UnsafeRuleError` when refusing."""
+        report = self.check_all(rules)
+        unsafe = {c.token_id: c for c in report.unsafe}
+        if not unsafe or self.action == REPORT:
+            return list(rules), [], report
+        if self.action == REFUSE:
+            raise UnsafeRuleError('unsafe rules: ' + '; '.join(f'{tid} ({", ".join(c.reasons)})'
+                                                               for tid, c in unsafe.items()))
+        safe, quarantined = [], []
+        for r in rules:
+            if r.token_id in unsafe:
+                r.rule_status = QUARANTINED_STATUS
+                quarantined.append(r)
+            else:
+                safe.append(r)
+        return safe, quarantined, report
@@ -2,27 +2,43 @@
 Supports loading rules from YAML or SQLite and matching text with regex + entropy + length + keyword checks.
 """
 from pathlib import Path
+import hashlib
+import json
 import re
 import sqlite3
 import yaml
-import math
 from typing import List, Dict, Any
+from .detectors import KEYWORDS, KeywordMatcher
+from .entropy import batch_entropy, shannon_entropy as _shannon_entropy
+from .lines import LineIndex, annotate
+from .prefilter import RuleIndex, analyze_pattern
+from .regex_guard import GuardReport, RegexGuard
 
 
-def _shannon_entropy(data: str) -> float:
-    if not data:
-        return 0.0
-    from collections import Counter
-    counts = Counter(data)
-    entropy = 0.0
-    for c in counts.values():
-        p = c / len(data)
-        entropy -= p * math.log2(p)
-    return entropy
+# version of the JSON layout written by tools/compile_rules.py
+COMPILED_FORMAT = 1
+
+
+def compiled_entry(rule: 'Rule') -> Dict[str, Any]:
+    """Normalized, pre-analyzed form of `rule` for the compiled catalog."""
+    return {
+        'token_id': rule.token_id,
+        'token_name': rule.token_name,
+        'detection_category': rule.detection_category,
+        'regex_pattern': rule.regex_pattern,
+        'keywords_prefixes': rule.keywords_prefixes,
+        'minimum_entropy': rule.minimum_entropy,
+        'token_length': rule.token_length,
+        'length_min': rule.length_min,
+        'length_max': rule.length_max,
+        'default_severity': rule.default_severity,
+        'rule_status': rule.rule_status,
+        'analysis': list(rule.analysis),
+    }
 
 
 class Rule:
-    def __init__(self, row: Dict[str, Any]):
+    def __init__(self, row: Dict[str, Any], lazy: bool = False):
         self.token_id = row.get('token_id') or row.get('token_id')
         self.token_name = row.get('token_name')
         self.detection_category = row.get('detection_category')
@@ -34,7 +50,11 @@ class Rule:
         self.minimum_entropy = float(row.get('minimum_entropy') or 0)
         self.token_length = row.get('token_length')
         # token_length may be an int or a range "min-max"; normalize
-        if isinstance(self.token_length, str) and '-' in self.token_length:
+        if 'length_min' in row:
+            # already normalized (compiled catalog)
+            self.length_min = row['length_min']
+            self.length_max = row['length_max']
+        elif isinstance(self.token_length, str) and '-' in self.token_length:
             parts = self.token_length.split('-')
             self.length_min = int(parts[0])
             self.length_max = int(parts[1])
@@ -47,46 +67,252 @@ class Rule:
                 self.length_max = None
         self.default_severity = row.get('default_severity')
         self.rule_status = row.get('rule_status')
-        self._compiled = re.compile(self.regex_pattern)
+        # (required literals, max width, windowable) from prefilter.analyze_pattern
+        self._analysis = row.get('analysis')
+        self._compiled_re = None
+        self._compiled_bytes = False
+        if not lazy:
+            self._compiled_re = re.compile(self.regex_pattern)
 
-    def matches(self, text: str):
-        findings = []
-        for m in self._compiled.finditer(text):
-            val = m.groupdict().get('val') if 'val' in m.groupdict() else m.group(0)
-            ent = _shannon_entropy(val)
+    @property
+    def _compiled(self):
+        # lazily loaded rules are compiled on first use
+        if self._compiled_re is None:
+            self._compiled_re = re.compile(self.regex_pattern)
+        return self._compiled_re
+
+    @property
+    def analysis(self):
+        if self._analysis is None:
+            self._analysis = analyze_pattern(self.regex_pattern)
+        return self._analysis
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable hash of everything that affects what this rule reports."""
+        fields = [self.token_id, self.token_name, self.regex_pattern, self.keywords_prefixes,
+                  self.minimum_entropy, self.length_min, self.length_max, self.default_severity]
+        return hashlib.sha256(json.dumps(fields).encode('utf-8')).hexdigest()[:16]
+
+    @property
+    def compiled_bytes(self):
+        """Bytes version of the regex for mmap/bytes scanning, or None if it cannot be built."""
+        if self._compiled_bytes is False:
+            if not self.regex_pattern.isascii() and self._compiled.flags & re.IGNORECASE:
+                # bytes patterns only fold ASCII case: "(?i)Über" would miss "über"
+                self._compiled_bytes = None
+                return None
+            try:
+                self._compiled_bytes = re.compile(self.regex_pattern.encode('utf-8'))
+            except (re.error, UnicodeEncodeError):
+                self._compiled_bytes = None
+        return self._compiled_bytes
+
+    def keyword_ok(self, val: str) -> bool:
+        """Whether `val` passes the `keywords_prefixes` check (always true without keywords)."""
+        if not self.keywords_prefixes:
+            return True
+        return any(val.startswith(k) or k.lower() in val.lower() for k in self.keywords_prefixes)
+
+    def _evaluate(self, candidates, stats=None):
+        """Filter `(value, offset)` candidates into finding dicts.
+
+        Length and keyword checks run first; entropy is then computed for the
+        survivors in one batch, skipping values that cannot reach
+        `minimum_entropy`. `stats` is an optional `profiling.MatcherStats`.
+        """
+        kept = []
+        for val, offset in candidates:
             length_ok = True
             if self.length_min is not None:
                 length_ok = (self.length_min <= len(val) <= self.length_max)
-            entropy_ok = (ent >= self.minimum_entropy) if self.minimum_entropy else True
-            # quick keyword check
-            kw_ok = True
-            if self.keywords_prefixes:
-                kw_ok = any(val.startswith(k) or k.lower() in val.lower() for k in self.keywords_prefixes)
-            if length_ok and entropy_ok and kw_ok:
-                findings.append({
-                    'token_id': self.token_id,
-                    'token_name': self.token_name,
-                    'match': val,
-                    'entropy': ent,
-                    'length': len(val),
-                    'severity': self.default_severity
-                })
+            if length_ok and self.keyword_ok(val):
+                kept.append((val, offset))
+        entropies = batch_entropy([val for val, _ in kept], threshold=self.minimum_entropy)
+        findings = []
+        for (val, offset), ent in zip(kept, entropies):
+            if ent is None or (self.minimum_entropy and ent < self.minimum_entropy):
+                if stats is not None:
+                    stats.entropy_rejected += 1
+                continue
+            findings.append({
+                'token_id': self.token_id,
+                'token_name': self.token_name,
+                'match': val,
+                'entropy': ent,
+                'length': len(val),
+                'severity': self.default_severity,
+                'offset': offset
+            })
         return findings
 
+    def matches(self, text: str, pos: int = 0, endpos: int = None, stats=None, lines: LineIndex = None):
+        """Findings in `text[pos:endpos]`; with `lines` (a `LineIndex` over `text`) they get `lineno` and `column`."""
+        if endpos is None:
+            endpos = len(text)
+        candidates = []
+        for m in self._compiled.finditer(text, pos, endpos):
+            group = 'val' if 'val' in m.groupdict() else 0
+            candidates.append((m.group(group) or '', m.start(group)))
+        if stats is not None:
+            stats.matches += len(candidates)
+        findings = self._evaluate(candidates, stats)
+        return annotate(findings, lines) if lines is not None else findings
+
+    def candidates_bytes(self, buf, pos: int = 0, endpos: int = None):
+        """`(value, byte offset)` of every regex match in a bytes-like buffer, before any filtering.
+
+        Only the matched value is decoded. Falls back to decoding the buffer
+        when the pattern has no bytes form.
+        """
+        if endpos is None:
+            endpos = len(buf)
+        compiled = self.compiled_bytes
+        candidates = []
+        if compiled is None:
+            text = bytes(buf[pos:endpos]).decode('utf-8', 'surrogateescape')
+            for m in self._compiled.finditer(text):
+                group = 'val' if 'val' in m.groupdict() else 0
+                offset = pos + len(text[:m.start(group)].encode('utf-8', 'surrogateescape'))
+                candidates.append((m.group(group) or '', offset))
+            return candidates
+        for m in compiled.finditer(buf, pos, endpos):
+            group = 'val' if 'val' in m.groupdict() else 0
+            candidates.append(((m.group(group) or b'').decode('utf-8', 'replace'), m.start(group)))
+        return candidates
+
+    def matches_bytes(self, buf, pos: int = 0, endpos: int = None, stats=None, lines: LineIndex = None):
+        """Like `matches` but over a bytes-like buffer (bytes, mmap); `offset` is a byte offset."""
+        candidates = self.candidates_bytes(buf, pos, endpos)
+        if stats is not None:
+            stats.matches += len(candidates)
+        findings = self._evaluate(candidates, stats)
+        return annotate(findings, lines) if lines is not None else findings
+
 
 class RuleSet:
-    def __init__(self, rules: List[Rule]):
+    def __init__(self, rules: List[Rule], quarantined: List[Rule] = None, guard_report=None, skipped=None):
         self.rules = rules
+        # rules set aside by the regex guard (rule_status 'Testing'); they are never run
+        self.quarantined = quarantined or []
+        self.guard_report = guard_report
+        # external rules that could not be translated: [{'id', 'reason'}]
+        self.skipped = skipped or []
+        self._index = None
+        self._keywords = None
+
+    @classmethod
+    def _guarded(cls, rules: List[Rule], guard=True, skipped=None):
+        """Build a RuleSet, checking `rules` with `guard` (True for the default `RegexGuard`, falsy to skip)."""
+        if not guard:
+            return cls(rules, skipped=skipped)
+        if guard is True:
+            guard = RegexGuard()
+        safe, quarantined, report = guard.apply(rules)
+        return cls(safe, quarantined, report, skipped)
+
+    @classmethod
+    def combine(cls, sets: List['RuleSet']):
+        """One RuleSet running the rules of all `sets` in a single pass."""
+        combined = cls([])
+        checks = []
+        for rs in sets:
+            combined.rules.extend(rs.rules)
+            combined.quarantined.extend(rs.quarantined)
+            combined.skipped.extend(rs.skipped)
+            if rs.guard_report is not None:
+                checks.extend(rs.guard_report.checks)
+        if any(rs.guard_report is not None for rs in sets):
+            combined.guard_report = GuardReport(checks)
+        return combined
+
+    @property
+    def index(self) -> RuleIndex:
+        """Literal prefilter over `rules`, built on first use."""
+        if self._index is None or self._index.rules != self.rules:
+            self._index = RuleIndex(self.rules)
+        return self._index
+
+    @property
+    def keyword_matcher(self) -> KeywordMatcher:
+        """Keyword-context matcher over the built-in `KEYWORDS` plus every rule's `keywords_prefixes`."""
+        keywords = KEYWORDS + [k for r in self.rules for k in r.keywords_prefixes]
+        if self._keywords is None or self._keywords[0] != keywords:
+            self._keywords = (keywords, KeywordMatcher(keywords))
+        return self._keywords[1]
 
     @classmethod
-    def from_yaml(cls, path: Path):
+    def from_yaml(cls, path: Path, guard=True):
+        """Load a YAML catalog; see `regex_guard` for `guard`."""
         with open(path, 'r', encoding='utf-8') as fh:
             data = yaml.safe_load(fh)
         rules = [Rule(r) for r in data]
+        return cls._guarded(rules, guard)
+
+    @classmethod
+    def from_path(cls, path: Path, guard=True):
+        """Load from a `.db` SQLite catalog, a `.catalog` compiled catalog, a gitleaks `.toml`,
+        a trufflehog `.json` or a YAML file.
+
+        A comma-separated list of paths loads all of them into one RuleSet.
+        A `.catalog` next to a `.yaml` of the same name must still match it.
+        Compiled catalogs were guarded when they were built and are not re-checked;
+        rules the guard quarantined were left out of them (`tools/compile_rules` lists them).
+        """
+        if ',' in str(path):
+            return cls.combine([cls.from_path(Path(p), guard) for p in str(path).split(',') if p])
+        suffix = Path(path).suffix
+        if suffix == '.toml':
+            return cls.from_gitleaks(path, guard)
+        if suffix == '.json':
+            return cls.from_trufflehog(path, guard)
+        if suffix == '.db':
+            return cls.from_sqlite(path, guard)
+        if suffix == '.catalog':
+            # `tools/compile_rules` writes rules.catalog next to the rules.yaml it compiles
+            source = Path(path).with_suffix('.yaml')
+            return cls.from_compiled(path, source=source if source.exists() else None)
+        return cls.from_yaml(path, guard)
+
+    @classmethod
+    def from_gitleaks(cls, path: Path, guard=True):
+        """Load a gitleaks TOML config; untranslatable rules are listed in `skipped`."""
+        from .external_rules import load_gitleaks
+        rules, skipped = load_gitleaks(path)
+        return cls._guarded(rules, guard, skipped)
+
+    @classmethod
+    def from_trufflehog(cls, path: Path, guard=True):
+        """Load a trufflehog JSON rule file; untranslatable rules are listed in `skipped`."""
+        from .external_rules import load_trufflehog
+        rules, skipped = load_trufflehog(path)
+        return cls._guarded(rules, guard, skipped)
+
+    @classmethod
+    def from_compiled(cls, path: Path, lazy: bool = True, source: Path = None):
+        """Load a catalog written by `tools/compile_rules.py`.
+
+        No YAML is parsed and the fields are already normalized and
+        validated; with `lazy` each regex is only compiled when first used.
+        With `source`, the YAML the catalog was compiled from, a catalog
+        that no longer matches it raises `ValueError`.
+        """
+        with open(path, 'r', encoding='utf-8') as fh:
+            data = json.load(fh)
+        if data.get('format') != COMPILED_FORMAT:
+            raise ValueError(f'{path}: unsupported compiled catalog format {data.get("format")!r}')
+        if source is not None and data.get('source_sha256') != hashlib.sha256(Path(source).read_bytes()).hexdigest():
+            raise ValueError(f'{path} is out of date: {source} changed since it was compiled; '
+                             f're-run tools/compile_rules')
+        rules = []
+        for row in data['rules']:
+            row['analysis'] = tuple(row['analysis'])
+            rules.append(Rule(row, lazy=lazy))
         return cls(rules)
 
     @classmethod
-    def from_sqlite(cls, path: Path):
+    def from_sqlite(cls, path: Path, guard=True):
+        """Load a catalog DB written by `tools/init_rules_db.py`; see `regex_guard` for `guard`."""
         conn = sqlite3.connect(str(path))
         cur = conn.cursor()
         cur.execute('SELECT token_id, token_name, detection_category, regex_pattern, keywords_prefixes, minimum_entropy, token_length, default_severity, rule_status FROM rules')
@@ -95,10 +321,12 @@ class RuleSet:
         data = [dict(zip(cols, r)) for r in rows]
         conn.close()
         rules = [Rule(r) for r in data]
-        return cls(rules)
+        return cls._guarded(rules, guard)
 
-    def match_text(self, text: str):
-        findings = []
-        for r in self.rules:
-            findings.extend(r.matches(text))
-        return findings
+    def match_text(self, text: str, profiler=None, lines: LineIndex = None):
+        """Findings of every rule in `text`, located with `lines` (a `LineIndex` over `text`, built if omitted)."""
+        return annotate(self.index.match_text(text, profiler), lines or LineIndex(text))
+
+    def match_bytes(self, buf, profiler=None, lines: LineIndex = None):
+        """Match a bytes-like buffer (e.g. an mmap) without decoding it; offsets are in bytes."""
+        return annotate(self.index.match_text(buf, profiler), lines or LineIndex(buf))
@@ -1,19 +1,155 @@
 """A tiny scanning API that uses detectors to find potential secrets."""
+import codecs
+from functools import partial
 from . import detectors
+from .lines import LineIndex
+from .prefilter import MAX_WINDOW_WIDTH, analyze_pattern
 
+DEFAULT_STREAM_CHUNK = 1024 * 1024
 
-def scan_text(text: str):
-    """Run all detectors against `text` and return a list of finding dicts."""
+_PROFILE_NAMES = {
+    detectors.detect_aws_access_key: "aws-access-key",
+    detectors.detect_private_key: "private-key-block",
+    detectors.detect_high_entropy_strings: "high-entropy",
+    detectors.detect_keywords_context: "keyword-context",
+}
+
+_DETECTOR_PATTERNS = [detectors.AWS_ACCESS_KEY_RE, detectors.PRIVATE_KEY_BEGIN, detectors.GENERIC_SECRET_RE]
+
+
+def _run_detector(func, text: str, profiler=None, lines: LineIndex = None, keywords=None):
+    call = func
+    if lines is not None:
+        call = partial(call, lines=lines)
+    if keywords is not None and func is detectors.detect_keywords_context:
+        call = partial(call, keywords=keywords)
+    if profiler is None:
+        return call(text)
+    return profiler.run(_PROFILE_NAMES[func], call, text, pass_stats=func is detectors.detect_high_entropy_strings)
+
+
+def scan_text(text: str, profiler=None, keywords=None):
+    """Run all detectors against `text` and return a list of finding dicts.
+
+    Findings carry `lineno` and `column` from one `LineIndex` shared by the
+    detectors. `profiler` is an optional `profiling.Profiler` that times
+    each detector; `keywords` an optional `detectors.KeywordMatcher` for
+    the keyword detector (e.g. `RuleSet.keyword_matcher`).
+    """
     findings = []
+    lines = LineIndex(text)
     funcs = [detectors.detect_aws_access_key, detectors.detect_private_key, detectors.detect_high_entropy_strings, detectors.detect_keywords_context]
     for f in funcs:
-        for hit in f(text):
+        for hit in _run_detector(f, text, profiler, lines, keywords):
             findings.append(hit.to_dict())
     return findings
 
 
+def stream_overlap(ruleset=None) -> int:
+    """Longest possible match among the detectors and `ruleset`.
+
+    Unbounded patterns (e.g. `{20,}`) are capped at `MAX_WINDOW_WIDTH`.
+    """
+    patterns = [p.pattern for p in _DETECTOR_PATTERNS]
+    if ruleset is not None:
+        patterns.extend(r.regex_pattern for r in ruleset.rules)
+    widths = [analyze_pattern(p)[1] or MAX_WINDOW_WIDTH for p in patterns]
+    return max(widths)
+
+
+def _byte_len(text: str) -> int:
+    return len(text.encode("utf-8", "surrogateescape"))
+
+
+def scan_stream(fileobj, ruleset=None, chunk_size: int = DEFAULT_STREAM_CHUNK, overlap: int = None, profiler=None):
+    """Scan a file object chunk by chunk, yielding finding dicts as they are found.
+
+    Works with binary and text file objects. Each window is the unreported
+    tail of the previous one plus a new chunk; findings are only reported
+    when they start before the window's cutoff, which is placed on a line
+    boundary at least `overlap` characters before the end, so a token that
+    straddles two chunks is seen whole by the next window. Memory is bounded
+    by `chunk_size + overlap` plus the longest line.
+
+    Every finding carries an absolute `lineno` and `offset` (UTF-8 byte
+    offset; exact for binary input since undecodable bytes round-trip via
+    surrogateescape). Rule findings from `ruleset` are included as well.
+    With a `profiler`, every detector and rule is timed per window.
+    """
+    if overlap is None:
+        overlap = stream_overlap(ruleset)
+    decoder = codecs.getincrementaldecoder("utf-8")("surrogateescape")
+    carry = ""
+    line = 1
+    byte_offset = 0
+    seen_private_key = False
+    while True:
+        data = fileobj.read(chunk_size)
+        final = not data
+        text = decoder.decode(data, final=final) if isinstance(data, bytes) else data
+        buf = carry + text
+        if final:
+            cutoff = len(buf)
+        else:
+            limit = len(buf) - overlap
+            if limit <= 0:
+                carry = buf
+                continue
+            cutoff = buf.rfind("\n", 0, limit) + 1
+            if cutoff == 0:
+                if len(buf) < chunk_size + overlap:
+                    carry = buf
+                    continue
+                # a single very long line: give up on line alignment to bound memory
+                cutoff = limit
+        for f in _scan_window(buf, cutoff, ruleset, line, byte_offset, seen_private_key, profiler):
+            if f.get("detector") == "private-key-block":
+                seen_private_key = True
+            yield f
+        line += buf.count("\n", 0, cutoff)
+        byte_offset += _byte_len(buf[:cutoff])
+        carry = buf[cutoff:]
+        if final:
+            break
+
+
+def _scan_window(buf: str, cutoff: int, ruleset, line: int, byte_offset: int, seen_private_key: bool, profiler=None):
+    lines = LineIndex(buf)
+    # (char offset, byte offset) of the last located finding; each detector
+    # reports in text order, so byte offsets are computed incrementally
+    cursor = [0, byte_offset]
+
+    def locate(finding: dict, offset: int):
+        if offset < cursor[0]:
+            cursor[:] = [0, byte_offset]
+        cursor[1] += _byte_len(buf[cursor[0]:offset])
+        cursor[0] = offset
+        lineno, finding["column"] = lines.position(offset)
+        finding["lineno"] = line + lineno - 1
+        finding["offset"] = cursor[1]
+        return finding
+
+    funcs = [detectors.detect_aws_access_key, detectors.detect_high_entropy_strings]
+    if not seen_private_key:
+        funcs.insert(1, detectors.detect_private_key)
+    for func in funcs:
+        for hit in _run_detector(func, buf, profiler, lines):
+            if hit.offset < cutoff:
+                yield locate(hit.to_dict(), hit.offset)
+    keywords = ruleset.keyword_matcher if ruleset is not None else None
+    for hit in _run_detector(detectors.detect_keywords_context, buf[:cutoff], profiler, lines, keywords):
+        d = hit.to_dict()
+        d["lineno"] = line + hit.lineno - 1
+        yield d
+    if ruleset is not None:
+        for f in ruleset.match_text(buf, profiler, lines):
+            if f["offset"] < cutoff:
+                yield locate(f, f["offset"])
+
+
 if __name__ == "__main__":
     import sys
     path = sys.argv[1]
-    with open(path, "r", encoding="utf-8") as fh:
-        print(scan_text(fh.read()))
+    with open(path, "rb") as fh:
+        for finding in scan_stream(fh):
+            print(finding)
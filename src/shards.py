@@ -0,0 +1,372 @@
+"""Sharded scanning with mergeable partial results.
+
+A sweep is split in three steps that can run on different hosts sharing
+one output directory:
+
+- `plan_files` / `plan_blobs` list the target once (the files under a
+  directory, or the unique blobs of a git history) and write `plan.json`.
+  Each item belongs to shard `shard_of(key, count)`, a hash of its key, so
+  the assignment does not depend on the host, the order of the listing or
+  which shards have already run.
+- `run_shard` scans the items of one shard and writes
+  `shard-<index>.json` with the findings and per-matcher counters. The
+  file is written atomically and records the plan id and the catalog
+  fingerprint, so a shard whose partial result exists is not scanned again
+  and a failed or interrupted shard is simply rerun. `run_shards` runs the
+  pending shards locally in a process pool.
+- `merge_partials` checks that every shard is present and was produced by
+  the same plan and catalog, then combines the partials in plan order,
+  drops duplicate findings and sums the counters into a `ShardReport`.
+  With a labels file in the plan (see `tuning.load_labels`), the counters
+  include TP/FP/FN per rule and `ShardReport.operations` returns an
+  `operations.OperationsSet`.
+"""
+import datetime
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .cache import catalog_fingerprints
+from .history import iter_blob_refs, iter_blobs
+from .mmapscan import open_mmap, scan_buffer
+from .operations import OperationEntry, OperationsSet, recommend
+from .parallel import iter_files
+from .tuning import LabelIndex, evaluate_spans, load_labels
+
+PLAN_FILE = "plan.json"
+PLAN_VERSION = 1
+
+# per-process RuleSet, loaded once per plan by _load_ruleset
+_RULESETS = {}
+
+
+class ShardError(RuntimeError):
+    pass
+
+
+def shard_of(key: str, count: int) -> int:
+    """Shard of the item `key`: stable across runs, hosts and Python versions."""
+    digest = hashlib.sha1(key.encode("utf-8", "surrogateescape")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def _item_key(plan: dict, item) -> str:
+    # files are listed by relative path, blobs as {"oid": ..., "refs": [[commit, path], ...]}
+    return item if plan["kind"] == "files" else item["oid"]
+
+
+def _write_json(path: Path, data):
+    # readers never see a partially written file: a crash leaves only the temp file behind
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh)
+    os.replace(tmp, path)
+
+
+def _write_plan(out_dir: Path, plan: dict) -> dict:
+    if plan["count"] < 1:
+        raise ValueError("count must be at least 1")
+    body = json.dumps(plan, sort_keys=True).encode("utf-8")
+    plan = dict(plan, version=PLAN_VERSION, id=hashlib.sha256(body).hexdigest()[:16])
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    _write_json(out_dir / PLAN_FILE, plan)
+    return plan
+
+
+def plan_files(out_dir: Path, root: Path, count: int, exclude: Iterable[str] = (), rules_path: Optional[Path] = None,
+               labels_path: Optional[Path] = None) -> dict:
+    """Plan a sweep of the files under `root` (see `parallel.iter_files`) in `count` shards."""
+    root = Path(root).resolve()
+    items = [os.path.relpath(p, root).replace(os.sep, "/") for p in iter_files(root, exclude=exclude)]
+    return _write_plan(out_dir, {"kind": "files", "target": str(root), "count": count, "items": items,
+                                 "rules": str(Path(rules_path).resolve()) if rules_path else None,
+                                 "labels": str(Path(labels_path).resolve()) if labels_path else None})
+
+
+def plan_blobs(out_dir: Path, repo: Path, count: int, revs: Optional[List[str]] = None,
+               rules_path: Optional[Path] = None) -> dict:
+    """Plan a sweep of every blob introduced in the history of `repo` (see `history.scan_history`)."""
+    repo = Path(repo).resolve()
+    refs: Dict[str, list] = {}
+    for commit, path, oid in iter_blob_refs(repo, revs):
+        refs.setdefault(oid, []).append([commit, path])
+    items = [{"oid": oid, "refs": introduced} for oid, introduced in refs.items()]
+    return _write_plan(out_dir, {"kind": "blobs", "target": str(repo), "count": count, "items": items,
+                                 "rules": str(Path(rules_path).resolve()) if rules_path else None,
+                                 "labels": None})
+
+
+def load_plan(out_dir: Path) -> dict:
+    path = Path(out_dir) / PLAN_FILE
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            plan = json.load(fh)
+    except FileNotFoundError:
+        raise ShardError(f"no shard plan in {out_dir}") from None
+    if plan.get("version") != PLAN_VERSION:
+        raise ShardError(f"{path}: unsupported plan version {plan.get('version')}")
+    return plan
+
+
+def shard_path(out_dir: Path, index: int) -> Path:
+    return Path(out_dir) / f"shard-{index:05d}.json"
+
+
+def _load_ruleset(plan: dict):
+    if not plan["rules"]:
+        return None
+    if plan["id"] not in _RULESETS:
+        from .rules import RuleSet
+        _RULESETS[plan["id"]] = RuleSet.from_path(Path(plan["rules"]))
+    return _RULESETS[plan["id"]]
+
+
+def _catalog(ruleset) -> str:
+    fps = catalog_fingerprints(ruleset)
+    return hashlib.sha256(json.dumps(fps, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _read_partial(path: Path) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _matcher(f: dict) -> str:
+    return f.get("token_id") or f["detector"]
+
+
+def _count(counters: dict, findings: list, label_counts: Optional[dict]):
+    seen = set()
+    for f in findings:
+        c = counters.setdefault(_matcher(f), {"findings": 0, "items": 0})
+        c["findings"] += 1
+        if _matcher(f) not in seen:
+            seen.add(_matcher(f))
+            c["items"] += 1
+    for tid, (tp, fp, fn) in (label_counts or {}).items():
+        c = counters.setdefault(tid, {"findings": 0, "items": 0})
+        for key, value in (("tp", tp), ("fp", fp), ("fn", fn)):
+            c[key] = c.get(key, 0) + value
+
+
+def _scan_file(path: Path, ruleset, labels: Optional[list]):
+    with open_mmap(path) as buf:
+        findings = scan_buffer(buf, ruleset)
+        label_counts = None
+        if labels is not None and ruleset is not None:
+            spans = {r.token_id: [] for r in ruleset.rules}
+            for f in findings:
+                if "token_id" in f:
+                    spans[f["token_id"]].append((f["offset"], f["offset"] + len(f["match"].encode("utf-8"))))
+            label_counts = evaluate_spans(LabelIndex(buf, labels), spans)
+        return findings, len(buf), label_counts
+
+
+def run_shard(out_dir: Path, index: int, force: bool = False) -> bool:
+    """Scan shard `index` of the plan in `out_dir` and write its partial result.
+
+    Returns False without scanning when a partial result for the same plan
+    and catalog already exists, unless `force` is set.
+    """
+    plan = load_plan(out_dir)
+    if not 0 <= index < plan["count"]:
+        raise ShardError(f"shard {index} is out of range for a {plan['count']}-shard plan")
+    ruleset = _load_ruleset(plan)
+    catalog = _catalog(ruleset)
+    out = shard_path(out_dir, index)
+    done = _read_partial(out)
+    if not force and done is not None and done["plan"] == plan["id"] and done["catalog"] == catalog:
+        return False
+
+    start = time.perf_counter()
+    mine = [(i, item) for i, item in enumerate(plan["items"]) if shard_of(_item_key(plan, item), plan["count"]) == index]
+    results = []
+    counters: Dict[str, dict] = {}
+    nbytes = 0
+    errors = 0
+    if plan["kind"] == "files":
+        root = Path(plan["target"])
+        labels = None
+        if plan["labels"]:
+            wanted = {rel for _, rel in mine}
+            labels = {rel: spans for rel, spans in load_labels(Path(plan["labels"])) if rel in wanted}
+        for i, rel in mine:
+            path = root / rel
+            try:
+                # an unlabeled file is audited as holding no secrets
+                findings, size, label_counts = _scan_file(path, ruleset, None if labels is None else labels.get(rel, []))
+            except OSError:
+                errors += 1
+                continue
+            for f in findings:
+                f["path"] = str(path)
+            nbytes += size
+            _count(counters, findings, label_counts)
+            if findings:
+                results.append([i, findings])
+    else:
+        positions = {item["oid"]: (i, item) for i, item in mine}
+        for oid, data in iter_blobs(Path(plan["target"]), list(positions)):
+            i, item = positions.pop(oid)
+            findings = scan_buffer(data, ruleset)
+            nbytes += len(data)
+            _count(counters, findings, None)
+            attributed = [dict(f, commit=commit, path=path, blob=oid) for commit, path in item["refs"] for f in findings]
+            if attributed:
+                results.append([i, attributed])
+        # blobs git could not return
+        errors += len(positions)
+        results.sort(key=lambda r: r[0])
+
+    _write_json(out, {"plan": plan["id"], "catalog": catalog, "shard": index, "items": len(mine),
+                      "errors": errors, "bytes": nbytes, "seconds": time.perf_counter() - start,
+                      "counters": counters, "results": results})
+    return True
+
+
+def pending_shards(out_dir: Path) -> List[int]:
+    """Shards of the plan in `out_dir` without a partial result for that plan and the current catalog."""
+    plan = load_plan(out_dir)
+    catalog = _catalog(_load_ruleset(plan))
+    pending = []
+    for index in range(plan["count"]):
+        done = _read_partial(shard_path(out_dir, index))
+        if done is None or done["plan"] != plan["id"] or done["catalog"] != catalog:
+            pending.append(index)
+    return pending
+
+
+def run_shards(out_dir: Path, workers: Optional[int] = None, shards: Optional[Iterable[int]] = None) -> List[int]:
+    """Run `shards` (default: every pending shard) on this host, one per worker process.
+
+    Returns the shards that were scanned. A failing shard does not stop the
+    others; `ShardError` names the failed shards once the rest are done, and
+    calling `run_shards` again reruns only those.
+    """
+    indexes = sorted(shards) if shards is not None else pending_shards(out_dir)
+    ran = []
+    failed = {}
+    if workers == 1:
+        for index in indexes:
+            try:
+                if run_shard(out_dir, index):
+                    ran.append(index)
+            except Exception as exc:
+                failed[index] = exc
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            futures = {ex.submit(run_shard, str(out_dir), index): index for index in indexes}
+            for fut in as_completed(futures):
+                try:
+                    if fut.result():
+                        ran.append(futures[fut])
+                except Exception as exc:
+                    failed[futures[fut]] = exc
+    if failed:
+        detail = "; ".join(f"shard {i}: {exc}" for i, exc in sorted(failed.items()))
+        raise ShardError(f"{len(failed)} shard(s) failed: {detail}")
+    return sorted(ran)
+
+
+class ShardReport:
+    def __init__(self, plan: dict):
+        self.plan = plan["id"]
+        self.kind = plan["kind"]
+        self.labeled = bool(plan["labels"])
+        self.shards = plan["count"]
+        self.items = 0
+        self.errors = 0
+        self.bytes_scanned = 0
+        self.findings = 0
+        self.duplicates = 0
+        # summed worker time, not wall time
+        self.seconds = 0.0
+        # matcher -> {"findings", "items"[, "tp", "fp", "fn"]}
+        self.counters: Dict[str, dict] = {}
+
+    def to_dict(self):
+        return {"plan": self.plan, "kind": self.kind, "shards": self.shards, "items": self.items,
+                "errors": self.errors, "bytes_scanned": self.bytes_scanned, "findings": self.findings,
+                "duplicates": self.duplicates, "seconds": self.seconds, "counters": self.counters}
+
+    def operations(self, audit_date: Optional[str] = None) -> OperationsSet:
+        """TP/FP/FN per rule as an `OperationsSet`; the plan must have been made with labels."""
+        if not self.labeled:
+            raise ValueError("the plan has no labels file; TP/FP/FN are not known")
+        audit_date = audit_date or datetime.date.today().isoformat()
+        entries = []
+        for tid, c in sorted(self.counters.items()):
+            if "tp" not in c:
+                continue
+            entries.append(OperationEntry({
+                "detection_rule_id": tid,
+                "test_audit_sample_size": self.items - self.errors,
+                "true_positives": c["tp"],
+                "false_positives": c["fp"],
+                "false_negatives": c["fn"],
+                "last_audit_date": audit_date,
+                "tuning_recommendation": recommend(c["tp"], c["fp"], c["fn"]),
+            }))
+        return OperationsSet(entries)
+
+
+def _dedupe_key(f: dict):
+    value = f.get("match", f.get("snippet"))
+    return (f.get("commit"), f.get("path"), _matcher(f), f.get("offset"), value)
+
+
+def merge_partials(out_dir: Path):
+    """Combine every shard's partial result; returns `(findings, ShardReport)`.
+
+    Findings come out in plan order, so the result does not depend on the
+    shard count or on which host ran which shard. Raises `ShardError` if a
+    shard is missing or belongs to another plan or catalog.
+    """
+    plan = load_plan(out_dir)
+    report = ShardReport(plan)
+    partials = []
+    missing = []
+    for index in range(plan["count"]):
+        part = _read_partial(shard_path(out_dir, index))
+        if part is None or part["plan"] != plan["id"]:
+            missing.append(index)
+        else:
+            partials.append(part)
+    if missing:
+        raise ShardError(f"{len(missing)} shard(s) have no result for plan {plan['id']}: {missing}")
+    if len({p["catalog"] for p in partials}) > 1:
+        raise ShardError("shards were scanned with different rule catalogs; rerun the stale ones with force")
+
+    results = []
+    for part in partials:
+        report.items += part["items"]
+        report.errors += part["errors"]
+        report.bytes_scanned += part["bytes"]
+        report.seconds += part["seconds"]
+        for matcher, c in part["counters"].items():
+            total = report.counters.setdefault(matcher, {})
+            for key, value in c.items():
+                total[key] = total.get(key, 0) + value
+        results.extend(part["results"])
+    results.sort(key=lambda r: r[0])
+
+    findings = []
+    seen = set()
+    for _, item_findings in results:
+        for f in item_findings:
+            key = _dedupe_key(f)
+            if key in seen:
+                report.duplicates += 1
+                continue
+            seen.add(key)
+            findings.append(f)
+    report.findings = len(findings)
+    return findings, report
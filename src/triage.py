@@ -0,0 +1,282 @@
+"""Cheap pre-scan triage for directory scans.
+
+Before a file is read in full it is classified from its name, size and
+first block into one of three routes:
+
+- ``skip``: never scanned (binary extension, magic bytes, NUL byte, empty,
+  or ignored by a `.gitignore`);
+- ``known``: generated or machine-written content (lockfiles, minified
+  bundles, source maps, files marked "@generated"/"DO NOT EDIT", oversized
+  files) is scanned only by matchers whose level is ``known``: by default the
+  structured detectors and every catalog category except ``Generic``;
+- ``full``: everything else gets every detector and rule.
+
+The level of a matcher is looked up by rule `token_id` / detector name,
+then by `detection_category`, so noisy generic rules can be kept off
+generated files per category. `TriageStats` records files and bytes per
+route; bytes routed to ``skip`` or ``known`` are what triage saved.
+"""
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import yaml
+
+SKIP = "skip"
+KNOWN = "known"
+FULL = "full"
+
+HEAD_BYTES = 8192
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024
+
+SKIP_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp", ".tif", ".tiff", ".psd",
+    ".mp3", ".mp4", ".mov", ".avi", ".wav", ".flac", ".ogg", ".webm",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".jar", ".war", ".whl", ".egg",
+    ".exe", ".dll", ".so", ".dylib", ".o", ".a", ".class", ".pyc", ".pyo", ".wasm",
+    ".woff", ".woff2", ".ttf", ".otf", ".eot", ".pdf", ".sqlite", ".db",
+}
+# (magic prefix, label) for formats that are never worth scanning as text
+MAGIC = [
+    (b"\x89PNG\r\n\x1a\n", "png"), (b"GIF87a", "gif"), (b"GIF89a", "gif"), (b"\xff\xd8\xff", "jpeg"),
+    (b"%PDF-", "pdf"), (b"PK\x03\x04", "zip"), (b"\x1f\x8b", "gzip"), (b"\x7fELF", "elf"),
+    (b"\xcf\xfa\xed\xfe", "mach-o"), (b"\xfe\xed\xfa\xcf", "mach-o"),
+    (b"\0asm", "wasm"), (b"SQLite format 3\0", "sqlite"), (b"\xfd7zXZ\0", "xz"),
+]
+GENERATED_NAMES = {
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "Pipfile.lock",
+    "Cargo.lock", "Gemfile.lock", "composer.lock", "go.sum", "mix.lock", "pubspec.lock", "packages.lock.json",
+}
+GENERATED_SUFFIXES = (".min.js", ".min.css", ".js.map", ".css.map", ".map", ".pb.go", "_pb2.py", ".g.dart",
+                      ".designer.cs", ".snap")
+GENERATED_MARKERS = (b"@generated", b"DO NOT EDIT", b"Code generated by", b"autogenerated", b"auto-generated")
+# a first block this long without a newline is treated as minified
+MINIFIED_LINE = 4096
+
+# matcher levels: KNOWN runs on known-format and full files, FULL only on full files
+DEFAULT_LEVELS = {"Generic": FULL, "high-entropy": FULL, "keyword-context": FULL}
+
+
+class TriageConfig:
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, oversize: str = KNOWN,
+                 skip_extensions: Iterable[str] = SKIP_EXTENSIONS, generated_names: Iterable[str] = GENERATED_NAMES,
+                 generated_suffixes: Iterable[str] = GENERATED_SUFFIXES,
+                 generated_markers: Iterable[bytes] = GENERATED_MARKERS, levels: Optional[Dict[str, str]] = None,
+                 default_level: str = KNOWN, gitignore: bool = True):
+        self.max_size = max_size
+        self.oversize = oversize
+        self.skip_extensions = {e.lower() for e in skip_extensions}
+        self.generated_names = set(generated_names)
+        self.generated_suffixes = tuple(generated_suffixes)
+        self.generated_markers = tuple(m.encode() if isinstance(m, str) else m for m in generated_markers)
+        self.levels = dict(DEFAULT_LEVELS if levels is None else levels)
+        self.default_level = default_level
+        self.gitignore = gitignore
+        for level in list(self.levels.values()) + [default_level, oversize]:
+            if level not in (SKIP, KNOWN, FULL):
+                raise ValueError(f"unknown triage level {level!r}")
+
+    @classmethod
+    def from_yaml(cls, path: Path):
+        """Load overrides from YAML; `levels` is merged over the defaults."""
+        with open(path, "r", encoding="utf-8") as fh:
+            data = yaml.safe_load(fh) or {}
+        levels = dict(DEFAULT_LEVELS)
+        levels.update(data.pop("levels", None) or {})
+        return cls(levels=levels, **data)
+
+    def level(self, token_id: str, category: Optional[str] = None) -> str:
+        if token_id in self.levels:
+            return self.levels[token_id]
+        return self.levels.get(category, self.default_level)
+
+    def runs_on(self, token_id: str, category: Optional[str], route: str) -> bool:
+        """Whether a matcher runs on a file triaged to `route`."""
+        level = self.level(token_id, category)
+        return route == FULL and level != SKIP or route == KNOWN and level == KNOWN
+
+    def to_dict(self):
+        return {"max_size": self.max_size, "oversize": self.oversize, "levels": self.levels,
+                "default_level": self.default_level, "gitignore": self.gitignore}
+
+
+def route_plan(config: TriageConfig, ruleset, route: str):
+    """`(detector names, RuleSet or None)` of the matchers that run on files routed to `route`."""
+    from .mmapscan import DETECTOR_NAMES
+    from .rules import RuleSet
+    names = frozenset(n for n in DETECTOR_NAMES if config.runs_on(n, None, route))
+    if ruleset is None:
+        return names, None
+    return names, RuleSet([r for r in ruleset.rules if config.runs_on(r.token_id, r.detection_category, route)])
+
+
+def classify(name: str, size: int, head: bytes, config: TriageConfig) -> Tuple[str, str]:
+    """Return `(route, reason)` for a file from its name, size and first block."""
+    lower = name.lower()
+    if size == 0:
+        return SKIP, "empty"
+    if os.path.splitext(lower)[1] in config.skip_extensions:
+        return SKIP, "extension"
+    for magic, label in MAGIC:
+        if head.startswith(magic):
+            return SKIP, f"magic:{label}"
+    if b"\0" in head:
+        return SKIP, "binary"
+    if size > config.max_size:
+        return config.oversize, "size"
+    if name in config.generated_names or lower.endswith(config.generated_suffixes):
+        return KNOWN, "generated-name"
+    if any(m in head for m in config.generated_markers):
+        return KNOWN, "generated-marker"
+    if len(head) >= MINIFIED_LINE and b"\n" not in head[:MINIFIED_LINE]:
+        return KNOWN, "minified"
+    return FULL, "text"
+
+
+def classify_path(path: Path, config: TriageConfig) -> Tuple[str, str, int]:
+    """Classify a file on disk; returns `(route, reason, size)`."""
+    size = path.stat().st_size
+    head = b""
+    if size and os.path.splitext(path.name.lower())[1] not in config.skip_extensions:
+        with open(path, "rb") as fh:
+            head = fh.read(HEAD_BYTES)
+    route, reason = classify(path.name, size, head, config)
+    return route, reason, size
+
+
+class TriageStats:
+    def __init__(self):
+        self.files = {SKIP: 0, KNOWN: 0, FULL: 0}
+        self.bytes = {SKIP: 0, KNOWN: 0, FULL: 0}
+        self.reasons: Dict[str, int] = {}
+
+    def add(self, route: str, reason: str, size: int):
+        self.files[route] += 1
+        self.bytes[route] += size
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def merge(self, other: dict):
+        for route in self.files:
+            self.files[route] += other["files"][route]
+            self.bytes[route] += other["bytes"][route]
+        for reason, n in other["reasons"].items():
+            self.reasons[reason] = self.reasons.get(reason, 0) + n
+
+    @property
+    def bytes_saved(self):
+        """Bytes kept away from the full detector/rule set."""
+        return self.bytes[SKIP] + self.bytes[KNOWN]
+
+    def to_dict(self):
+        return {"files": dict(self.files), "bytes": dict(self.bytes), "reasons": dict(self.reasons),
+                "bytes_saved": self.bytes_saved}
+
+
+def _translate(pattern: str) -> str:
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("/.*")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        elif c == "\\" and i + 1 < len(pattern):
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class GitIgnore:
+    """`.gitignore` matching for files under `root`, including nested `.gitignore`s.
+
+    Supports negation, directory-only patterns, anchoring and `**`. Paths are
+    relative to `root`, with `/` separators.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        # directory (relative, "" for root) -> [(regex, negate, dir_only)]
+        self._rules: Dict[str, List[Tuple[re.Pattern, bool, bool]]] = {}
+        self._dirs: Dict[str, bool] = {}
+
+    def _load(self, rel_dir: str):
+        rules = self._rules.get(rel_dir)
+        if rules is not None:
+            return rules
+        rules = []
+        try:
+            with open(self.root / rel_dir / ".gitignore", "r", encoding="utf-8", errors="replace") as fh:
+                lines = fh.read().splitlines()
+        except OSError:
+            lines = []
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            body = _translate(line.lstrip("/"))
+            regex = re.compile(("" if anchored else "(?:.*/)?") + body + "$")
+            rules.append((regex, negate, dir_only))
+        self._rules[rel_dir] = rules
+        return rules
+
+    def _match(self, parts: List[str], is_dir: bool) -> bool:
+        result = False
+        # deeper .gitignore files are consulted last and take precedence
+        for base in range(len(parts)):
+            sub = "/".join(parts[base:])
+            for regex, negate, dir_only in self._load("/".join(parts[:base])):
+                if (is_dir or not dir_only) and regex.match(sub):
+                    result = not negate
+        return result
+
+    def _dir_ignored(self, rel_dir: str) -> bool:
+        cached = self._dirs.get(rel_dir)
+        if cached is None:
+            parts = rel_dir.split("/")
+            cached = (len(parts) > 1 and self._dir_ignored("/".join(parts[:-1]))) or self._match(parts, True)
+            self._dirs[rel_dir] = cached
+        return cached
+
+    def ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """Whether `rel_path` is ignored; a file in an ignored directory cannot be re-included."""
+        if is_dir:
+            return self._dir_ignored(rel_path)
+        parts = rel_path.split("/")
+        if len(parts) > 1 and self._dir_ignored("/".join(parts[:-1])):
+            return True
+        return self._match(parts, False)
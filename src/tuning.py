@@ -0,0 +1,508 @@
+"""Evaluate every rule of a catalog against a labeled corpus.
+
+Labels map a file (relative to the corpus root) to the secrets it contains,
+either as strings, which are located by searching the file (strings that
+do not occur are ignored), or as
+`{"offset": ..., "end": ...}` byte spans; a label may carry a `token_id` to
+count only for that rule. `ground_truth.json` from `tools.synth_corpus` is
+a valid labels file, and `.jsonl` files with one
+`{"path": ..., "secrets": [...]}` object per line are read as a stream.
+
+A finding is a true positive when its span overlaps a label. Labels are
+kept sorted with a running maximum of their ends, so each finding is
+matched with a bisect instead of a comparison against every label. Files
+are evaluated in worker processes and the per-rule TP/FP/FN counts of each
+chunk are summed in the parent.
+
+With a `cache_path`, the spans each rule reported are stored per file
+content hash and rule fingerprint (see `cache.FindingsCache`), so after
+editing one rule only that rule is re-run. The result is an
+`operations.OperationsSet`; `OperationsSet.to_sqlite` stores it in one
+transaction.
+
+Threshold sweeps collect every regex candidate of each rule with its
+entropy, length and label once (`collect_candidates`), then compute the
+counts of all `minimum_entropy` / `token_length` combinations from that
+table (`sweep`) and suggest the combination that reaches a target precision
+with the best recall (`sweep_operations`).
+"""
+import datetime
+import hashlib
+import json
+import math
+import time
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .cache import DEFAULT_MAX_ENTRIES, FindingsCache
+from .entropy import batch_entropy
+from .mmapscan import match_buffer, open_mmap
+from .operations import OperationEntry, OperationsSet, recommend
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+DEFAULT_CHUNK_SIZE = 256
+
+# worker state, set by _init_worker
+_RULESET = None
+_CACHE = None
+_FINGERPRINTS = None
+
+
+def load_labels(path: Path) -> Iterator[Tuple[str, list]]:
+    """Yield `(relative path, labels)` from a `.json` mapping or a `.jsonl` stream."""
+    path = Path(path)
+    with open(path, 'r', encoding='utf-8') as fh:
+        if path.suffix == '.jsonl':
+            for line in fh:
+                if line.strip():
+                    row = json.loads(line)
+                    yield row['path'], row.get('secrets') or []
+        else:
+            for rel, labels in json.load(fh).items():
+                yield rel, labels or []
+
+
+class LabelIndex:
+    """Labeled spans of one file, indexed for overlap queries."""
+
+    def __init__(self, buf, labels: list):
+        spans = []
+        for label in labels:
+            if isinstance(label, str):
+                needle = label.encode('utf-8')
+                pos = buf.find(needle) if needle else -1
+                while pos != -1:
+                    spans.append((pos, pos + len(needle), None))
+                    pos = buf.find(needle, pos + 1)
+            else:
+                spans.append((label['offset'], label['end'], label.get('token_id')))
+        spans.sort()
+        self.spans = spans
+        self.starts = [s for s, _, _ in spans]
+        # max_end[i] is the largest end among spans[:i + 1]; it bounds the backwards walk in `overlapping`
+        self.max_end = []
+        high = -1
+        for _, end, _ in spans:
+            high = max(high, end)
+            self.max_end.append(high)
+
+    def overlapping(self, offset: int, end: int) -> List[int]:
+        """Indexes of the labels that overlap the byte span `[offset, end)`."""
+        hits = []
+        i = bisect_left(self.starts, max(end, offset + 1)) - 1
+        while i >= 0 and self.max_end[i] > offset:
+            if self.spans[i][1] > offset:
+                hits.append(i)
+            i -= 1
+        return hits
+
+    def applicable(self, token_id: str) -> List[int]:
+        return [i for i, (_, _, tid) in enumerate(self.spans) if tid is None or tid == token_id]
+
+
+def evaluate_spans(index: LabelIndex, spans_by_rule: Dict[str, list]) -> Dict[str, List[int]]:
+    """Return `{token_id: [tp, fp, fn]}` for the `(offset, end)` spans each rule reported."""
+    counts = {}
+    for tid, spans in spans_by_rule.items():
+        applicable = set(index.applicable(tid))
+        found = set()
+        fp = 0
+        for offset, end in spans:
+            hits = index.overlapping(offset, end)
+            if not hits:
+                fp += 1
+            found.update(hits)
+        tp = len(found & applicable)
+        counts[tid] = [tp, fp, len(applicable) - tp]
+    return counts
+
+
+def rule_spans(buf, ruleset, rules=None) -> Dict[str, list]:
+    """`{token_id: [(offset, end), ...]}` for `rules` (default: all of `ruleset`) over `buf`."""
+    spans = {r.token_id: [] for r in (rules if rules is not None else ruleset.rules)}
+    for f in match_buffer(buf, ruleset, rules):
+        spans[f['token_id']].append((f['offset'], f['offset'] + len(f['match'].encode('utf-8'))))
+    return spans
+
+
+def _init_worker(rules_path: str, cache_path: Optional[str] = None, rule_ids=None):
+    global _RULESET, _CACHE, _FINGERPRINTS
+    from .rules import RuleSet
+    _RULESET = RuleSet.from_path(Path(rules_path))
+    if rule_ids is not None:
+        _RULESET = RuleSet([r for r in _RULESET.rules if r.token_id in rule_ids])
+    _FINGERPRINTS = {r.token_id: r.fingerprint for r in _RULESET.rules}
+    # workers only read; new entries are written by the parent process
+    _CACHE = FindingsCache(Path(cache_path), readonly=True) if cache_path else None
+
+
+def _evaluate_file(path: Path, labels: list):
+    with open_mmap(path) as buf:
+        index = LabelIndex(buf, labels)
+        if _CACHE is None:
+            return evaluate_spans(index, rule_spans(buf, _RULESET)), len(buf), None, [], 0
+        content_hash = hashlib.sha256(buf).hexdigest()
+        spans = {tid: [tuple(s) for s in found] for tid, found in _CACHE.lookup(content_hash, _FINGERPRINTS).items()}
+        stale = [r for r in _RULESET.rules if r.token_id not in spans]
+        new_rows = []
+        if stale:
+            # a cold file goes through the prefiltered RuleSet; a few edited rules run on their own
+            fresh = rule_spans(buf, _RULESET, None if len(stale) == len(_RULESET.rules) else stale)
+            for tid, found in fresh.items():
+                spans[tid] = found
+                new_rows.append((content_hash, tid, _FINGERPRINTS[tid], found))
+        return evaluate_spans(index, spans), len(buf), content_hash, new_rows, len(stale)
+
+
+def _evaluate_chunk(items: List[Tuple[str, list]]):
+    """Evaluate one work unit; returns summed counts plus what the parent needs for stats and the cache."""
+    totals: Dict[str, List[int]] = {r.token_id: [0, 0, 0] for r in _RULESET.rules}
+    nbytes = 0
+    rows = []
+    used = []
+    reruns = 0
+    files = 0
+    for p, labels in items:
+        try:
+            counts, size, content_hash, new_rows, stale = _evaluate_file(Path(p), labels)
+        except OSError:
+            continue
+        for tid, (tp, fp, fn) in counts.items():
+            total = totals[tid]
+            total[0] += tp
+            total[1] += fp
+            total[2] += fn
+        files += 1
+        nbytes += size
+        rows.extend(new_rows)
+        reruns += stale
+        if content_hash is not None:
+            used.append(content_hash)
+    return totals, files, nbytes, rows, used, reruns
+
+
+def _chunks(items: Iterable, size: int):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class TuneStats:
+    def __init__(self):
+        self.files = 0
+        self.bytes_scanned = 0
+        self.rule_runs = 0
+        self.cached_runs = 0
+        self.seconds = 0.0
+
+    def to_dict(self):
+        return {'files': self.files, 'bytes_scanned': self.bytes_scanned, 'rule_runs': self.rule_runs,
+                'cached_runs': self.cached_runs, 'seconds': self.seconds}
+
+
+def evaluate_corpus(corpus: Path, labels, rules_path: Path, workers: Optional[int] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE, cache_path: Optional[Path] = None,
+                    cache_max_entries: int = DEFAULT_MAX_ENTRIES, rule_ids: Optional[Iterable[str]] = None,
+                    audit_date: Optional[str] = None):
+    """Evaluate the rules of `rules_path` on `corpus`; returns `(OperationsSet, TuneStats)`.
+
+    `labels` is an iterable of `(relative path, labels)` (see `load_labels`)
+    and is consumed lazily. `rule_ids` restricts the evaluation to those
+    rules. `workers=1` runs in-process. `test_audit_sample_size` is the
+    number of labeled files evaluated.
+    """
+    start = time.perf_counter()
+    corpus = Path(corpus)
+    rule_ids = frozenset(rule_ids) if rule_ids is not None else None
+    init_args = (str(rules_path), str(cache_path) if cache_path else None, rule_ids)
+    items = ((str(corpus / rel), spans) for rel, spans in labels)
+    stats = TuneStats()
+    totals: Dict[str, List[int]] = {}
+    cache = FindingsCache(Path(cache_path), max_entries=cache_max_entries) if cache_path else None
+
+    def merge(result):
+        counts, files, nbytes, rows, used, reruns = result
+        for tid, (tp, fp, fn) in counts.items():
+            total = totals.setdefault(tid, [0, 0, 0])
+            total[0] += tp
+            total[1] += fp
+            total[2] += fn
+        stats.files += files
+        stats.bytes_scanned += nbytes
+        stats.rule_runs += reruns if cache is not None else files * len(counts)
+        stats.cached_runs += files * len(counts) - reruns if cache is not None else 0
+        if cache is not None:
+            cache.store(rows, used)
+
+    try:
+        if workers == 1:
+            _init_worker(*init_args)
+            for chunk in _chunks(items, max(1, chunk_size)):
+                merge(_evaluate_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as ex:
+                for result in ex.map(_evaluate_chunk, _chunks(items, max(1, chunk_size))):
+                    merge(result)
+    finally:
+        if cache is not None:
+            cache.evict()
+            cache.close()
+
+    audit_date = audit_date or datetime.date.today().isoformat()
+    entries = []
+    for tid, (tp, fp, fn) in totals.items():
+        entries.append(OperationEntry({
+            'detection_rule_id': tid,
+            'test_audit_sample_size': stats.files,
+            'true_positives': tp,
+            'false_positives': fp,
+            'false_negatives': fn,
+            'last_audit_date': audit_date,
+            'tuning_recommendation': recommend(tp, fp, fn),
+        }))
+    stats.seconds = time.perf_counter() - start
+    return OperationsSet(entries), stats
+
+
+# --- threshold sweeps ---------------------------------------------------------
+
+# entropy thresholds tried by default, in addition to each rule's own
+DEFAULT_ENTROPIES = [i / 4 for i in range(25)]
+# at most this many single-length windows are tried per rule
+MAX_LENGTH_WINDOWS = 16
+# label of a candidate that only overlaps labels scoped to another rule: neither TP nor FP
+OTHER_RULE = '-'
+
+
+class CandidateTable:
+    """Every regex candidate of every rule on a labeled corpus, before length and entropy filtering.
+
+    Per rule, the columns `entropy`, `length` and `label` hold one value per
+    candidate that passed the keyword check; `label` is the key of the
+    applicable label it overlaps, `OTHER_RULE`, or None for a false
+    positive. `labels` counts the labels that apply to the rule and
+    `current` is its `(minimum_entropy, length_min, length_max)`.
+    """
+
+    def __init__(self, rules: Optional[Dict[str, dict]] = None, files: int = 0):
+        self.rules = rules if rules is not None else {}
+        self.files = files
+
+    def _rule(self, rule) -> dict:
+        entry = self.rules.get(rule.token_id)
+        if entry is None:
+            entry = self.rules[rule.token_id] = {
+                'entropy': [], 'length': [], 'label': [], 'labels': 0,
+                'current': [rule.minimum_entropy, rule.length_min, rule.length_max],
+            }
+        return entry
+
+    def merge(self, other: 'CandidateTable'):
+        self.files += other.files
+        for tid, cols in other.rules.items():
+            entry = self.rules.setdefault(tid, {'entropy': [], 'length': [], 'label': [], 'labels': 0,
+                                                'current': cols['current']})
+            for key in ('entropy', 'length', 'label'):
+                entry[key].extend(cols[key])
+            entry['labels'] += cols['labels']
+
+    def save(self, path: Path):
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump({'files': self.files, 'rules': self.rules}, fh)
+
+    @classmethod
+    def load(cls, path: Path):
+        with open(path, 'r', encoding='utf-8') as fh:
+            data = json.load(fh)
+        return cls(data['rules'], data['files'])
+
+
+def _collect_file(table: CandidateTable, ordinal: int, path: Path, labels: list):
+    with open_mmap(path) as buf:
+        index = LabelIndex(buf, labels)
+        for rule in _RULESET.rules:
+            entry = table._rule(rule)
+            applicable = set(index.applicable(rule.token_id))
+            entry['labels'] += len(applicable)
+            candidates = [(val, offset) for val, offset in rule.candidates_bytes(buf) if rule.keyword_ok(val)]
+            for (val, offset), ent in zip(candidates, batch_entropy([val for val, _ in candidates])):
+                hits = index.overlapping(offset, offset + len(val.encode('utf-8')))
+                own = [i for i in hits if i in applicable]
+                entry['entropy'].append(ent)
+                entry['length'].append(len(val))
+                entry['label'].append(f'{ordinal}:{own[0]}' if own else OTHER_RULE if hits else None)
+
+
+def _collect_chunk(items: List[Tuple[int, str, list]]) -> CandidateTable:
+    table = CandidateTable()
+    for ordinal, p, labels in items:
+        try:
+            _collect_file(table, ordinal, Path(p), labels)
+        except OSError:
+            continue
+        table.files += 1
+    return table
+
+
+def collect_candidates(corpus: Path, labels, rules_path: Path, workers: Optional[int] = None,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE, rule_ids: Optional[Iterable[str]] = None):
+    """Scan `corpus` once per rule and return the `CandidateTable` for `sweep`."""
+    corpus = Path(corpus)
+    rule_ids = frozenset(rule_ids) if rule_ids is not None else None
+    init_args = (str(rules_path), None, rule_ids)
+    items = ((n, str(corpus / rel), spans) for n, (rel, spans) in enumerate(labels))
+    table = CandidateTable()
+    if workers == 1:
+        _init_worker(*init_args)
+        for chunk in _chunks(items, max(1, chunk_size)):
+            table.merge(_collect_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as ex:
+            for part in ex.map(_collect_chunk, _chunks(items, max(1, chunk_size))):
+                table.merge(part)
+    return table
+
+
+class SweepPoint:
+    """TP/FP/FN of one rule at one `(minimum_entropy, length_min, length_max)` combination."""
+    __slots__ = ('token_id', 'minimum_entropy', 'length_min', 'length_max', 'tp', 'fp', 'fn')
+
+    def __init__(self, token_id, minimum_entropy, length_min, length_max, tp, fp, fn):
+        self.token_id = token_id
+        self.minimum_entropy = minimum_entropy
+        self.length_min = length_min
+        self.length_max = length_max
+        self.tp = tp
+        self.fp = fp
+        self.fn = fn
+
+    @property
+    def precision(self):
+        return self.tp / (self.tp + self.fp) if self.tp + self.fp else None
+
+    @property
+    def recall(self):
+        return self.tp / (self.tp + self.fn) if self.tp + self.fn else None
+
+    @property
+    def token_length(self):
+        """The `token_length` value of rules.yaml for this length window."""
+        if self.length_min is None:
+            return None
+        if self.length_min == self.length_max:
+            return self.length_min
+        return f'{self.length_min}-{self.length_max}'
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+def _count_at_least(ordered: list, thresholds: List[float]) -> List[int]:
+    """For each threshold, how many values of the sorted `ordered` are >= it."""
+    if np is not None:
+        return (len(ordered) - np.searchsorted(np.asarray(ordered, dtype=np.float64), thresholds, 'left')).tolist()
+    return [len(ordered) - bisect_left(ordered, t) for t in thresholds]
+
+
+def _length_windows(cols: dict):
+    _, cur_min, cur_max = cols['current']
+    labeled = sorted({n for n, label in zip(cols['length'], cols['label']) if label not in (None, OTHER_RULE)})
+    windows = [(None, None), (cur_min, cur_max)]
+    if labeled:
+        windows.append((labeled[0], labeled[-1]))
+        windows.extend((n, n) for n in labeled[:MAX_LENGTH_WINDOWS])
+    return list(dict.fromkeys(w for w in windows if (w[0] is None) == (w[1] is None)))
+
+
+def sweep(table: CandidateTable, token_id: str, entropies: Optional[Iterable[float]] = None,
+          lengths: Optional[Iterable[Tuple[Optional[int], Optional[int]]]] = None) -> List[SweepPoint]:
+    """Precision/recall of `token_id` at every entropy threshold and length window, without rescanning.
+
+    Per length window, the best entropy of every label and the entropies of
+    the unlabeled candidates are sorted once; the TP and FP counts of all
+    entropy thresholds then come from one sorted search (vectorized with
+    NumPy when installed). `lengths` are `(length_min, length_max)` pairs,
+    `(None, None)` meaning no length check; the defaults try the rule's own
+    values, `DEFAULT_ENTROPIES` and the lengths of the labeled candidates.
+    """
+    cols = table.rules[token_id]
+    cur_entropy = cols['current'][0]
+    entropies = sorted(set(DEFAULT_ENTROPIES if entropies is None else entropies) | {cur_entropy})
+    points = []
+    for lmin, lmax in (_length_windows(cols) if lengths is None else lengths):
+        best: Dict[str, float] = {}
+        false = []
+        for ent, n, label in zip(cols['entropy'], cols['length'], cols['label']):
+            if lmin is not None and not lmin <= n <= lmax:
+                continue
+            if label is None:
+                false.append(ent)
+            elif label != OTHER_RULE and ent > best.get(label, -1.0):
+                best[label] = ent
+        found = sorted(best.values())
+        false.sort()
+        for e, tp, fp in zip(entropies, _count_at_least(found, entropies), _count_at_least(false, entropies)):
+            points.append(SweepPoint(token_id, e, lmin, lmax, tp, fp, cols['labels'] - tp))
+    return points
+
+
+def suggest(points: List[SweepPoint], target_precision: float) -> Optional[SweepPoint]:
+    """The point with the best recall among those reaching `target_precision`, or None.
+
+    Ties prefer higher precision, then the narrower length window, then the
+    stricter entropy threshold.
+    """
+    eligible = [p for p in points if p.precision is not None and p.precision >= target_precision]
+    if not eligible:
+        return None
+
+    def key(p):
+        width = math.inf if p.length_min is None else p.length_max - p.length_min
+        return p.recall or 0.0, p.precision, -width, p.minimum_entropy
+    return max(eligible, key=key)
+
+
+def sweep_operations(table: CandidateTable, target_precision: float = 0.9, audit_date: Optional[str] = None,
+                     entropies: Optional[Iterable[float]] = None):
+    """Sweep every rule of `table`; returns `(OperationsSet, {token_id: suggested SweepPoint or None})`.
+
+    Each entry records the counts at the suggested thresholds, or at the
+    rule's current ones when no combination reaches `target_precision`.
+    """
+    audit_date = audit_date or datetime.date.today().isoformat()
+    entries = []
+    suggestions = {}
+    for tid, cols in table.rules.items():
+        points = sweep(table, tid, entropies)
+        best = suggest(points, target_precision)
+        suggestions[tid] = best
+        if best is not None:
+            point = best
+            length = 'no token_length' if best.token_length is None else f'token_length={best.token_length}'
+            text = (f'Set minimum_entropy={best.minimum_entropy:g}, {length} for precision {best.precision:.2f} at recall {best.recall or 0.0:.2f}.')
+        else:
+            cur_entropy, cur_min, cur_max = cols['current']
+            point = sweep(table, tid, [cur_entropy], [(cur_min, cur_max)])[0]
+            text = (f'No entropy/length thresholds reach precision {target_precision:.2f}; '
+                    f'{recommend(point.tp, point.fp, point.fn)}')
+        entries.append(OperationEntry({
+            'detection_rule_id': tid,
+            'test_audit_sample_size': table.files,
+            'true_positives': point.tp,
+            'false_positives': point.fp,
+            'false_negatives': point.fn,
+            'last_audit_date': audit_date,
+            'tuning_recommendation': text,
+        }))
+    return OperationsSet(entries), suggestions
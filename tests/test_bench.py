@@ -0,0 +1,31 @@
+import json
+from src.rules import RuleSet
+from tools.bench_scan import compare, load_corpus, run
+from tools.synth_corpus import generate_corpus
+
+
+def test_corpus_is_deterministic_and_labeled(tmp_path):
+    a = generate_corpus(tmp_path / 'a', seed=3, files_per_kind=2, sizes=[256, 2048])
+    b = generate_corpus(tmp_path / 'b', seed=3, files_per_kind=2, sizes=[256, 2048])
+    assert a == b
+    for rel, secrets in a.items():
+        assert (tmp_path / 'a' / rel).read_bytes() == (tmp_path / 'b' / rel).read_bytes()
+        text = (tmp_path / 'a' / rel).read_text()
+        assert all(s in text for s in secrets)
+    assert sum(len(v) for v in a.values()) > 0
+
+
+def test_run_and_compare(tmp_path, repo_root):
+    generate_corpus(tmp_path, seed=1, files_per_kind=1, sizes=[1024])
+    rs = RuleSet.from_yaml(repo_root / 'rules' / 'rules.yaml')
+    results = run(load_corpus(tmp_path), rs, repeat=1)
+    json.dumps(results)
+    assert set(results['detectors']) == {'aws-access-key', 'private-key-block', 'high-entropy', 'keyword-context'}
+    assert set(results['rules']) == {'AWS-001', 'GENERIC-BASE64-01'}
+    assert results['memory']['peak_bytes'] > 0
+    mem = results['finding_memory']
+    assert mem['findings'] > 0 and 0 < mem['store_bytes_per_finding'] < mem['dict_bytes_per_finding']
+    assert compare(results, results, 0.2) == []
+    slower = json.loads(json.dumps(results))
+    slower['rules']['AWS-001']['mb_per_sec'] *= 2
+    assert any('rules/AWS-001' in r for r in compare(results, slower, 0.2))
@@ -0,0 +1,46 @@
+import yaml
+from src.cache import FindingsCache
+from src.parallel import scan_directory
+
+
+def _catalog(repo_root, tmp_path, entropy=None):
+    rules = yaml.safe_load((repo_root / 'rules' / 'rules.yaml').read_text())
+    if entropy is not None:
+        rules[0]['minimum_entropy'] = entropy
+    out = tmp_path / 'rules.yaml'
+    out.write_text(yaml.safe_dump(rules))
+    return out
+
+
+def test_rescan_hits_cache_and_rule_edit_invalidates_only_that_rule(repo_root, tmp_path):
+    tree = tmp_path / 'tree'
+    tree.mkdir()
+    (tree / 'a.py').write_text('aws_key = "AKIAEXAMPLEKEY123456"\n')
+    (tree / 'b.py').write_text('print("hello")\n')
+    cache = tmp_path / 'cache.db'
+    rules = _catalog(repo_root, tmp_path)
+
+    first, stats = scan_directory(tree, rules_path=rules, workers=1, cache_path=cache)
+    assert (stats.cache.hits, stats.cache.misses) == (0, 2)
+    second, stats = scan_directory(tree, rules_path=rules, workers=1, cache_path=cache)
+    assert (stats.cache.hits, stats.cache.misses) == (2, 0)
+    assert second == first
+    uncached, _ = scan_directory(tree, rules_path=rules, workers=1)
+    assert uncached == first
+
+    rules = _catalog(repo_root, tmp_path, entropy=4.5)
+    third, stats = scan_directory(tree, rules_path=rules, workers=1, cache_path=cache)
+    # only AWS-001 is re-run, once per file
+    assert stats.cache.misses == 2 and stats.cache.stale_matchers == 2
+    assert not any(f.get('token_id') == 'AWS-001' for f in third)
+
+
+def test_lru_eviction(tmp_path):
+    cache = FindingsCache(tmp_path / 'cache.db', max_entries=2)
+    for h in ['a', 'b', 'c']:
+        cache.store([(h, '<detectors>', 'fp', [])])
+    cache.store([], used=['a'])
+    assert cache.evict() == 1
+    assert cache.lookup('b', {'<detectors>': 'fp'}) == {}
+    assert cache.lookup('a', {'<detectors>': 'fp'}) == {'<detectors>': []}
+    cache.close()
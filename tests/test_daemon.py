@@ -0,0 +1,180 @@
+import asyncio
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from src.cli import main
+from src.daemon import DaemonClient, DaemonError, ScanService
+
+pytestmark = pytest.mark.skipif(not hasattr(asyncio, 'start_unix_server'), reason='needs Unix sockets')
+
+RULE = '''- token_id: "TEST-{n}"
+  token_name: "Test token {n}"
+  regex_pattern: 'tok{n}_[a-z]{{8}}'
+  keywords_prefixes: []
+  minimum_entropy: 0
+  default_severity: "Low"
+  rule_status: "Active"
+'''
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    rules = tmp_path / 'rules.yaml'
+    rules.write_text(RULE.format(n=1))
+    sock = str(tmp_path / 'scan.sock')
+    service = ScanService(rules, workers=1, queue_size=2, poll_interval=0.05)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    stop = asyncio.Event()
+    ports = []
+
+    async def run():
+        await service.start()
+        servers = [await service.serve_unix(sock), await service.serve_http('127.0.0.1', 0)]
+        ports.append(servers[1].sockets[0].getsockname()[1])
+        ready.set()
+        await stop.wait()
+        for server in servers:
+            server.close()
+            await server.wait_closed()
+        await service.stop()
+
+    thread = threading.Thread(target=lambda: loop.run_until_complete(run()), daemon=True)
+    thread.start()
+    assert ready.wait(10)
+    service.http_port = ports[0]
+    yield service, DaemonClient(sock), rules
+    loop.call_soon_threadsafe(stop.set)
+    thread.join(10)
+    loop.close()
+
+
+def test_scan_requests(daemon, tmp_path):
+    service, client, rules = daemon
+    assert client.ping()['rules_path'] == str(rules.resolve())
+    target = tmp_path / 'app.py'
+    target.write_text('x = "tok1_abcdefgh"\naws = "AKIAEXAMPLEKEY123456"\n')
+    found = client.scan_path(target)
+    assert {f.get('token_id') for f in found} >= {'TEST-1', None}
+    assert all(f['path'] == str(target.resolve()) for f in found)
+    unified = client.scan_text(target.read_text(), unified=True)
+    assert [f['matcher'] for f in unified if f['value'] == 'AKIAEXAMPLEKEY123456'] == ['aws-access-key']
+    assert client.request({'op': 'scan', 'path': 'relative.py'})['ok'] is False
+
+
+def test_catalog_hot_reload(daemon):
+    service, client, rules = daemon
+    generation = client.ping()['generation']
+    rules.write_text(RULE.format(n=1) + '\n' + RULE.format(n=2))
+    os.utime(rules, ns=(time.time_ns(), time.time_ns() + 10**9))
+    deadline = time.time() + 10
+    while client.ping()['generation'] == generation and time.time() < deadline:
+        time.sleep(0.05)
+    assert client.request({'op': 'stats'})['rules'] == 2
+    assert [f['token_id'] for f in client.scan_text('tok2_abcdefgh\n') if 'token_id' in f] == ['TEST-2']
+
+    # a broken catalog keeps the previous generation
+    generation = client.ping()['generation']
+    rules.write_text('- token_id: [unclosed\n')
+    assert client.request({'op': 'reload'})['ok'] is False
+    assert client.ping()['generation'] == generation
+
+
+def test_cli_uses_running_daemon(daemon, tmp_path, capsys):
+    service, client, rules = daemon
+    target = tmp_path / 'app.py'
+    target.write_text('x = "tok1_abcdefgh"\n')
+    before = service.requests
+    main([str(target), '--rules', str(rules), '--socket', client.socket_path])
+    assert service.requests == before + 1
+    assert '[TEST-1]' in capsys.readouterr().out
+    main([str(target), '--rules', str(rules), '--socket', client.socket_path, '--no-daemon'])
+    assert service.requests == before + 1
+    assert '[TEST-1]' in capsys.readouterr().out
+
+
+def test_http_endpoint(daemon):
+    service, _, _ = daemon
+    base = f'http://127.0.0.1:{service.http_port}'
+    with urllib.request.urlopen(base + '/ping') as resp:
+        assert json.load(resp)['ok'] is True
+    req = urllib.request.Request(base + '/scan', data=json.dumps({'text': 'x = tok1_abcdefgh\n'}).encode(),
+                                 method='POST')
+    with urllib.request.urlopen(req) as resp:
+        body = json.load(resp)
+    assert [f['token_id'] for f in body['findings'] if 'token_id' in f] == ['TEST-1']
+    with pytest.raises(urllib.error.HTTPError):
+        urllib.request.urlopen(base + '/nope')
+
+
+def test_http_serves_text_only_to_local_hosts(daemon, tmp_path):
+    service, _, _ = daemon
+    target = tmp_path / 'app.py'
+    target.write_text('x = "tok1_abcdefgh"\n')
+
+    def post(body, host='127.0.0.1'):
+        conn = http.client.HTTPConnection('127.0.0.1', service.http_port, timeout=10)
+        conn.request('POST', '/scan', body=json.dumps(body), headers={'Host': host})
+        resp = conn.getresponse()
+        result = resp.status, json.load(resp)
+        conn.close()
+        return result
+
+    status, body = post({'path': str(target)})
+    assert status == 403 and 'findings' not in body
+    # a DNS-rebinding page sends its own name as the Host
+    assert post({'text': 'x = tok1_abcdefgh\n'}, host='attacker.example:%d' % service.http_port)[0] == 403
+    assert post({'text': 'x = tok1_abcdefgh\n'}, host='[::1]:%d' % service.http_port)[0] == 200
+
+
+def test_unix_socket_is_private_and_not_taken_over(daemon, tmp_path):
+    _, client, _ = daemon
+    assert os.stat(client.socket_path).st_mode & 0o777 == 0o600
+    with pytest.raises(DaemonError):
+        asyncio.run(ScanService().serve_unix(client.socket_path))
+    assert client.ping() is not None
+    regular = tmp_path / 'not-a-socket'
+    regular.write_text('keep me')
+    with pytest.raises(DaemonError):
+        asyncio.run(ScanService().serve_unix(str(regular)))
+    assert regular.read_text() == 'keep me'
+
+    # a socket left behind by a crashed daemon is replaced
+    stale = str(tmp_path / 'stale.sock')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.bind(stale)
+
+    async def rebind():
+        server = await ScanService().serve_unix(stale)
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(rebind())
+
+
+def test_reload_validates_off_the_event_loop(daemon):
+    service, client, _ = daemon
+    validate = service._validate
+    started = threading.Event()
+
+    def slow_validate():
+        started.set()
+        time.sleep(1.0)
+        return validate()
+
+    service._validate = slow_validate
+    reload = threading.Thread(target=lambda: client.request({'op': 'reload'}))
+    reload.start()
+    assert started.wait(10)
+    begin = time.perf_counter()
+    assert client.ping() is not None
+    assert time.perf_counter() - begin < 0.5
+    reload.join(10)
@@ -0,0 +1,76 @@
+import base64
+import gzip
+import os
+from urllib.parse import quote
+
+from src.decoders import DecodeLimits, DecodeStats, decode_base64, scan_decoded
+from src.parallel import scan_directory
+from src.rules import RuleSet
+
+SECRET = b'aws_key = "AKIAEXAMPLE00KEY9Z8Y"\n'
+
+
+def _aws(findings):
+    return [(f['lineno'], f['column'], f['encoding']) for f in findings if f.get('token_id') == 'AWS-001']
+
+
+def test_nested_and_url_encoded_secrets_are_found(repo_root):
+    rs = RuleSet.from_yaml(repo_root / 'rules' / 'rules.yaml')
+    data = (b'a: ' + base64.b64encode(SECRET) + b'\n'
+            b'b: "' + base64.b64encode(gzip.compress(SECRET)) + b'"\n'
+            b'c: ' + quote(SECRET).encode() + b'\n'
+            b'd: ' + base64.urlsafe_b64encode(SECRET).rstrip(b'=') + b'\n')
+    stats = DecodeStats()
+    findings = scan_decoded(data, rs, stats=stats)
+    assert _aws(findings) == [(1, 4, 'base64'), (2, 5, 'base64/gzip'), (4, 4, 'base64'), (3, 4, 'url')]
+    aws = next(f for f in findings if f.get('token_id') == 'AWS-001')
+    assert aws['match'] == 'AKIAEXAMPLE00KEY9Z8Y' and aws['decoded_offset'] == SECRET.index(b'AKIA')
+    assert stats.findings == len(findings) and stats.bytes_decoded > 0 and stats.limited == 0
+
+
+def test_random_base64_is_not_scanned():
+    blob = base64.b64encode(os.urandom(300))
+    assert decode_base64(blob) is not None
+    stats = DecodeStats()
+    assert scan_decoded(b'x = "' + blob + b'"\n', stats=stats) == []
+    assert stats.spans == 1 and stats.decoded == 0
+
+
+def test_limits_bound_depth_and_size(repo_root):
+    rs = RuleSet.from_yaml(repo_root / 'rules' / 'rules.yaml')
+    nested = b'b: ' + base64.b64encode(gzip.compress(SECRET)) + b'\n'
+    assert _aws(scan_decoded(nested, rs, DecodeLimits(max_depth=1))) == []
+    assert scan_decoded(nested, rs, DecodeLimits(max_depth=0)) == []
+    stats = DecodeStats()
+    data = b'\n'.join(b'k: ' + base64.b64encode(SECRET) for _ in range(10)) + b'\n'
+    found = scan_decoded(data, rs, DecodeLimits(max_bytes=3 * len(SECRET)), stats)
+    assert len(_aws(found)) == 3
+    assert stats.limited == 1 and stats.bytes_decoded == 3 * len(SECRET)
+
+
+def test_directory_scan_reports_decode_overhead(tmp_path, repo_root):
+    (tmp_path / 'conf.yaml').write_bytes(b'blob: ' + base64.b64encode(gzip.compress(SECRET)) + b'\n')
+    (tmp_path / 'plain.py').write_text('x = 1\n')
+    rules = repo_root / 'rules' / 'rules.yaml'
+    plain, _ = scan_directory(tmp_path, rules_path=rules, workers=1)
+    decoded, stats = scan_directory(tmp_path, rules_path=rules, workers=2, decode=DecodeLimits())
+    extra = [f for f in decoded if 'encoding' in f]
+    assert [f for f in decoded if 'encoding' not in f] == plain
+    assert [f['path'] for f in extra if f.get('token_id') == 'AWS-001'] == [str(tmp_path / 'conf.yaml')]
+    assert stats.decode.files == 2 and stats.decode.findings == len(extra)
+    assert stats.decode.seconds > 0 and stats.decode.scan_seconds > 0
+    assert stats.to_dict()['decode']['overhead'] == stats.decode.overhead
+
+
+def test_base64_after_assignment_and_joined_words(repo_root):
+    rs = RuleSet.from_yaml(repo_root / 'rules' / 'rules.yaml')
+    b64 = base64.b64encode(SECRET)
+    # standard alphabet ("/"): with the "-" before it, the span mixes both alphabets
+    mixed = base64.b64encode(SECRET.rstrip(b'\n') + b' # ??>\n')
+    assert b'/' in mixed
+    data = (b'KEY=' + b64 + b'\n'
+            b'run --token=' + b64 + b'\n'
+            b'<div data-' + mixed + b'>\n'
+            b'v=' + base64.urlsafe_b64encode(SECRET) + b'\n')
+    assert _aws(scan_decoded(data, rs)) == [(1, 5, 'base64'), (2, 13, 'base64'), (3, 11, 'base64'),
+                                            (4, 3, 'base64')]
@@ -0,0 +1,31 @@
+import math
+import pytest
+from src import entropy
+from src.entropy import batch_entropy, shannon_entropy
+
+
+VALUES = ['', 'aaaa', 'abcd1234efgh5678IJKL9012', 'AKIAEXAMPLEKEY123456', 'héllo wörld', 'ab' * 40]
+
+
+def test_batch_matches_scalar():
+    assert batch_entropy(VALUES) == [shannon_entropy(v) for v in VALUES]
+    assert shannon_entropy('abcd') == 2.0
+
+
+def test_threshold_rejects_without_computing(monkeypatch):
+    calls = []
+    real = entropy.shannon_entropy
+    monkeypatch.setattr(entropy, 'shannon_entropy', lambda v: calls.append(v) or real(v))
+    # 'ab' * 40 has two distinct characters: at most 1 bit
+    result = batch_entropy(['ab' * 40, 'abc', 'abcd1234efgh5678IJKL9012'], threshold=3.5)
+    assert result[:2] == [None, None]
+    assert result[2] == pytest.approx(real('abcd1234efgh5678IJKL9012'))
+    assert calls == ['abcd1234efgh5678IJKL9012']
+
+
+def test_numpy_path_matches_python(monkeypatch):
+    pytest.importorskip('numpy')
+    values = [''.join(chr(48 + (i * j) % 75) for j in range(20 + i % 13)) for i in range(200)] + ['héllo']
+    monkeypatch.setattr(entropy, 'NUMPY_BLOCK', 64)
+    vectorized = batch_entropy(values)
+    assert all(math.isclose(a, shannon_entropy(v), abs_tol=1e-9) for a, v in zip(vectorized, values))
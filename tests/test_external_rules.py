@@ -0,0 +1,93 @@
+import re
+import shutil
+
+import pytest
+
+from src.external_rules import (UnsupportedPattern, differential, native_findings, parse_gitleaks_report,
+                                parse_trufflehog_report, translate_re2)
+from src.rules import RuleSet
+from tools.diff_external import compare
+
+KEY = 'AKIAEXAMPLEKEY123456'
+
+
+def test_translate_re2():
+    assert translate_re2('(?<key>x)\\z') == '(?P<key>x)\\Z'
+    assert translate_re2('\\Qa.b\\E') == 'a\\.b'
+    assert translate_re2('[[:alpha:]_]+') == '[A-Za-z_]+'
+    assert translate_re2('x{,3}') == 'x\\{,3}'
+    # RE2 flags last to the end of the group, across alternation
+    mid = translate_re2('a(?i)b|c')
+    assert mid == 'a(?i:b)|(?i:c)'
+    assert re.fullmatch(mid, 'C') and re.fullmatch(mid, 'aB') and not re.fullmatch(mid, 'AB')
+    for bad in ('(?U)a+', '\\p{Greek}', '[[:nope:]]'):
+        with pytest.raises(UnsupportedPattern):
+            translate_re2(bad)
+
+
+def test_load_gitleaks(tmp_path):
+    config = tmp_path / 'gitleaks.toml'
+    config.write_text("""
+[[rules]]
+id = "tok"
+regex = '''(?i)token\\s*=\\s*"(?<secret>[[:alnum:]]{20})"'''
+secretGroup = 1
+entropy = 3.0
+
+[[rules]]
+id = "files"
+path = '''\\.pem$'''
+
+[[rules]]
+id = "ungreedy"
+regex = '''(?U)a+'''
+
+[[rules]]
+id = "keywords-only"
+keywords = ["token"]
+""")
+    rs = RuleSet.from_path(config)
+    (rule,) = rs.rules
+    assert rule.token_id == 'gitleaks:tok' and rule.minimum_entropy == 3.0
+    assert [(s['id'], s['reason']) for s in rs.skipped if s['id'] != 'ungreedy'] == [
+        ('files', 'path conditions are not supported'), ('keywords-only', 'no regex')]
+    (f,) = rs.match_text('TOKEN = "ab3dEfGh1jKlMnOpQrSt"')
+    assert f['match'] == 'ab3dEfGh1jKlMnOpQrSt'
+
+
+def test_all_catalogs_in_one_ruleset(tmp_path, repo_root):
+    rules = repo_root / 'rules'
+    rs = RuleSet.from_path(f"{rules / 'rules.yaml'},{rules / 'gitleaks.toml'},{rules / 'trufflehog_rules.json'}")
+    assert {'AWS-001', 'gitleaks:example-aws-access', 'trufflehog:aws_access'} <= {r.token_id for r in rs.rules}
+    assert rs.skipped == [] and rs.quarantined == []
+    found = {f['token_id'] for f in rs.match_text(f'api_key = "ab3dEfGh1jKlMnOpQrSt"\n{KEY}\n')}
+    assert found == {'AWS-001', 'GENERIC-BASE64-01', 'gitleaks:example-aws-access', 'gitleaks:example-api-token',
+                     'trufflehog:aws_access', 'trufflehog:example_api_key'}
+
+
+def test_differential_against_reports(tmp_path, repo_root):
+    (tmp_path / 'a.py').write_text(f'x = 1\nkey = "{KEY}"\n')
+    (tmp_path / 'b.py').write_text(f'{KEY}\n')
+    files = sorted(tmp_path.glob('*.py'))
+    rs = RuleSet.from_path(repo_root / 'rules' / 'gitleaks.toml')
+    ours = native_findings(rs, tmp_path, files)
+    assert ours == {('a.py', 2, 'example-aws-access'), ('b.py', 1, 'example-aws-access')}
+
+    report = [{'File': str(tmp_path / 'a.py'), 'StartLine': 2, 'RuleID': 'example-aws-access'},
+              {'File': 'c.bin', 'StartLine': 1, 'RuleID': 'example-aws-access'}]
+    theirs = parse_gitleaks_report(report, tmp_path)
+    result = differential(ours, theirs, ['a.py', 'b.py'])
+    assert result['agreed'] == 1 and result['only_theirs'] == []
+    assert result['only_ours'] == [('b.py', 1, 'example-aws-access')] and result['unscanned_files'] == 1
+
+    lines = ['{"rule": {"id": "aws_access"}, "path": "b.py", "line": 1}']
+    assert parse_trufflehog_report(lines, tmp_path) == {('b.py', 1, 'aws_access')}
+
+
+@pytest.mark.parametrize('tool', ['gitleaks', 'trufflehog'])
+def test_differential_with_installed_tool(tmp_path, tool):
+    if shutil.which(tool) is None:
+        pytest.skip(f'{tool} is not installed')
+    (tmp_path / 'a.py').write_text(f'key = "{KEY}"\n')
+    result = compare(tool, tmp_path)
+    assert result['only_ours'] == [] and result['only_theirs'] == []
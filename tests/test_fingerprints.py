@@ -0,0 +1,109 @@
+import hashlib
+import sqlite3
+
+import pytest
+
+from src.fingerprints import BloomFilter, FingerprintIndex, load_key, normalize
+from src.scanner import scan_text
+
+KEY = 'AKIAEXAMPLE00KEY9Z8Y'
+OTHER = 'AKIAEXAMPLE01KEY9Z8Y'
+
+
+def _findings(path, *keys):
+    found = []
+    for key in keys:
+        for f in scan_text(f'aws = "{key}"\n'):
+            if f['detector'] == 'aws-access-key':
+                found.append(dict(f, path=path))
+    return found
+
+
+def test_index_stores_no_raw_secret_and_reports_new_only(tmp_path):
+    db = tmp_path / 'fp.db'
+    index = FingerprintIndex(db)
+    new = index.observe(_findings('a.py', KEY) + _findings('b.py', KEY), seen_at='2025-10-01T00:00:00+00:00')
+    assert [(f['path'], f['occurrences']) for f in new] == [('a.py', 2)]
+    assert len(index) == 1
+    index.close()
+
+    index = FingerprintIndex(db)
+    new = index.observe(_findings('c.py', KEY, OTHER), seen_at='2025-10-02T00:00:00+00:00')
+    assert [f['snippet'] for f in new] == [OTHER]
+    record = index.get(f' "{KEY}" ')
+    assert record['occurrences'] == 3
+    assert (record['first_seen'], record['first_path']) == ('2025-10-01T00:00:00+00:00', 'a.py')
+    assert (record['last_seen'], record['last_path']) == ('2025-10-02T00:00:00+00:00', 'c.py')
+    index.close()
+    dump = b''.join(bytes(line, 'utf-8') for line in sqlite3.connect(str(db)).iterdump())
+    assert KEY.encode() not in dump and OTHER.encode() not in dump
+
+
+def test_salt_makes_fingerprints_index_specific(tmp_path):
+    a = FingerprintIndex(tmp_path / 'a.db')
+    b = FingerprintIndex(tmp_path / 'b.db')
+    assert a.fingerprint(KEY) != b.fingerprint(KEY)
+    salt = a.salt
+    a.close()
+    b.close()
+    with pytest.raises(ValueError):
+        FingerprintIndex(tmp_path / 'a.db', salt=b'x' * 16)
+    assert FingerprintIndex(tmp_path / 'a.db', salt=salt).salt == salt
+    assert normalize(' "tok" ') == 'tok'
+
+
+def test_salt_kept_in_key_file(tmp_path):
+    key = tmp_path / 'fp.key'
+    salt = load_key(key)
+    assert load_key(key) == salt and key.stat().st_mode & 0o777 == 0o600
+    index = FingerprintIndex(tmp_path / 'fp.db', salt=salt)
+    index.observe(_findings('a.py', KEY))
+    index.close()
+    dump = b''.join(bytes(line, 'utf-8') for line in sqlite3.connect(str(tmp_path / 'fp.db')).iterdump())
+    assert salt.hex().encode() not in dump.lower()
+    with pytest.raises(ValueError):
+        FingerprintIndex(tmp_path / 'fp.db')
+    with pytest.raises(ValueError):
+        FingerprintIndex(tmp_path / 'fp.db', salt=b'x' * 16)
+    assert FingerprintIndex(tmp_path / 'fp.db', salt=salt).observe(_findings('b.py', KEY)) == []
+
+
+def test_bloom_filter_skips_lookups_and_grows(tmp_path):
+    index = FingerprintIndex(tmp_path / 'fp.db', capacity=100)
+    findings = [{'detector': 'high-entropy', 'snippet': f'secret-{i:05d}', 'path': 'x'} for i in range(1000)]
+    assert len(index.observe(findings[:50])) == 50
+    # the filter was empty: no SQLite lookups for new secrets
+    assert index.stats.db_lookups == 0
+    assert len(index.observe(findings)) == 950
+    assert index.bloom.capacity >= 2000 and all(index.fingerprint(f['snippet']) in index.bloom for f in findings)
+    index.close()
+    reopened = FingerprintIndex(tmp_path / 'fp.db', capacity=100)
+    assert reopened.bloom.bits == index.bloom.bits
+    assert reopened.observe(findings) == []
+    reopened.close()
+
+
+def test_bloom_filter_error_rate():
+    bloom = BloomFilter(10_000, 0.01)
+    fps = [hashlib.blake2b(b'%d' % i, digest_size=16).digest() for i in range(10_000)]
+    for fp in fps:
+        bloom.add(fp)
+    assert all(fp in bloom for fp in fps)
+    others = [hashlib.blake2b(b'other%d' % i, digest_size=16).digest() for i in range(10_000)]
+    assert sum(fp in bloom for fp in others) < 300
+
+
+def test_processes_share_one_index(tmp_path):
+    a = FingerprintIndex(tmp_path / 'fp.db')
+    b = FingerprintIndex(tmp_path / 'fp.db')
+    assert len(a.observe(_findings('a.py', KEY))) == 1
+    # b's filter does not hold KEY: it must find it in the table instead of inserting it again
+    assert [f['snippet'] for f in b.observe(_findings('b.py', KEY, OTHER))] == [OTHER]
+    assert a.observe(_findings('c.py', OTHER)) == []
+    assert len(a) == len(b) == 2
+    assert a.get(KEY)['occurrences'] == 2 and a.get(OTHER)['occurrences'] == 2
+    a.close()
+    b.close()
+    reopened = FingerprintIndex(tmp_path / 'fp.db')
+    assert all(reopened.fingerprint(k) in reopened.bloom for k in (KEY, OTHER))
+    reopened.close()
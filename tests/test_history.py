@@ -0,0 +1,91 @@
+import shutil
+import subprocess
+import pytest
+from src.cache import FindingsCache
+from src.history import scan_history, scan_history_added
+from src.rules import RuleSet
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None, reason='git not installed')
+
+
+def _git(cwd, *args):
+    subprocess.run(['git', '-c', 'user.name=t', '-c', 'user.email=t@example.com', *args], cwd=cwd,
+                   check=True, capture_output=True)
+
+
+@pytest.fixture
+def bare_repo(tmp_path):
+    work = tmp_path / 'work'
+    work.mkdir()
+    _git(work, 'init', '-q')
+    (work / 'app.py').write_text('aws_key = "AKIAEXAMPLEKEY123456"\n')
+    _git(work, 'add', '.')
+    _git(work, 'commit', '-qm', 'add key')
+    # the same content under a second path and an unrelated edit: no new blob for copy.py
+    (work / 'copy.py').write_text('aws_key = "AKIAEXAMPLEKEY123456"\n')
+    (work / 'other.py').write_text('x = 1\n')
+    _git(work, 'add', '.')
+    _git(work, 'commit', '-qm', 'copy')
+    with open(work / 'other.py', 'a') as fh:
+        fh.write('y = 2\nkey2 = "AKIAEXAMPLEKEY654321"\n')
+    _git(work, 'commit', '-qam', 'second key')
+    bare = tmp_path / 'bare.git'
+    _git(tmp_path, 'clone', '-q', '--bare', str(work), str(bare))
+    return bare
+
+
+def test_each_blob_scanned_once_and_attributed(bare_repo, repo_root):
+    rs = RuleSet.from_yaml(repo_root / 'rules' / 'rules.yaml')
+    findings, stats = scan_history(bare_repo, rs)
+    assert stats.commits == 3
+    assert stats.blob_refs == 4
+    assert stats.unique_blobs == stats.blobs_scanned == 3
+    aws = sorted((f['path'], f['match']) for f in findings if f.get('token_id') == 'AWS-001')
+    assert aws == [('app.py', 'AKIAEXAMPLEKEY123456'), ('copy.py', 'AKIAEXAMPLEKEY123456'),
+                   ('other.py', 'AKIAEXAMPLEKEY654321')]
+    assert all(len(f['commit']) == 40 for f in findings)
+
+
+def test_repeated_history_scan_uses_blob_cache(bare_repo, repo_root, tmp_path):
+    rs = RuleSet.from_yaml(repo_root / 'rules' / 'rules.yaml')
+    cache = FindingsCache(tmp_path / 'cache.db')
+    first, _ = scan_history(bare_repo, rs, cache=cache)
+    second, stats = scan_history(bare_repo, rs, cache=cache)
+    cache.close()
+    assert stats.blobs_scanned == 0
+    assert second == first
+
+
+def test_added_lines_only(bare_repo, repo_root):
+    rs = RuleSet.from_yaml(repo_root / 'rules' / 'rules.yaml')
+    findings, _ = scan_history_added(bare_repo, rs)
+    aws = [(f['path'], f['lineno']) for f in findings if f.get('token_id') == 'AWS-001']
+    assert aws == [('app.py', 1), ('copy.py', 1), ('other.py', 3)]
+
+
+def test_content_added_in_a_merge_commit(tmp_path, repo_root):
+    _git(tmp_path, 'init', '-q', '-b', 'main')
+    (tmp_path / 'app.py').write_text('x = 1\n')
+    _git(tmp_path, 'add', '.')
+    _git(tmp_path, 'commit', '-qm', 'base')
+    _git(tmp_path, 'checkout', '-qb', 'feature')
+    (tmp_path / 'feature.py').write_text('f = 1\n')
+    _git(tmp_path, 'add', '.')
+    _git(tmp_path, 'commit', '-qm', 'feature')
+    _git(tmp_path, 'checkout', '-q', 'main')
+    (tmp_path / 'main.py').write_text('m = 1\n')
+    _git(tmp_path, 'add', '.')
+    _git(tmp_path, 'commit', '-qm', 'main')
+    _git(tmp_path, 'merge', '-q', '--no-commit', 'feature')
+    # the merge itself introduces the key: no parent has it
+    (tmp_path / 'app.py').write_text('x = 1\naws_key = "AKIAEXAMPLEKEY123456"\n')
+    _git(tmp_path, 'add', '.')
+    _git(tmp_path, 'commit', '-qm', 'merge')
+    rs = RuleSet.from_yaml(repo_root / 'rules' / 'rules.yaml')
+    findings, stats = scan_history(tmp_path, rs)
+    aws = [(f['path'], f['match']) for f in findings if f.get('token_id') == 'AWS-001']
+    assert aws == [('app.py', 'AKIAEXAMPLEKEY123456')]
+    # files the merge takes unchanged from a parent are not attributed to it again
+    assert stats.commits == 4 and stats.blob_refs == 4
+    findings, _ = scan_history_added(tmp_path, rs)
+    assert [(f['path'], f['lineno']) for f in findings if f.get('token_id') == 'AWS-001'] == [('app.py', 2)]
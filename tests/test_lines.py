@@ -0,0 +1,49 @@
+from src import lines as lines_mod
+from src.detectors import detect_aws_access_key, detect_high_entropy_strings
+from src.lines import LineIndex
+from src.rules import RuleSet
+from src.scanner import scan_text
+
+TEXT = 'a\nbb\r\nccc\n\nkey = "AKIAEXAMPLEKEY123456"\n'
+
+
+def test_positions_match_naive_count():
+    for text in (TEXT, TEXT.encode()):
+        index = LineIndex(text)
+        for off in range(len(text) + 1):
+            line = text[:off].count('\n' if isinstance(text, str) else b'\n') + 1
+            start = text.rfind('\n' if isinstance(text, str) else b'\n', 0, off) + 1
+            assert index.position(off) == (line, off - start + 1)
+        assert index.line(2) == 'bb' and index.line(4) == ''
+    # columns count characters in bytes input too
+    assert LineIndex('héllo\nwörld'.encode()).position(9) == (2, 3)
+
+
+def test_lazy_extension_and_context(monkeypatch):
+    monkeypatch.setattr(lines_mod, 'BLOCK', 8)
+    text = ''.join(f'line {i}\n' for i in range(1, 1001))
+    index = LineIndex(text)
+    assert index.lineno(text.index('line 3\n')) == 3
+    # only the start of the text has been indexed
+    assert len(index.newlines) < 10
+    off = text.index('line 500\n')
+    assert index.context(off, 1, 2) == [(499, 'line 499'), (500, 'line 500'), (501, 'line 501'), (502, 'line 502')]
+    # a trailing newline does not start another line
+    assert index.around(1000, 1, 3) == [(999, 'line 999'), (1000, 'line 1000')]
+    assert index.context(off, 0, 0, end=text.index('line 502')) == [(500, 'line 500'), (501, 'line 501'),
+                                                                      (502, 'line 502')]
+
+
+def test_detectors_and_rules_are_located(repo_root):
+    lines = LineIndex(TEXT)
+    (aws,) = detect_aws_access_key(TEXT, lines)
+    assert (aws.lineno, aws.column) == (5, 8)
+    (entropy,) = detect_high_entropy_strings(TEXT)
+    assert (entropy.lineno, entropy.column) == (5, 8)
+    assert {(f['detector'], f['lineno'], f['column']) for f in scan_text(TEXT) if f['detector'] != 'keyword-context'} \
+        == {('aws-access-key', 5, 8), ('high-entropy', 5, 8)}
+
+    rs = RuleSet.from_yaml(repo_root / 'rules' / 'rules.yaml')
+    assert {(f['token_id'], f['lineno'], f['column']) for f in rs.match_text(TEXT)} == {
+        ('AWS-001', 5, 8), ('GENERIC-BASE64-01', 5, 8)}
+    assert {(f['lineno'], f['column']) for f in rs.match_bytes(TEXT.encode())} == {(5, 8)}
@@ -0,0 +1,34 @@
+from src import scanner
+from src.mmapscan import scan_buffer, scan_mmap
+from src.rules import RuleSet
+
+
+def test_mmap_scan_matches_text_scan(repo_root):
+    rs = RuleSet.from_yaml(repo_root / 'rules' / 'rules.yaml')
+    path = repo_root / 'examples' / 'seeded_repo' / 'app.py'
+    text = path.read_text(encoding='utf-8')
+    findings, nbytes = scan_mmap(path, rs)
+    assert nbytes == len(text.encode('utf-8'))
+    expected = scanner.scan_text(text, keywords=rs.keyword_matcher) + rs.match_text(text)
+    key = lambda f: (f.get('detector') or f['token_id'], f.get('snippet') or f['match'])
+    assert [key(f) for f in findings] == [key(f) for f in expected]
+    aws = next(f for f in findings if f.get('detector') == 'aws-access-key')
+    assert aws['lineno'] == 8
+    rule = next(f for f in findings if f.get('token_id') == 'AWS-001')
+    assert rule['lineno'] == 8 and rule['offset'] == aws['offset']
+
+
+def test_bytes_scan_handles_non_utf8(repo_root):
+    rs = RuleSet.from_yaml(repo_root / 'rules' / 'rules.yaml')
+    data = 'mot de passe é\n'.encode('latin-1') + b'\xff\xfe password = x\nkey = AKIAEXAMPLEKEY123456\n'
+    findings = scan_buffer(data, rs)
+    assert any(f.get('detector') == 'keyword-context' and f['lineno'] == 2 for f in findings)
+    rule = next(f for f in findings if f.get('token_id') == 'AWS-001')
+    assert data[rule['offset']:rule['offset'] + 20] == b'AKIAEXAMPLEKEY123456'
+    assert rule['lineno'] == 3
+
+
+def test_empty_file(tmp_path):
+    p = tmp_path / 'empty.txt'
+    p.write_bytes(b'')
+    assert scan_mmap(p) == ([], 0)
@@ -1,5 +1,7 @@
+import sqlite3
 from pathlib import Path
-from src.operations import OperationsSet
+import pytest
+from src.operations import SCHEMA, OperationEntry, OperationsSet, OperationsStore
 from tools.init_operations_db import init_db
 
 
@@ -22,3 +24,82 @@ def test_init_operations_db_and_load(tmp_path):
     entry = ops.get_by_rule('GENERIC-BASE64-01')
     assert entry is not None
     assert round(entry.precision, 2) == round(120 / (120 + 80), 2)
+
+
+def _entry(rule, date, tp, fp, fn):
+    return OperationEntry({'detection_rule_id': rule, 'test_audit_sample_size': tp + fp + fn, 'true_positives': tp,
+                           'false_positives': fp, 'false_negatives': fn, 'last_audit_date': date})
+
+
+def test_store_keeps_history_and_trends(tmp_path):
+    db = tmp_path / 'operations.db'
+    store = OperationsStore(db)
+    assert store.add([_entry('R1', '2025-01-10', 8, 2, 0), _entry('R1', '2025-01-20', 2, 8, 0),
+                      _entry('R1', '2025-02-05', 9, 1, 1), _entry('R2', '2025-01-15', 5, 0, 5)]) == 4
+    # same rule and date replaces the audit
+    store.add([_entry('R1', '2025-02-05', 9, 0, 1)])
+
+    assert [e.last_audit_date for e in store.history('R1')] == ['2025-01-10', '2025-01-20', '2025-02-05']
+    assert [e.last_audit_date for e in store.history('R1', since='2025-01-15')] == ['2025-01-20', '2025-02-05']
+    latest = store.latest()
+    assert latest.get_by_rule('R1').false_positives == 0 and latest.get_by_rule('R2').true_positives == 5
+
+    trend = store.trend('month', token_id='R1')
+    assert [(t['period'], t['audits'], t['precision']) for t in trend] == [('2025-01', 2, 0.5), ('2025-02', 1, 1.0)]
+    overall = store.trend('year', by_rule=False)
+    assert overall == [{'detection_rule_id': None, 'period': '2025', 'audits': 4, 'true_positives': 24,
+                        'false_positives': 10, 'false_negatives': 6, 'precision': 24 / 34, 'recall': 24 / 30}]
+    store.close()
+    assert OperationsSet.from_sqlite(db).get_by_rule('R1').last_audit_date == '2025-02-05'
+
+
+def test_store_migrates_latest_only_table(tmp_path):
+    db = tmp_path / 'operations.db'
+    with sqlite3.connect(db) as conn:
+        conn.execute('CREATE TABLE operations (detection_rule_id TEXT PRIMARY KEY, test_audit_sample_size INTEGER, '
+                     'true_positives INTEGER, false_positives INTEGER, false_negatives INTEGER, '
+                     'last_audit_date TEXT, tuning_recommendation TEXT)')
+        conn.execute("INSERT INTO operations VALUES ('R1', 10, 9, 1, 0, '2025-01-01', 'ok')")
+    conn.close()
+    store = OperationsStore(db)
+    store.add([_entry('R1', '2025-03-01', 5, 5, 0)])
+    assert [e.true_positives for e in store.history('R1')] == [9, 5]
+    store.close()
+    assert OperationsSet.from_sqlite(db).get_by_rule('R1').true_positives == 5
+
+
+def test_get_by_rule_prefers_latest_entry():
+    ops = OperationsSet([_entry('R1', '2025-02-01', 1, 0, 0), _entry('R1', '2025-01-01', 2, 0, 0)])
+    assert ops.get_by_rule('R1').true_positives == 1
+    ops.entries.append(_entry('R2', '2025-01-01', 3, 0, 0))
+    assert ops.get_by_rule('R2').true_positives == 3
+
+
+def test_store_migration_is_atomic_and_resumable(tmp_path):
+    db = tmp_path / 'operations.db'
+    with sqlite3.connect(db) as conn:
+        # no tuning_recommendation column: the copy into `audits` fails
+        conn.execute('CREATE TABLE operations (detection_rule_id TEXT PRIMARY KEY, true_positives INTEGER)')
+        conn.execute("INSERT INTO operations VALUES ('R1', 9)")
+    conn.close()
+    with pytest.raises(sqlite3.OperationalError):
+        OperationsStore(db)
+    with sqlite3.connect(db) as conn:
+        tables = conn.execute("SELECT name, type FROM sqlite_master WHERE name LIKE 'operations%'").fetchall()
+    conn.close()
+    assert tables == [('operations', 'table')]
+
+    # a half-done migration from an older version: renamed table next to the new schema
+    db = tmp_path / 'half.db'
+    with sqlite3.connect(db) as conn:
+        conn.execute('CREATE TABLE operations_legacy (detection_rule_id TEXT PRIMARY KEY, test_audit_sample_size '
+                     'INTEGER, true_positives INTEGER, false_positives INTEGER, false_negatives INTEGER, '
+                     'last_audit_date TEXT, tuning_recommendation TEXT)')
+        conn.execute("INSERT INTO operations_legacy VALUES ('R1', 10, 9, 1, 0, '2025-01-01', 'ok')")
+        conn.executescript(SCHEMA)
+    conn.close()
+    store = OperationsStore(db)
+    store.close()
+    store = OperationsStore(db)
+    assert [e.true_positives for e in store.history('R1')] == [9]
+    store.close()
@@ -0,0 +1,42 @@
+from pathlib import Path
+from src import parallel
+from src.parallel import iter_files, scan_directory
+
+
+def _make_tree(root: Path):
+    (root / 'pkg').mkdir()
+    (root / 'pkg' / 'app.py').write_text('aws_key = "AKIAEXAMPLEKEY123456"\n')
+    (root / 'pkg' / 'clean.py').write_text('print("hello")\n')
+    (root / 'node_modules').mkdir()
+    (root / 'node_modules' / 'dep.js').write_text('var k = "AKIAEXAMPLEKEY999999";\n')
+    (root / 'logo.png').write_bytes(b'\x89PNG\r\n\x1a\n\0\0\0AKIAEXAMPLEKEY123456')
+    (root / 'build').mkdir()
+    (root / 'build' / 'out.py').write_text('aws_key = "AKIAEXAMPLEKEY123456"\n')
+
+
+def test_iter_files_skips_vendored_binary_and_excluded(tmp_path):
+    _make_tree(tmp_path)
+    files = [p.relative_to(tmp_path).as_posix() for p in iter_files(tmp_path, exclude=['build'])]
+    assert files == ['pkg/app.py', 'pkg/clean.py']
+
+
+def test_parallel_scan_is_deterministic(tmp_path):
+    _make_tree(tmp_path)
+    rules = Path(__file__).parents[1] / 'rules' / 'rules.yaml'
+    serial, stats = scan_directory(tmp_path, rules_path=rules, workers=1, chunk_size=1)
+    pooled, _ = scan_directory(tmp_path, rules_path=rules, workers=2, chunk_size=1)
+    assert serial == pooled
+    assert any(f.get('token_id') == 'AWS-001' for f in serial)
+    assert stats.files == 3
+    assert stats.findings == len(serial)
+    assert stats.bytes_scanned > 0
+
+
+def test_in_process_scan_leaves_no_worker_state(tmp_path):
+    _make_tree(tmp_path)
+    rules = Path(__file__).parents[1] / 'rules' / 'rules.yaml'
+    cache = tmp_path / 'cache.db'
+    scan_directory(tmp_path, rules_path=rules, workers=1, cache_path=cache)
+    found, stats = scan_directory(tmp_path, rules_path=rules, workers=1, cache_path=cache)
+    assert stats.cache.hits == 3 and any(f.get('token_id') == 'AWS-001' for f in found)
+    assert (parallel._RULESET, parallel._CACHE, parallel._ENGINE, parallel._PLANS) == (None, None, None, None)
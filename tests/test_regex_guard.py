@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+import yaml
+
+from src.profiling import _can_interrupt
+from src.regex_guard import REFUSE, RegexGuard, UnsafeRuleError, adversarial_inputs, static_issues
+from src.rules import RuleSet
+from tools.compile_rules import compile_catalog
+from tools.init_rules_db import init_db
+
+SAFE = {'token_id': 'SAFE-01', 'regex_pattern': 'tok_(?P<val>[a-z0-9]{16})'}
+NESTED = {'token_id': 'NESTED-01', 'regex_pattern': '(a+)+$'}
+ADJACENT = {'token_id': 'ADJ-01', 'regex_pattern': r'\w+\d+x'}
+
+
+def _kinds(pattern):
+    return {i['kind'] for i in static_issues(pattern)}
+
+
+def test_static_issues():
+    assert _kinds('(a+)+$') == {'nested-quantifier'}
+    assert _kinds('(a|aa)*b') == {'overlapping-alternation'}
+    assert _kinds(r'\w+\d+x') == {'adjacent-quantifiers'}
+    assert _kinds(r'(["\'])\w{20,}\1') == {'backreference'}
+    assert _kinds('AKIA[0-9A-Z]{16}') == set()
+    assert _kinds('(') == {'invalid'}
+
+
+def test_adversarial_inputs_scale():
+    small, large = adversarial_inputs('(a+)+$', 64), adversarial_inputs('(a+)+$', 512)
+    assert len(small) == len(large)
+    assert any('a' * 64 in s for s in small) and any('a' * 512 in s for s in large)
+
+
+def _catalog(tmp_path, rows):
+    path = tmp_path / 'rules.yaml'
+    path.write_text(yaml.safe_dump(rows))
+    return path
+
+
+@pytest.mark.skipif(not _can_interrupt(), reason='needs SIGALRM')
+def test_load_quarantines_superlinear_rules(tmp_path, capsys):
+    path = _catalog(tmp_path, [SAFE, NESTED, ADJACENT])
+    rs = RuleSet.from_yaml(path)
+    assert [r.token_id for r in rs.rules] == ['SAFE-01']
+    assert {r.token_id for r in rs.quarantined} == {'NESTED-01', 'ADJ-01'}
+    assert all(r.rule_status == 'Testing' for r in rs.quarantined)
+    assert rs.match_text('aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa!') == []
+
+    report = rs.guard_report
+    assert {c.token_id for c in report.unsafe} == {'NESTED-01', 'ADJ-01'}
+    assert report.ranked()[-1].token_id == 'SAFE-01'
+    assert 'QUARANTINE' in report.format_table()
+
+    with pytest.raises(UnsafeRuleError, match='NESTED-01'):
+        RuleSet.from_yaml(path, guard=RegexGuard(action=REFUSE))
+    assert len(RuleSet.from_yaml(path, guard=False).rules) == 3
+
+    out_db = tmp_path / 'rules.db'
+    init_db(path, out_db)
+    with sqlite3.connect(out_db) as conn:
+        status = dict(conn.execute('SELECT token_id, rule_status FROM rules'))
+    assert status['NESTED-01'] == 'Testing' and status['SAFE-01'] is None
+
+    # a compiled catalog leaves quarantined rules out, and says so
+    compile_catalog(path, tmp_path / 'rules.catalog')
+    assert [r.token_id for r in RuleSet.from_path(tmp_path / 'rules.catalog').rules] == ['SAFE-01']
+    err = capsys.readouterr().err
+    assert 'NESTED-01: left out as Testing' in err and 'ADJ-01: left out as Testing' in err
+
+
+def test_shipped_catalog_is_safe(repo_root):
+    rs = RuleSet.from_yaml(repo_root / 'rules' / 'rules.yaml')
+    assert rs.quarantined == []
+    report = RegexGuard(measure='all').check_all(rs.rules)
+    assert report.unsafe == []
+    assert all(c.cost_per_mb is not None for c in report.checks)
+    # the rewritten generic rule still requires a closing quote
+    findings = rs.match_text('k = "ab3dEfGh1jKlMnOpQrSt" x = ab3dEfGh1jKlMnOpQrSt')
+    assert [(f['token_id'], f['offset']) for f in findings] == [('GENERIC-BASE64-01', 5)]
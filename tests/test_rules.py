@@ -1,6 +1,7 @@
 from pathlib import Path
 import tempfile
 import sqlite3
+import pytest
 from src.rules import RuleSet
 from tools.init_rules_db import init_db
 
@@ -31,3 +32,35 @@ def test_init_db_and_load(tmp_path):
     sample = 'AKIAEXAMPLEKEY123456'
     findings = rs.match_text(sample)
     assert any(f['token_id'] == 'AWS-001' for f in findings)
+
+
+def test_compiled_catalog_roundtrip(tmp_path):
+    from tools.compile_rules import compile_catalog
+    repo = Path(__file__).parents[1]
+    yaml_path = repo / 'rules' / 'rules.yaml'
+    out = tmp_path / 'rules.catalog'
+    compile_catalog(yaml_path, out)
+    rs = RuleSet.from_path(out)
+    assert all(r._compiled_re is None for r in rs.rules)
+    expected = RuleSet.from_yaml(yaml_path)
+    assert [r.fingerprint for r in rs.rules] == [r.fingerprint for r in expected.rules]
+    sample = 'key = "AKIAEXAMPLEKEY123456"'
+    assert rs.match_text(sample) == expected.match_text(sample)
+
+
+def test_compiled_catalog_checks_its_source(tmp_path):
+    from tools.compile_rules import compile_catalog
+    repo = Path(__file__).parents[1]
+    yaml_path = tmp_path / 'rules.yaml'
+    yaml_path.write_bytes((repo / 'rules' / 'rules.yaml').read_bytes())
+    out = tmp_path / 'rules.catalog'
+    compile_catalog(yaml_path, out)
+    assert RuleSet.from_path(out).rules
+    with open(yaml_path, 'a', encoding='utf-8') as fh:
+        fh.write('\n# edited after compiling\n')
+    with pytest.raises(ValueError, match='out of date'):
+        RuleSet.from_path(out)
+    with pytest.raises(ValueError, match='out of date'):
+        RuleSet.from_compiled(out, source=yaml_path)
+    # without its source alongside, the catalog loads as is
+    assert RuleSet.from_compiled(out).rules
@@ -14,3 +14,47 @@ def test_no_findings_in_clean_file(tmp_path):
     p.write_text('print("hello")\n')
     findings = scanner.scan_text(p.read_text())
     assert findings == []
+
+
+def _naive_keyword_lines(text, keywords):
+    return [i for i, line in enumerate(text.split('\n'), start=1) if any(k in line.lower() for k in keywords)]
+
+
+def test_keyword_matcher_matches_naive_scan(monkeypatch):
+    import random
+    from src import detectors
+    monkeypatch.setattr(detectors, 'KEYWORD_CHUNK', 64)
+    rnd = random.Random(3)
+    keywords = detectors.KEYWORDS + ['pass', 'passwd', 'ghp_', 'xox'] + [
+        ''.join(rnd.choice('abcdefgh_') for _ in range(rnd.randint(3, 8))) for _ in range(300)]
+    lines = [''.join(rnd.choice('abcdefghABCDEFGH_ =İ') for _ in range(rnd.randint(0, 90))) for _ in range(500)]
+    text = '\n'.join(lines + ['db_PASSWORD = x', 'Token'])
+    matcher = detectors.KeywordMatcher(keywords)
+    found = [f.lineno for f in detectors.detect_keywords_context(text, keywords=matcher)]
+    assert found == _naive_keyword_lines(text, matcher.keywords)
+    data = text.encode()
+    # bytes input only folds ASCII case, which covers every keyword here
+    assert [data.count(b'\n', 0, s) + 1 for s, _ in matcher.lines(data)] == found
+
+    # a non-ASCII keyword is matched case-insensitively in bytes too, at exact byte offsets
+    matcher = detectors.KeywordMatcher(keywords + ['geheimnis', 'schlüssel'])
+    text += '\nİx = 1\nDER SCHLÜSSEL = x\nGeheimnis: y'
+    found = [f.lineno for f in detectors.detect_keywords_context(text, keywords=matcher)]
+    assert found == _naive_keyword_lines(text, matcher.keywords)
+    assert found[-2:] == [len(lines) + 4, len(lines) + 5]
+    data = text.encode()
+    spans = list(matcher.lines(data))
+    assert [data.count(b'\n', 0, s) + 1 for s, _ in spans] == found
+    assert data[spans[-2][0]:spans[-2][1]] == 'DER SCHLÜSSEL = x'.encode()
+
+
+def test_catalog_keywords_feed_the_detector(repo_root):
+    from src.engine import Engine
+    from src.mmapscan import scan_buffer
+    from src.rules import RuleSet
+    ruleset = RuleSet.from_yaml(repo_root / 'rules' / 'rules.yaml')
+    assert 'akia' in ruleset.keyword_matcher.keywords
+    text = 'x = 1\nAKIA is mentioned here\n'
+    assert [f['lineno'] for f in scanner.scan_text(text) if f['detector'] == 'keyword-context'] == []
+    assert [f['lineno'] for f in scan_buffer(text.encode(), ruleset) if f.get('detector') == 'keyword-context'] == [2]
+    assert [f.lineno for f in Engine(ruleset).scan(text) if f.matcher == 'keyword-context'] == [2]
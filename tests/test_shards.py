@@ -0,0 +1,99 @@
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from src.history import scan_history
+from src.parallel import scan_directory
+from src.rules import RuleSet
+from src.shards import (ShardError, merge_partials, pending_shards, plan_blobs, plan_files, run_shard, run_shards,
+                        shard_of, shard_path)
+
+
+def _tree(root):
+    root.mkdir()
+    for i in range(12):
+        body = f'key{i} = "AKIAEXAMPLE{i:02d}KEY9Z8Y"\n' if i % 3 == 0 else f'x = {i}\n'
+        (root / f'f{i:02d}.py').write_text(body)
+    return root
+
+
+def test_shard_assignment_is_deterministic():
+    keys = [f'dir/file{i}.py' for i in range(200)]
+    shards = [shard_of(k, 4) for k in keys]
+    assert shards == [shard_of(k, 4) for k in keys]
+    assert set(shards) == {0, 1, 2, 3}
+
+
+def test_sharded_scan_matches_directory_scan(tmp_path, repo_root):
+    root = _tree(tmp_path / 'tree')
+    rules = repo_root / 'rules' / 'rules.yaml'
+    out = tmp_path / 'out'
+    plan_files(out, root, 3, rules_path=rules)
+    assert run_shards(out, workers=2) == [0, 1, 2]
+    findings, report = merge_partials(out)
+    expected, stats = scan_directory(root.resolve(), rules_path=rules, workers=1)
+    assert findings == expected
+    assert report.items == stats.files == 12
+    assert report.bytes_scanned == stats.bytes_scanned
+    assert report.counters['AWS-001'] == {'findings': 4, 'items': 4}
+    assert report.duplicates == 0
+
+
+def test_failed_shard_is_rerun_alone(tmp_path, repo_root):
+    root = _tree(tmp_path / 'tree')
+    out = tmp_path / 'out'
+    plan_files(out, root, 4, rules_path=repo_root / 'rules' / 'rules.yaml')
+    run_shards(out, workers=1, shards=[0, 1, 3])
+    with pytest.raises(ShardError, match=r'\[2\]'):
+        merge_partials(out)
+    # an interrupted write leaves a truncated file behind, which counts as not done
+    shard_path(out, 3).write_text('{"plan": ')
+    assert pending_shards(out) == [2, 3]
+    done = shard_path(out, 0).stat().st_mtime_ns
+    assert run_shards(out, workers=1) == [2, 3]
+    assert shard_path(out, 0).stat().st_mtime_ns == done
+    assert run_shard(out, 0) is False
+    findings, report = merge_partials(out)
+    assert report.items == 12 and len(findings) == report.findings
+
+
+def test_labeled_plan_yields_operations(tmp_path, repo_root):
+    root = _tree(tmp_path / 'tree')
+    labels = {'f00.py': ['AKIAEXAMPLE00KEY9Z8Y'], 'f01.py': ['x = 1']}
+    (tmp_path / 'labels.json').write_text(json.dumps(labels))
+    out = tmp_path / 'out'
+    plan_files(out, root, 2, rules_path=repo_root / 'rules' / 'rules.yaml', labels_path=tmp_path / 'labels.json')
+    run_shards(out, workers=1)
+    _, report = merge_partials(out)
+    aws = report.operations('2025-10-05').get_by_rule('AWS-001')
+    # f03, f06 and f09 hold keys nobody labeled; the label of f01 is not a key
+    assert (aws.true_positives, aws.false_positives, aws.false_negatives) == (1, 3, 1)
+    assert aws.test_audit_sample_size == 12 and aws.last_audit_date == '2025-10-05'
+
+
+@pytest.mark.skipif(shutil.which('git') is None, reason='git not installed')
+def test_blob_shards_match_history_scan(tmp_path, repo_root):
+    work = tmp_path / 'work'
+    _tree(work)
+
+    def git(*args):
+        subprocess.run(['git', '-c', 'user.name=t', '-c', 'user.email=t@example.com', *args], cwd=work,
+                       check=True, capture_output=True)
+
+    git('init', '-q')
+    git('add', '.')
+    git('commit', '-qm', 'one')
+    (work / 'copy.py').write_text((work / 'f00.py').read_text())
+    git('add', '.')
+    git('commit', '-qm', 'two')
+    rules = repo_root / 'rules' / 'rules.yaml'
+    out = tmp_path / 'out'
+    plan_blobs(out, work, 3, rules_path=rules)
+    run_shards(out, workers=1)
+    findings, report = merge_partials(out)
+    expected, stats = scan_history(work, RuleSet.from_yaml(rules))
+    key = lambda f: (f['commit'], f['path'], f.get('token_id') or f['detector'], f['offset'])
+    assert sorted(findings, key=key) == sorted(expected, key=key)
+    assert report.items == stats.unique_blobs
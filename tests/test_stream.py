@@ -0,0 +1,43 @@
+import io
+from src import scanner
+from src.rules import RuleSet
+
+
+def _sample():
+    lines = []
+    for i in range(300):
+        if i % 37 == 5:
+            lines.append(f'aws_key_{i} = "AKIA{i:016d}"'.replace('0', 'Z'))
+        else:
+            lines.append(f'value_{i} = {i * 7}  # filler text \xe9')
+    return '\n'.join(lines) + '\n'
+
+
+def test_stream_matches_whole_text_scan():
+    text = _sample()
+    whole = [f for f in scanner.scan_text(text) if f['detector'] == 'aws-access-key']
+    streamed = [f for f in scanner.scan_stream(io.BytesIO(text.encode('utf-8')), chunk_size=97, overlap=40)
+                if f['detector'] == 'aws-access-key']
+    assert [f['snippet'] for f in streamed] == [f['snippet'] for f in whole]
+    data = text.encode('utf-8')
+    for f in streamed:
+        assert data[f['offset']:f['offset'] + 20].decode() == f['snippet']
+        assert text.splitlines()[f['lineno'] - 1].find(f['snippet']) != -1
+
+
+def test_stream_token_across_chunk_boundary_and_bad_bytes(repo_root):
+    rs = RuleSet.from_yaml(repo_root / 'rules' / 'rules.yaml')
+    data = b'\xff\xfe junk\n' + b'x' * 50 + b' AKIAEXAMPLEKEY123456\n'
+    # chunk boundary falls inside the key
+    findings = list(scanner.scan_stream(io.BytesIO(data), rs, chunk_size=64))
+    aws = [f for f in findings if f.get('token_id') == 'AWS-001']
+    assert len(aws) == 1
+    assert aws[0]['lineno'] == 2
+    assert aws[0]['offset'] == data.index(b'AKIA')
+
+
+def test_stream_keyword_lines_are_absolute():
+    text = 'a = 1\n' * 500 + 'password = hunter2\n'
+    findings = list(scanner.scan_stream(io.StringIO(text), chunk_size=128, overlap=32))
+    kw = [f for f in findings if f['detector'] == 'keyword-context']
+    assert [f['lineno'] for f in kw] == [501]
@@ -0,0 +1,77 @@
+from pathlib import Path
+
+from src.parallel import scan_directory
+from src.triage import FULL, KNOWN, SKIP, GitIgnore, TriageConfig, classify
+
+KEY = 'aws_key = "AKIAEXAMPLEKEY123456"  # password\n'
+
+
+def test_classify_routes():
+    config = TriageConfig(max_size=100)
+    assert classify('a.py', 0, b'', config) == (SKIP, 'empty')
+    assert classify('logo.PNG', 10, b'', config) == (SKIP, 'extension')
+    assert classify('blob', 10, b'\x7fELF\x02', config) == (SKIP, 'magic:elf')
+    assert classify('blob', 10, b'ab\0cd', config) == (SKIP, 'binary')
+    assert classify('big.txt', 101, b'text', config) == (KNOWN, 'size')
+    assert classify('yarn.lock', 10, b'text', config) == (KNOWN, 'generated-name')
+    assert classify('app.min.js', 10, b'text', config) == (KNOWN, 'generated-name')
+    assert classify('gen.go', 10, b'// Code generated by protoc. DO NOT EDIT.\n', config) == (KNOWN, 'generated-marker')
+    assert classify('bundle.js', 99, b'x' * 5000, TriageConfig()) == (KNOWN, 'minified')
+    assert classify('app.py', 10, KEY.encode(), config) == (FULL, 'text')
+
+
+def test_levels_by_token_and_category():
+    config = TriageConfig(levels={'Generic': SKIP, 'AWS-001': FULL})
+    assert config.runs_on('AWS-001', 'Cloud/AWS', FULL)
+    assert not config.runs_on('AWS-001', 'Cloud/AWS', KNOWN)
+    assert config.runs_on('OTHER', 'Cloud/AWS', KNOWN)
+    assert not config.runs_on('GENERIC-BASE64-01', 'Generic', FULL)
+
+
+def test_gitignore(tmp_path):
+    (tmp_path / '.gitignore').write_text('*.log\n!keep.log\n/build/\ndocs/**/*.tmp\n')
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / '.gitignore').write_text('local.txt\n')
+    ignore = GitIgnore(tmp_path)
+    assert ignore.ignored('a.log') and ignore.ignored('sub/b.log')
+    assert not ignore.ignored('keep.log')
+    assert ignore.ignored('build/out.py') and not ignore.ignored('sub/build/out.py')
+    assert ignore.ignored('docs/x/y/z.tmp')
+    assert ignore.ignored('sub/local.txt') and not ignore.ignored('local.txt')
+
+
+def _make_tree(root: Path):
+    (root / '.gitignore').write_text('dist/\n*.log\n')
+    (root / 'app.py').write_text(KEY)
+    (root / 'yarn.lock').write_text(KEY)
+    (root / 'debug.log').write_text(KEY)
+    (root / 'dist').mkdir()
+    (root / 'dist' / 'bundle.js').write_text(KEY)
+    (root / 'logo.png').write_bytes(b'\x89PNG\r\n\x1a\n' + KEY.encode())
+
+
+def test_scan_directory_with_triage(tmp_path, repo_root):
+    _make_tree(tmp_path)
+    rules = repo_root / 'rules' / 'rules.yaml'
+    findings, stats = scan_directory(tmp_path, rules_path=rules, workers=1, triage=TriageConfig())
+    by_path = {}
+    for f in findings:
+        by_path.setdefault(Path(f['path']).name, set()).add(f.get('token_id', f.get('detector')))
+    assert set(by_path) == {'app.py', 'yarn.lock'}
+    # the generated lockfile only gets the structured detectors and non-generic rules
+    assert by_path['yarn.lock'] == {'AWS-001', 'aws-access-key'}
+    assert {'high-entropy', 'keyword-context'} & by_path['app.py']
+
+    t = stats.triage
+    size = len(KEY)
+    # app.py and the .gitignore itself are scanned in full
+    assert t.files == {SKIP: 2, KNOWN: 1, FULL: 2}
+    assert t.bytes[KNOWN] == size
+    assert t.reasons['gitignore'] == 1 and t.reasons['gitignore-dir'] == 1 and t.reasons['extension'] == 1
+    assert t.bytes_saved == t.bytes[SKIP] + size
+    assert stats.to_dict()['triage']['bytes_saved'] == t.bytes_saved
+
+    unified, _ = scan_directory(tmp_path, rules_path=rules, workers=1, unified=True, triage=TriageConfig())
+    matchers = {(Path(f['path']).name, f['matcher']) for f in unified}
+    assert ('yarn.lock', 'AWS-001') in matchers
+    assert not any(name == 'yarn.lock' and m in ('high-entropy', 'keyword-context') for name, m in matchers)
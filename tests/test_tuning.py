@@ -0,0 +1,103 @@
+import json
+import sqlite3
+
+import yaml
+
+from src.operations import OperationsSet
+from src.tuning import (CandidateTable, LabelIndex, collect_candidates, evaluate_corpus, load_labels, suggest, sweep,
+                        sweep_operations)
+
+KEY = 'AKIAEXAMPLEKEY123456'
+TOKEN = 'ab3dEfGh1jKlMnOpQrSt'
+NOISE = 'qwErTyUi12qwErTyUi34'
+
+
+def test_label_index_overlaps():
+    index = LabelIndex(b'xx KEY yy KEY', ['KEY', {'offset': 0, 'end': 20, 'token_id': 'R'}])
+    assert [s[:2] for s in index.spans] == [(0, 20), (3, 6), (10, 13)]
+    assert sorted(index.overlapping(4, 5)) == [0, 1]
+    assert index.overlapping(20, 25) == []
+    assert index.applicable('R') == [0, 1, 2] and index.applicable('S') == [1, 2]
+
+
+def _corpus(root):
+    (root / 'a.py').write_text(f'aws = "{KEY}"\ntoken = "{TOKEN}"\nnoise = "{NOISE}"\n')
+    (root / 'b.py').write_text('print("clean")\n')
+    labels = {'a.py': [KEY, TOKEN], 'b.py': ['AKIAMISSINGKEY000000']}
+    (root / 'labels.json').write_text(json.dumps(labels))
+    with open(root / 'labels.jsonl', 'w') as fh:
+        for rel, secrets in labels.items():
+            fh.write(json.dumps({'path': rel, 'secrets': secrets}) + '\n')
+
+
+def test_evaluate_corpus_counts_and_db(tmp_path, repo_root):
+    _corpus(tmp_path)
+    rules = repo_root / 'rules' / 'rules.yaml'
+    assert list(load_labels(tmp_path / 'labels.json')) == list(load_labels(tmp_path / 'labels.jsonl'))
+    ops, stats = evaluate_corpus(tmp_path, load_labels(tmp_path / 'labels.jsonl'), rules, workers=1,
+                                 audit_date='2025-10-04')
+    aws = ops.get_by_rule('AWS-001')
+    # the label of b.py does not occur in the file and is ignored
+    assert (aws.true_positives, aws.false_positives, aws.false_negatives) == (1, 0, 1)
+    generic = ops.get_by_rule('GENERIC-BASE64-01')
+    # both labels are found; the unlabeled noise string is a false positive
+    assert (generic.true_positives, generic.false_positives, generic.false_negatives) == (2, 1, 0)
+    assert aws.test_audit_sample_size == stats.files == 2
+
+    db = tmp_path / 'operations.db'
+    ops.to_sqlite(db)
+    loaded = OperationsSet.from_sqlite(db)
+    assert loaded.get_by_rule('AWS-001').last_audit_date == '2025-10-04'
+    assert loaded.get_by_rule('GENERIC-BASE64-01').false_positives == 1
+
+
+def test_cache_reruns_only_edited_rule(tmp_path, repo_root):
+    _corpus(tmp_path)
+    cache = tmp_path / 'cache.db'
+    rules = tmp_path / 'rules.yaml'
+    rows = yaml.safe_load((repo_root / 'rules' / 'rules.yaml').read_text())
+    rules.write_text(yaml.safe_dump(rows))
+    labels = tmp_path / 'labels.json'
+    first, stats = evaluate_corpus(tmp_path, load_labels(labels), rules, workers=2, cache_path=cache)
+    assert stats.rule_runs == 4 and stats.cached_runs == 0
+    _, stats = evaluate_corpus(tmp_path, load_labels(labels), rules, workers=1, cache_path=cache)
+    assert stats.rule_runs == 0 and stats.cached_runs == 4
+
+    rows[1]['minimum_entropy'] = 6.0
+    rules.write_text(yaml.safe_dump(rows))
+    edited, stats = evaluate_corpus(tmp_path, load_labels(labels), rules, workers=1, cache_path=cache)
+    assert stats.rule_runs == 2 and stats.cached_runs == 2
+    assert edited.get_by_rule('GENERIC-BASE64-01').true_positives == 0
+    assert edited.get_by_rule('AWS-001').true_positives == first.get_by_rule('AWS-001').true_positives
+
+    with sqlite3.connect(cache) as conn:
+        (count,) = conn.execute('SELECT COUNT(*) FROM results').fetchone()
+    assert count == 4
+
+
+def test_sweep_matches_evaluation_and_suggests(tmp_path, repo_root):
+    _corpus(tmp_path)
+    rules = repo_root / 'rules' / 'rules.yaml'
+    labels = tmp_path / 'labels.json'
+    table = collect_candidates(tmp_path, load_labels(labels), rules, workers=1)
+    ops, _ = evaluate_corpus(tmp_path, load_labels(labels), rules, workers=1)
+    for tid, cols in table.rules.items():
+        entropy, lmin, lmax = cols['current']
+        (point,) = sweep(table, tid, [entropy], [(lmin, lmax)])
+        entry = ops.get_by_rule(tid)
+        assert (point.tp, point.fp, point.fn) == (entry.true_positives, entry.false_positives, entry.false_negatives)
+
+    # the noise string has the lowest entropy of the generic candidates, so a higher threshold drops it
+    entropies = [3.0, 3.5, 3.7, 4.0]
+    points = sweep(table, 'GENERIC-BASE64-01', entropies)
+    best = suggest(points, 1.0)
+    assert best.precision == 1.0 and best.recall == 1.0 and best.minimum_entropy == 3.7
+    assert suggest(points, 1.01) is None
+
+    table.save(tmp_path / 'table.json')
+    loaded = CandidateTable.load(tmp_path / 'table.json')
+    swept, suggestions = sweep_operations(loaded, 1.0, entropies=entropies)
+    assert suggestions['GENERIC-BASE64-01'].to_dict() == best.to_dict()
+    entry = swept.get_by_rule('GENERIC-BASE64-01')
+    assert (entry.true_positives, entry.false_positives) == (2, 0)
+    assert 'minimum_entropy=' in entry.tuning_recommendation
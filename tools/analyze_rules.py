@@ -0,0 +1,38 @@
+"""Report the worst-case regex cost of every rule in a catalog.
+Usage: python -m tools.analyze_rules [rules.yaml|rules.db] [--budget 0.25] [--json report.json]
+
+Every rule is timed on adversarial inputs (see `src/regex_guard.py`), not
+only those with static findings, and listed with its prefilter literals,
+most expensive first. Exits with status 1 if any rule would be quarantined.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from src.regex_guard import DEFAULT_BUDGET, DEFAULT_MAX_COST_PER_MB, REPORT, RegexGuard
+from src.rules import RuleSet
+
+REPO_ROOT = Path(__file__).parents[1]
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Rank catalog rules by worst-case regex cost')
+    p.add_argument('catalog', nargs='?', default=str(REPO_ROOT / 'rules' / 'rules.yaml'))
+    p.add_argument('--budget', type=float, default=DEFAULT_BUDGET, help='seconds allowed per adversarial input')
+    p.add_argument('--max-cost', type=float, default=DEFAULT_MAX_COST_PER_MB, help='seconds per MiB allowed')
+    p.add_argument('--json', help='also write the report as JSON')
+    args = p.parse_args(argv)
+
+    guard = RegexGuard(budget=args.budget, max_cost_per_mb=args.max_cost, measure='all', action=REPORT)
+    rs = RuleSet.from_path(Path(args.catalog), guard=False)
+    report = guard.check_all(rs.rules)
+    print(report.format_table())
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump(report.to_dict(), fh, indent=2)
+    return 1 if report.unsafe else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
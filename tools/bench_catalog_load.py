@@ -0,0 +1,77 @@
+"""Startup benchmark: load time of YAML, SQLite and compiled rule catalogs.
+Usage: python -m tools.bench_catalog_load [sizes...]
+
+Synthetic catalogs (default 10, 100 and 1,000 rules) are written to a temp
+directory in all three formats. Each load is timed with the `re` module
+cache purged, best of several runs, and the compiled catalog is measured
+both lazily (regexes compiled on first use) and eagerly.
+"""
+import sys
+import tempfile
+import time
+import re
+from pathlib import Path
+import yaml
+from src.rules import RuleSet
+from tools.compile_rules import compile_catalog
+from tools.init_rules_db import init_db
+
+REPEAT = 5
+
+
+def synthetic_rules(n: int):
+    rules = []
+    for i in range(n):
+        prefix = f'SYN{i:04d}'
+        rules.append({
+            'token_id': f'SYN-{i:04d}',
+            'token_name': f'Synthetic token {i}',
+            'detection_category': 'Synthetic',
+            'regex_pattern': f'{prefix}_(?P<val>[A-Za-z0-9_\\-]{{{16 + i % 32},{48 + i % 32}}})',
+            'keywords_prefixes': [prefix],
+            'minimum_entropy': 3.0,
+            'token_length': f'{16 + i % 32}-{48 + i % 32}',
+            'default_severity': 'Medium',
+            'rule_status': 'Active',
+        })
+    return rules
+
+
+def _best(fn):
+    times = []
+    for _ in range(REPEAT):
+        re.purge()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench(sizes=(10, 100, 1000)):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for n in sizes:
+            yaml_path = tmp / f'rules_{n}.yaml'
+            db_path = tmp / f'rules_{n}.db'
+            catalog_path = tmp / f'rules_{n}.catalog'
+            with open(yaml_path, 'w', encoding='utf-8') as fh:
+                yaml.safe_dump(synthetic_rules(n), fh, sort_keys=False)
+            init_db(yaml_path, db_path)
+            compile_catalog(yaml_path, catalog_path)
+            results.append({
+                'rules': n,
+                'yaml': _best(lambda: RuleSet.from_yaml(yaml_path)),
+                'sqlite': _best(lambda: RuleSet.from_sqlite(db_path)),
+                'compiled_lazy': _best(lambda: RuleSet.from_compiled(catalog_path)),
+                'compiled_eager': _best(lambda: RuleSet.from_compiled(catalog_path, lazy=False)),
+            })
+    return results
+
+
+if __name__ == '__main__':
+    sizes = [int(a) for a in sys.argv[1:]] or [10, 100, 1000]
+    print(f"{'rules':>6} {'yaml ms':>10} {'sqlite ms':>10} {'lazy ms':>10} {'eager ms':>10}")
+    for r in bench(sizes):
+        print(f"{r['rules']:>6} {r['yaml'] * 1000:>10.2f} {r['sqlite'] * 1000:>10.2f} "
+              f"{r['compiled_lazy'] * 1000:>10.2f} {r['compiled_eager'] * 1000:>10.2f}")
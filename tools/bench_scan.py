@@ -0,0 +1,231 @@
+"""Scanner benchmark suite.
+Usage: python -m tools.bench_scan [--out results.json] [--baseline baseline.json] [--threshold 0.2]
+
+Generates a synthetic corpus with `tools.synth_corpus` (fixed seed) and
+measures:
+
+- throughput (MB/s) of each detector function and each catalog rule;
+- end-to-end `scan_text` + `RuleSet.match_text` latency per file size bucket;
+- peak traced memory of a full corpus scan;
+- time of the decoder stage (`src/decoders.py`) and its overhead over the
+  regular scan;
+- memory per finding of the unified engine's findings, held as a list of
+  dicts versus a `FindingStore`.
+
+Results are written as JSON. With `--baseline`, throughputs that dropped or
+latencies that rose by more than `--threshold` (a fraction) are reported as
+regressions and the exit status is 1.
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from src import detectors
+from src.decoders import DecodeStats, scan_decoded
+from src.engine import Engine
+from src.findings import FindingStore
+from src.rules import RuleSet
+from src.scanner import scan_text
+from tools.synth_corpus import generate_corpus
+
+REPO_ROOT = Path(__file__).parents[1]
+DETECTORS = {
+    'aws-access-key': detectors.detect_aws_access_key,
+    'private-key-block': detectors.detect_private_key,
+    'high-entropy': detectors.detect_high_entropy_strings,
+    'keyword-context': detectors.detect_keywords_context,
+}
+# (label, upper bound in bytes)
+BUCKETS = [('<4KiB', 4 * 1024), ('4-64KiB', 64 * 1024), ('64KiB-1MiB', 1024 * 1024), ('>1MiB', float('inf'))]
+
+
+def _bucket(size: int) -> str:
+    for label, bound in BUCKETS:
+        if size < bound:
+            return label
+    return BUCKETS[-1][0]
+
+
+def _throughput(seconds: float, nbytes: int) -> float:
+    return nbytes / (1024 * 1024) / seconds if seconds else 0.0
+
+
+def load_corpus(root: Path):
+    files = sorted(p for p in root.rglob('*') if p.is_file() and p.name != 'ground_truth.json')
+    return [(p.relative_to(root).as_posix(), p.read_text(encoding='utf-8')) for p in files]
+
+
+def run(corpus, ruleset, repeat: int = 3):
+    total_bytes = sum(len(t.encode('utf-8')) for _, t in corpus)
+    results = {'corpus': {'files': len(corpus), 'bytes': total_bytes}, 'detectors': {}, 'rules': {},
+               'latency': {}, 'memory': {}}
+
+    for name, func in DETECTORS.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            hits = sum(len(func(text)) for _, text in corpus)
+            best = min(best, time.perf_counter() - start)
+        results['detectors'][name] = {'seconds': best, 'mb_per_sec': _throughput(best, total_bytes), 'findings': hits}
+
+    for rule in ruleset.rules:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            hits = sum(len(rule.matches(text)) for _, text in corpus)
+            best = min(best, time.perf_counter() - start)
+        results['rules'][rule.token_id] = {'seconds': best, 'mb_per_sec': _throughput(best, total_bytes), 'findings': hits}
+
+    per_bucket = {}
+    for _, text in corpus:
+        size = len(text.encode('utf-8'))
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            scan_text(text)
+            ruleset.match_text(text)
+            best = min(best, time.perf_counter() - start)
+        per_bucket.setdefault(_bucket(size), []).append(best)
+    for label, times in per_bucket.items():
+        times.sort()
+        results['latency'][label] = {
+            'files': len(times),
+            'mean_ms': statistics.mean(times) * 1000,
+            'p50_ms': times[len(times) // 2] * 1000,
+            'p95_ms': times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+        }
+
+    start = time.perf_counter()
+    findings = 0
+    for _, text in corpus:
+        findings += len(scan_text(text)) + len(ruleset.match_text(text))
+    elapsed = time.perf_counter() - start
+    results['total'] = {'seconds': elapsed, 'mb_per_sec': _throughput(elapsed, total_bytes), 'findings': findings}
+    results['decoders'] = decoder_overhead(corpus, ruleset, elapsed, total_bytes, repeat)
+
+    # separate pass: tracing allocations slows the scan down considerably
+    tracemalloc.start()
+    for _, text in corpus:
+        scan_text(text)
+        ruleset.match_text(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results['memory'] = {'peak_bytes': peak}
+    results['finding_memory'] = finding_memory(corpus, ruleset)
+    return results
+
+
+def decoder_overhead(corpus, ruleset, scan_seconds: float, total_bytes: int, repeat: int = 3):
+    """Time of the decoder stage over the corpus, and relative to a regular scan taking `scan_seconds`."""
+    buffers = [text.encode('utf-8') for _, text in corpus]
+    best = float('inf')
+    for _ in range(repeat):
+        stats = DecodeStats()
+        start = time.perf_counter()
+        for buf in buffers:
+            scan_decoded(buf, ruleset, stats=stats)
+        best = min(best, time.perf_counter() - start)
+    return {'seconds': best, 'mb_per_sec': _throughput(best, total_bytes),
+            'overhead': best / scan_seconds if scan_seconds else 0.0, 'spans': stats.spans,
+            'decoded': stats.decoded, 'findings': stats.findings}
+
+
+def _traced(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return kept, size
+
+
+def finding_memory(corpus, ruleset):
+    """Bytes per finding held as dicts versus in a `FindingStore`."""
+    engine = Engine(ruleset)
+    scanned = [(path, engine.scan(text)) for path, text in corpus]
+    count = sum(len(found) for _, found in scanned)
+
+    def as_dicts():
+        return [dict(f.to_dict(), path=path) for path, found in scanned for f in found]
+
+    def as_store():
+        store = FindingStore()
+        for path, found in scanned:
+            store.extend(store.add_path(path), found)
+        return store
+
+    _, dict_bytes = _traced(as_dicts)
+    _, store_bytes = _traced(as_store)
+    per = (lambda n: n / count if count else 0.0)
+    return {'findings': count, 'dict_bytes_per_finding': per(dict_bytes), 'store_bytes_per_finding': per(store_bytes)}
+
+
+def compare(results, baseline, threshold: float):
+    """Return human-readable regressions of `results` against `baseline`."""
+    regressions = []
+
+    def check_throughput(section):
+        for name, cur in results.get(section, {}).items():
+            old = baseline.get(section, {}).get(name)
+            if old and old['mb_per_sec'] and cur['mb_per_sec'] < old['mb_per_sec'] * (1 - threshold):
+                regressions.append(f"{section}/{name}: {cur['mb_per_sec']:.2f} MB/s vs baseline {old['mb_per_sec']:.2f} MB/s")
+
+    check_throughput('detectors')
+    check_throughput('rules')
+    old_decode = baseline.get('decoders', {}).get('mb_per_sec')
+    if old_decode and results['decoders']['mb_per_sec'] < old_decode * (1 - threshold):
+        regressions.append(f"decoders: {results['decoders']['mb_per_sec']:.2f} MB/s vs baseline {old_decode:.2f} MB/s")
+    old_total = baseline.get('total', {}).get('mb_per_sec')
+    if old_total and results['total']['mb_per_sec'] < old_total * (1 - threshold):
+        regressions.append(f"total: {results['total']['mb_per_sec']:.2f} MB/s vs baseline {old_total:.2f} MB/s")
+    for label, cur in results.get('latency', {}).items():
+        old = baseline.get('latency', {}).get(label)
+        if old and cur['p50_ms'] > old['p50_ms'] * (1 + threshold):
+            regressions.append(f"latency/{label}: p50 {cur['p50_ms']:.3f} ms vs baseline {old['p50_ms']:.3f} ms")
+    old_peak = baseline.get('memory', {}).get('peak_bytes')
+    if old_peak and results['memory']['peak_bytes'] > old_peak * (1 + threshold):
+        regressions.append(f"memory: peak {results['memory']['peak_bytes']} bytes vs baseline {old_peak}")
+    return regressions
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Benchmark detectors and rules on a synthetic corpus')
+    p.add_argument('--out', help='write JSON results here (default: stdout)')
+    p.add_argument('--baseline', help='JSON results of a previous run to compare against')
+    p.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown before failing')
+    p.add_argument('--rules', default=str(REPO_ROOT / 'rules' / 'rules.yaml'))
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--files-per-kind', type=int, default=8)
+    p.add_argument('--density', type=float, default=0.5)
+    p.add_argument('--repeat', type=int, default=3)
+    args = p.parse_args(argv)
+
+    ruleset = RuleSet.from_path(Path(args.rules))
+    with tempfile.TemporaryDirectory() as tmp:
+        generate_corpus(Path(tmp), args.seed, args.files_per_kind, args.density)
+        corpus = load_corpus(Path(tmp))
+    results = run(corpus, ruleset, args.repeat)
+    results['params'] = {'seed': args.seed, 'files_per_kind': args.files_per_kind, 'density': args.density}
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.out:
+        Path(args.out).write_text(text + '\n', encoding='utf-8')
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        regressions = compare(results, baseline, args.threshold)
+        for r in regressions:
+            print('REGRESSION', r, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
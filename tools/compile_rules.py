@@ -0,0 +1,49 @@
+"""Compile `rules/rules.yaml` into a fast-loading catalog.
+Usage: python -m tools.compile_rules [out.catalog]
+
+The output is JSON holding each rule's normalized fields plus the prefilter
+analysis of its regex, so `RuleSet.from_compiled` needs no YAML parsing and
+can compile regexes lazily. Every pattern is validated here, and rules the
+regex guard quarantines are left out of the catalog and listed on stderr.
+"""
+import hashlib
+import json
+import re
+import sys
+from pathlib import Path
+
+from src.rules import COMPILED_FORMAT, RuleSet, compiled_entry
+
+REPO_ROOT = Path(__file__).parents[1]
+
+
+def compile_rules(rules, source_sha256=None):
+    entries = []
+    for r in rules:
+        try:
+            re.compile(r.regex_pattern)
+        except re.error as e:
+            raise ValueError(f'rule {r.token_id}: invalid regex_pattern: {e}') from e
+        entries.append(compiled_entry(r))
+    return {'format': COMPILED_FORMAT, 'source_sha256': source_sha256, 'rules': entries}
+
+
+def compile_catalog(yaml_path: Path, out_path: Path):
+    """Compile `yaml_path` into `out_path`; returns the guarded `RuleSet` that was written."""
+    rs = RuleSet.from_yaml(yaml_path)
+    unsafe = {c.token_id: c for c in rs.guard_report.unsafe}
+    for r in rs.quarantined:
+        print(f'{r.token_id}: left out as {r.rule_status} ({"; ".join(unsafe[r.token_id].reasons)})',
+              file=sys.stderr)
+    digest = hashlib.sha256(Path(yaml_path).read_bytes()).hexdigest()
+    data = compile_rules(rs.rules, digest)
+    with open(out_path, 'w', encoding='utf-8') as fh:
+        json.dump(data, fh, separators=(',', ':'))
+    return rs
+
+
+if __name__ == '__main__':
+    yaml_path = REPO_ROOT / 'rules' / 'rules.yaml'
+    out_path = Path(sys.argv[1]) if len(sys.argv) > 1 else REPO_ROOT / 'rules' / 'rules.catalog'
+    compile_catalog(yaml_path, out_path)
+    print('Compiled rule catalog at', out_path)
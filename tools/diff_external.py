@@ -0,0 +1,87 @@
+"""Differential check of the native engine against gitleaks and trufflehog.
+Usage: python -m tools.diff_external [TARGET_DIR] [--tool gitleaks|trufflehog] [--json report.json]
+
+For each tool found on PATH, its rule file (`rules/gitleaks.toml`,
+`rules/trufflehog_rules.json`) is run both by the external binary and
+in-process through `RuleSet.from_path`, and the findings are compared by
+(path, line, rule id). Tools that are not installed are reported as
+skipped. Exits with status 1 if any run disagrees.
+"""
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from src.external_rules import (GITLEAKS, TRUFFLEHOG, differential, native_findings, parse_gitleaks_report,
+                                parse_trufflehog_report)
+from src.parallel import iter_files
+from src.rules import RuleSet
+
+REPO_ROOT = Path(__file__).parents[1]
+RULE_FILES = {GITLEAKS: REPO_ROOT / 'rules' / 'gitleaks.toml', TRUFFLEHOG: REPO_ROOT / 'rules' / 'trufflehog_rules.json'}
+
+
+def external_findings(tool: str, binary: str, target: Path, rules_path: Path) -> set:
+    if tool == GITLEAKS:
+        with tempfile.TemporaryDirectory() as tmp:
+            report = Path(tmp) / 'report.json'
+            subprocess.run([binary, 'detect', '--no-git', '--source', str(target), '--config', str(rules_path),
+                            '--report-format', 'json', '--report-path', str(report), '--exit-code', '0'],
+                           check=True, capture_output=True)
+            with open(report, 'r', encoding='utf-8') as fh:
+                return parse_gitleaks_report(json.load(fh), target)
+    out = subprocess.run([binary, 'filesystem', str(target), '--rules', str(rules_path), '--json'],
+                         check=True, capture_output=True, text=True).stdout
+    return parse_trufflehog_report(out.splitlines(), target)
+
+
+def compare(tool: str, target: Path, rules_path: Path = None, binary: str = None):
+    """Disagreements between `tool` and the native engine on `target`, or None if `tool` is not installed."""
+    binary = binary or shutil.which(tool)
+    if not binary:
+        return None
+    rules_path = rules_path or RULE_FILES[tool]
+    ruleset = RuleSet.from_path(rules_path)
+    files = list(iter_files(target))
+    ours = native_findings(ruleset, target, files)
+    theirs = external_findings(tool, binary, target, rules_path)
+    result = differential(ours, theirs, [p.relative_to(target).as_posix() for p in files])
+    result['skipped_rules'] = ruleset.skipped
+    return result
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Compare native rule execution with gitleaks/trufflehog')
+    p.add_argument('target', nargs='?', default='.')
+    p.add_argument('--tool', action='append', choices=sorted(RULE_FILES), help='tool to compare (default: both)')
+    p.add_argument('--json', help='also write the comparison as JSON')
+    args = p.parse_args(argv)
+
+    target = Path(args.target).resolve()
+    results = {}
+    for tool in args.tool or sorted(RULE_FILES):
+        result = compare(tool, target)
+        results[tool] = result
+        if result is None:
+            print(f'{tool}: not installed, skipped')
+            continue
+        print(f"{tool}: {result['agreed']} agreed, {len(result['only_ours'])} only native, "
+              f"{len(result['only_theirs'])} only {tool}, {result['unscanned_files']} files not scanned natively")
+        for path, line, rid in result['only_ours']:
+            print(f'  native only: {path}:{line} {rid}')
+        for path, line, rid in result['only_theirs']:
+            print(f'  {tool} only: {path}:{line} {rid}')
+        for s in result['skipped_rules']:
+            print(f"  untranslated rule {s['id']}: {s['reason']}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2)
+    disagree = any(r and (r['only_ours'] or r['only_theirs']) for r in results.values())
+    return 1 if disagree else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,17 @@
 """Initialize a SQLite rules DB from `rules/rules.yaml`.
-Usage: python tools/init_rules_db.py [out.db]
+Usage: python -m tools.init_rules_db [out.db]
+
+Every rule is written; rules the regex guard flags as super-linear are
+stored with `rule_status` ``Testing`` and listed on stderr.
 """
 import sqlite3
 import sys
 from pathlib import Path
 import yaml
 
+from src.regex_guard import QUARANTINED_STATUS, REPORT, RegexGuard
+from src.rules import Rule
+
 SCHEMA = '''
 CREATE TABLE IF NOT EXISTS rules (
     token_id TEXT PRIMARY KEY,
@@ -26,8 +32,14 @@ def load_yaml(path: Path):
         return yaml.safe_load(fh)
 
 
-def init_db(yaml_path: Path, out_db: Path):
+def init_db(yaml_path: Path, out_db: Path, guard=None):
+    """Write the catalog to `out_db`; returns the `GuardReport` (None with `guard=False`)."""
     data = load_yaml(yaml_path)
+    report = None
+    if guard is not False:
+        report = (guard or RegexGuard(action=REPORT)).check_all([Rule(r) for r in data])
+        unsafe = {c.token_id for c in report.unsafe}
+        data = [dict(r, rule_status=QUARANTINED_STATUS) if r.get('token_id') in unsafe else r for r in data]
     conn = sqlite3.connect(str(out_db))
     cur = conn.cursor()
     cur.executescript(SCHEMA)
@@ -45,11 +57,14 @@ def init_db(yaml_path: Path, out_db: Path):
         ))
     conn.commit()
     conn.close()
+    return report
 
 
 if __name__ == '__main__':
     repo = Path(__file__).parents[1]
     yaml_path = repo / 'rules' / 'rules.yaml'
     out_db = Path(sys.argv[1]) if len(sys.argv) > 1 else repo / 'rules' / 'rules.db'
-    init_db(yaml_path, out_db)
+    report = init_db(yaml_path, out_db)
+    for c in report.unsafe:
+        print(f'{c.token_id}: stored as {QUARANTINED_STATUS} ({"; ".join(c.reasons)})', file=sys.stderr)
     print('Initialized rules DB at', out_db)
@@ -0,0 +1,98 @@
+"""Split a scan into shards that run as independent workers, then merge their results.
+Usage: python -m tools.shard_scan plan OUT_DIR (--files DIR | --git REPO) --shards N [--rules rules.yaml]
+                                       [--labels LABELS.json] [--exclude GLOB ...] [--rev REV ...]
+       python -m tools.shard_scan work OUT_DIR --shard I [--force]
+       python -m tools.shard_scan run OUT_DIR [--workers N]
+       python -m tools.shard_scan merge OUT_DIR [--json report.json] [--findings findings.ndjson] [--db operations.db]
+
+`plan` lists the target once into OUT_DIR/plan.json. `work` scans one
+shard and writes OUT_DIR/shard-<I>.json; run it on as many hosts as there
+are shards (OUT_DIR must be shared), and rerun it for shards that failed —
+finished shards are skipped. `run` does the same for every pending shard
+with a local process pool. `merge` checks that every shard is done,
+combines and dedupes the findings and prints per-matcher counters; with a
+labels file in the plan, `--db` records the TP/FP/FN per rule in the
+operations DB (see `src/shards.py`).
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from src.shards import ShardError, merge_partials, plan_blobs, plan_files, run_shard, run_shards
+
+
+def _plan(args):
+    if bool(args.files) == bool(args.git):
+        raise SystemExit('plan needs exactly one of --files or --git')
+    if args.files:
+        plan = plan_files(Path(args.out), Path(args.files), args.shards, exclude=args.exclude,
+                          rules_path=args.rules, labels_path=args.labels)
+    else:
+        plan = plan_blobs(Path(args.out), Path(args.git), args.shards, revs=args.rev, rules_path=args.rules)
+    print(f'Planned {len(plan["items"])} {plan["kind"]} in {plan["count"]} shards (plan {plan["id"]})')
+
+
+def _merge(args):
+    findings, report = merge_partials(Path(args.out))
+    for matcher, c in sorted(report.counters.items()):
+        labeled = f' TP={c["tp"]} FP={c["fp"]} FN={c["fn"]}' if 'tp' in c else ''
+        print(f'{matcher}: {c["findings"]} findings in {c["items"]} items{labeled}')
+    print(f'Merged {report.shards} shards: {report.items} items ({report.errors} unreadable), '
+          f'{report.bytes_scanned} bytes, {report.findings} findings ({report.duplicates} duplicates dropped), '
+          f'{report.seconds:.2f}s of worker time')
+    if args.json:
+        Path(args.json).write_text(json.dumps(report.to_dict(), indent=2) + '\n', encoding='utf-8')
+    if args.findings:
+        with open(args.findings, 'w', encoding='utf-8') as fh:
+            for f in findings:
+                fh.write(json.dumps(f) + '\n')
+    if args.db:
+        report.operations().to_sqlite(Path(args.db))
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Sharded scanning with mergeable partial results')
+    sub = p.add_subparsers(dest='command', required=True)
+    plan = sub.add_parser('plan', help='list the target and write the shard plan')
+    plan.add_argument('out')
+    plan.add_argument('--files', help='directory to scan')
+    plan.add_argument('--git', help='repository whose history (unique blobs) to scan')
+    plan.add_argument('--shards', type=int, required=True)
+    plan.add_argument('--rules', help='rule catalog to run in addition to the detectors')
+    plan.add_argument('--labels', help='with --files, labels (see src/tuning.py) to count TP/FP/FN against')
+    plan.add_argument('--exclude', action='append', default=[], help='with --files, glob of paths to skip')
+    plan.add_argument('--rev', action='append', default=[], help='with --git, revisions to scan (default: --all)')
+    work = sub.add_parser('work', help='scan one shard')
+    work.add_argument('out')
+    work.add_argument('--shard', type=int, required=True)
+    work.add_argument('--force', action='store_true', help='rescan even if the shard is already done')
+    run = sub.add_parser('run', help='scan every pending shard on this host')
+    run.add_argument('out')
+    run.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    merge = sub.add_parser('merge', help='combine the shard results')
+    merge.add_argument('out')
+    merge.add_argument('--json', help='write the report as JSON to this file')
+    merge.add_argument('--findings', help='write the merged findings to this .ndjson file')
+    merge.add_argument('--db', help='record TP/FP/FN in this operations DB (plans with --labels only)')
+    args = p.parse_args(argv)
+
+    try:
+        if args.command == 'plan':
+            _plan(args)
+        elif args.command == 'work':
+            done = run_shard(Path(args.out), args.shard, force=args.force)
+            print(f'Shard {args.shard}: {"scanned" if done else "already done"}')
+        elif args.command == 'run':
+            ran = run_shards(Path(args.out), workers=args.workers)
+            print(f'Scanned {len(ran)} shards')
+        else:
+            _merge(args)
+    except (ShardError, ValueError) as exc:
+        print(f'error: {exc}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
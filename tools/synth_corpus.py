@@ -0,0 +1,130 @@
+"""Deterministic synthetic corpus generator for benchmarks and tuning.
+Usage: python -m tools.synth_corpus OUT_DIR [--seed N] [--files-per-kind N] [--density D]
+
+Writes source files, minified bundles, lockfiles, base64 blobs and logs,
+seeding fake secrets at `density` secrets per KiB of generated text. The
+same seed always produces byte-identical files. Every seeded secret is
+recorded in `ground_truth.json` as `{relative path: [secret, ...]}`, the
+labels format read by `tools.tune_rules`.
+"""
+import argparse
+import base64
+import json
+import random
+import string
+from pathlib import Path
+
+KINDS = ['source', 'minified', 'lockfile', 'base64', 'log']
+# approximate file sizes in bytes; cycled per kind so every size bucket is covered
+SIZES = [512, 4 * 1024, 48 * 1024, 256 * 1024]
+ALNUM = string.ascii_letters + string.digits
+
+
+def fake_aws_key(rnd: random.Random) -> str:
+    return 'AKIA' + ''.join(rnd.choice(string.ascii_uppercase + string.digits) for _ in range(16))
+
+
+def fake_token(rnd: random.Random) -> str:
+    return ''.join(rnd.choice(ALNUM) for _ in range(32))
+
+
+def fake_secret(rnd: random.Random) -> str:
+    return fake_aws_key(rnd) if rnd.random() < 0.5 else fake_token(rnd)
+
+
+def _word(rnd, n=8):
+    return ''.join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(2, n)))
+
+
+def _source_line(rnd):
+    choice = rnd.random()
+    if choice < 0.4:
+        return f'{_word(rnd)} = {_word(rnd)}({_word(rnd)}, {rnd.randint(0, 999)})'
+    if choice < 0.7:
+        return f'    return self.{_word(rnd)}.{_word(rnd)}()'
+    return f'# {_word(rnd)} {_word(rnd)} {_word(rnd)} {_word(rnd)}'
+
+
+def _log_line(rnd, i):
+    level = rnd.choice(['INFO', 'DEBUG', 'WARN', 'ERROR'])
+    return f'2025-10-{1 + i % 28:02d}T12:{i % 60:02d}:00Z {level} {_word(rnd)}: request_id={fake_token(rnd)[:12]} took={rnd.randint(1, 900)}ms'
+
+
+def _lock_entry(rnd):
+    name = _word(rnd, 12)
+    digest = base64.b64encode(bytes(rnd.getrandbits(8) for _ in range(48))).decode()
+    return (f'"node_modules/{name}": {{"version": "{rnd.randint(0, 9)}.{rnd.randint(0, 20)}.{rnd.randint(0, 9)}", '
+            f'"integrity": "sha512-{digest}"}},')
+
+
+def _secret_line(kind, rnd, secret):
+    if kind == 'minified':
+        return f'var {_word(rnd, 3)}="{secret}";'
+    if kind == 'lockfile':
+        return f'"token": "{secret}",'
+    if kind == 'log':
+        return f'2025-10-01T00:00:00Z DEBUG auth: using api_key="{secret}"'
+    return f'API_TOKEN = "{secret}"'
+
+
+def generate_file(kind: str, size: int, rnd: random.Random, density: float):
+    """Return `(text, secrets)` for one synthetic file of roughly `size` bytes."""
+    parts = []
+    secrets = []
+    length = 0
+    budget = density * size / 1024
+    i = 0
+    while length < size:
+        if budget >= 1 or rnd.random() < budget:
+            budget -= 1
+            secret = fake_secret(rnd)
+            secrets.append(secret)
+            part = _secret_line(kind, rnd, secret)
+        elif kind == 'source':
+            part = _source_line(rnd)
+        elif kind == 'minified':
+            part = f'function {_word(rnd, 3)}({_word(rnd, 2)}){{return {_word(rnd, 3)}.{_word(rnd, 4)}({rnd.randint(0, 99)})}};'
+        elif kind == 'lockfile':
+            part = _lock_entry(rnd)
+        elif kind == 'base64':
+            part = base64.b64encode(bytes(rnd.getrandbits(8) for _ in range(57))).decode()
+        else:
+            part = _log_line(rnd, i)
+        parts.append(part)
+        length += len(part) + 1
+        i += 1
+    # minified bundles are a single very long line
+    sep = '' if kind == 'minified' else '\n'
+    return sep.join(parts) + '\n', secrets
+
+
+_EXTENSIONS = {'source': '.py', 'minified': '.min.js', 'lockfile': '.lock.json', 'base64': '.b64', 'log': '.log'}
+
+
+def generate_corpus(out_dir: Path, seed: int = 0, files_per_kind: int = 8, density: float = 0.5,
+                    sizes=SIZES):
+    """Write the corpus under `out_dir` and return the ground truth mapping."""
+    out_dir = Path(out_dir)
+    rnd = random.Random(seed)
+    truth = {}
+    for kind in KINDS:
+        (out_dir / kind).mkdir(parents=True, exist_ok=True)
+        for i in range(files_per_kind):
+            text, secrets = generate_file(kind, sizes[i % len(sizes)], rnd, density)
+            rel = f'{kind}/{kind}_{i:03d}{_EXTENSIONS[kind]}'
+            (out_dir / rel).write_text(text, encoding='utf-8')
+            truth[rel] = secrets
+    with open(out_dir / 'ground_truth.json', 'w', encoding='utf-8') as fh:
+        json.dump(truth, fh, indent=1, sort_keys=True)
+    return truth
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Generate a deterministic synthetic corpus')
+    p.add_argument('out_dir')
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--files-per-kind', type=int, default=8)
+    p.add_argument('--density', type=float, default=0.5, help='seeded secrets per KiB')
+    args = p.parse_args()
+    truth = generate_corpus(Path(args.out_dir), args.seed, args.files_per_kind, args.density)
+    print('Wrote', len(truth), 'files with', sum(len(v) for v in truth.values()), 'secrets to', args.out_dir)
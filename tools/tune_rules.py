@@ -0,0 +1,87 @@
+"""Evaluate every catalog rule against a labeled corpus and record TP/FP/FN.
+Usage: python -m tools.tune_rules CORPUS_DIR LABELS.json|.jsonl [--rules rules.yaml] [--db operations.db]
+                                  [--cache tune-cache.db] [--workers N] [--rule TOKEN_ID ...]
+                                  [--sweep [--target-precision 0.9] [--candidates table.json]]
+
+`LABELS` maps files relative to `CORPUS_DIR` to their secrets, e.g. the
+`ground_truth.json` written by `tools.synth_corpus`; see `src/tuning.py`
+for the formats. Results are written to the operations DB in a single
+transaction and printed with precision, recall and a recommendation. With
+`--cache`, re-running after editing one rule only re-runs that rule.
+
+`--sweep` instead scans the corpus once, then reports for every rule the
+`minimum_entropy` / `token_length` pair with the best recall at
+`--target-precision`; `--candidates` keeps the candidate table in a file
+and re-sweeps from it without scanning.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from src.tuning import (DEFAULT_CHUNK_SIZE, CandidateTable, collect_candidates, evaluate_corpus, load_labels,
+                        sweep_operations)
+
+REPO_ROOT = Path(__file__).parents[1]
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:.3f}'
+
+
+def _report(ops):
+    for e in sorted(ops.entries, key=lambda e: e.detection_rule_id):
+        print(f'{e.detection_rule_id}: TP={e.true_positives} FP={e.false_positives} FN={e.false_negatives} '
+              f'precision={_fmt(e.precision)} recall={_fmt(e.recall)} -> {e.tuning_recommendation}')
+
+
+def _sweep(args):
+    start = time.perf_counter()
+    if args.candidates and Path(args.candidates).exists():
+        table = CandidateTable.load(Path(args.candidates))
+    else:
+        table = collect_candidates(Path(args.corpus), load_labels(Path(args.labels)), Path(args.rules),
+                                   workers=args.workers, chunk_size=args.chunk_size, rule_ids=args.rule)
+        if args.candidates:
+            table.save(Path(args.candidates))
+    ops, suggestions = sweep_operations(table, args.target_precision)
+    if not args.dry_run:
+        ops.to_sqlite(Path(args.db))
+    _report(ops)
+    print(f'Swept {len(suggestions)} rules over {table.files} files in {time.perf_counter() - start:.2f}s',
+          file=sys.stderr)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Evaluate rules against a labeled corpus')
+    p.add_argument('corpus')
+    p.add_argument('labels')
+    p.add_argument('--rules', default=str(REPO_ROOT / 'rules' / 'rules.yaml'))
+    p.add_argument('--db', default=str(REPO_ROOT / 'rules' / 'operations.db'), help='operations DB to update')
+    p.add_argument('--cache', help='SQLite cache of per-file, per-rule results')
+    p.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    p.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='files per work unit')
+    p.add_argument('--rule', action='append', help='evaluate only this token_id (repeatable)')
+    p.add_argument('--dry-run', action='store_true', help='print the results without writing the DB')
+    p.add_argument('--sweep', action='store_true', help='suggest minimum_entropy/token_length per rule')
+    p.add_argument('--target-precision', type=float, default=0.9, help='with --sweep, precision to reach')
+    p.add_argument('--candidates', help='with --sweep, candidate table to reuse if present, written otherwise')
+    args = p.parse_args(argv)
+
+    if args.sweep:
+        _sweep(args)
+        return 0
+    ops, stats = evaluate_corpus(Path(args.corpus), load_labels(Path(args.labels)), Path(args.rules),
+                                 workers=args.workers, chunk_size=args.chunk_size, cache_path=args.cache,
+                                 rule_ids=args.rule)
+    if not args.dry_run:
+        ops.to_sqlite(Path(args.db))
+    _report(ops)
+    print(f'Evaluated {len(ops.entries)} rules on {stats.files} files ({stats.bytes_scanned} bytes) in '
+          f'{stats.seconds:.2f}s; {stats.rule_runs} rule runs, {stats.cached_runs} answered from the cache',
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())